@@ -0,0 +1,68 @@
+import cv2
+import numpy as np
+
+from logger import Logger
+from settings import Settings
+
+
+class AnnotationRenderer:
+    """
+    Draws the PPE annotations of a model pass: heads without a helmet as violations, helmets as compliances,
+    every other class is left out. Replaces ultralytics' Results.plot(), which copies the frame and draws a
+    box and label for every class: the boxes are drawn straight onto the decoded frame.
+    With ANNOTATED_IMAGE_MAX_SIDE the frame is first shrunk to a preview and the boxes are drawn on that,
+    so large frames are neither drawn at full size nor resized again before encoding.
+    """
+    VIOLATION_COLOR = (0, 0, 255)  # BGR
+    COMPLIANCE_COLOR = (0, 200, 0)
+    LABEL_TEXT_COLOR = (255, 255, 255)
+
+    def __init__(self, settings: Settings, logger: Logger, class_names: dict[int, str]):
+        self.settings = settings
+        self.logger = logger
+        colors = {"head": self.VIOLATION_COLOR, "helmet": self.COMPLIANCE_COLOR}
+        # class id -> (label, color) of the classes that are drawn
+        self.styles = {class_id: (name, colors[name]) for class_id, name in class_names.items() if name in colors}
+        self._drawn_ids = np.array(list(self.styles), dtype=np.intp)
+        self.max_side = max(0, self.settings.ANNOTATED_IMAGE_MAX_SIDE)
+        self.labels = self.settings.ANNOTATION_LABELS
+
+    def preview(self, image: np.ndarray) -> tuple[np.ndarray, float]:
+        """The frame to draw on and its scale relative to `image` (a downscaled copy in preview mode, else `image` itself)."""
+        height, width = image.shape[:2]
+        if not self.max_side or max(height, width) <= self.max_side:
+            return image, 1.0
+        scale = self.max_side / max(height, width)
+        # bilinear is ~10x cheaper than INTER_AREA on multi-megapixel frames and good enough for a preview
+        return cv2.resize(image, (max(1, round(width * scale)), max(1, round(height * scale))),
+                          interpolation=cv2.INTER_LINEAR), scale
+
+    def render(self, image: np.ndarray, boxes: np.ndarray) -> np.ndarray:
+        """
+        Draw (x1, y1, x2, y2, conf, cls) rows onto `image` in place and return it.
+        In preview mode `image` is left untouched and the annotated downscaled copy is returned.
+        """
+        image, scale = self.preview(image)
+        boxes = boxes[np.isin(boxes[:, 5].astype(np.intp), self._drawn_ids)]
+        if not len(boxes):
+            return image
+
+        # line width and font size follow the frame size like Results.plot()
+        line_width = max(round(sum(image.shape[:2]) / 2 * 0.003), 2)
+        font_scale = line_width / 3
+        font_thickness = max(line_width - 1, 1)
+        corners = np.rint(boxes[:, :4] * scale).astype(np.int64).tolist()
+        for (x1, y1, x2, y2), confidence, class_id in zip(corners, boxes[:, 4].tolist(), boxes[:, 5].astype(np.intp).tolist(), strict=True):
+            name, color = self.styles[class_id]
+            cv2.rectangle(image, (x1, y1), (x2, y2), color, line_width)
+            if not self.labels:
+                continue
+            label = f"{name} {confidence:.2f}"
+            (text_width, text_height), baseline = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, font_scale, font_thickness)
+            # the label sits above the box, or inside it at the top border of the frame
+            outside = y1 - text_height - baseline >= 0
+            top = y1 - text_height - baseline if outside else y1
+            cv2.rectangle(image, (x1, top), (x1 + text_width, top + text_height + baseline), color, cv2.FILLED)
+            cv2.putText(image, label, (x1, top + text_height), cv2.FONT_HERSHEY_SIMPLEX, font_scale,
+                        self.LABEL_TEXT_COLOR, font_thickness, cv2.LINE_AA)
+        return image
@@ -0,0 +1,84 @@
+"""
+Render time, peak memory and file size of aggregated (shift) PDF reports for different embedded image DPIs.
+
+Usage (from the backend directory):
+    python benchmarks/bench_aggregated_report.py --frames 1000 --dpi 72 100 150
+"""
+import argparse
+import os
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from pathlib import Path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+import cv2
+
+from detection_store import StoredDetection
+from logger import logger
+from pdf_report_generator import PDFReportGenerator
+from settings import settings
+from storage_manager import StorageManager
+
+
+def make_frames(count: int, height: int, width: int) -> list[StoredDetection]:
+    """Synthetic annotated frames: a smooth background with a few boxes and the frame number, every frame distinct."""
+    rng = np.random.default_rng(0)
+    gradient = np.linspace(40, 200, width, dtype=np.uint8)
+    background = np.dstack([np.tile(gradient, (height, 1))] * 3)
+    started_at = datetime(2025, 12, 14, 6, 0, 0)
+    frames = []
+    for i in range(count):
+        image = background.copy()
+        for _ in range(int(rng.integers(1, 6))):
+            x, y = int(rng.integers(0, width - 120)), int(rng.integers(0, height - 160))
+            color = (0, 0, 255) if rng.random() < 0.3 else (0, 200, 0)
+            cv2.rectangle(image, (x, y), (x + 120, y + 160), color, 3)
+        cv2.putText(image, f"frame {i}", (20, 50), cv2.FONT_HERSHEY_SIMPLEX, 1.5, (255, 255, 255), 3)
+        content = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes()
+        frames.append(StoredDetection(image_id=f"frame_{i:05d}.jpg", timestamp=started_at + timedelta(seconds=30 * i),
+                                      detections=[], violations=int(rng.poisson(0.4)),
+                                      compliances=int(rng.integers(0, 4)), annotated_image=content))
+    return frames
+
+
+def run(frames: list[StoredDetection], dpi: int, quality: int, output_dir: Path) -> tuple[float, float, int]:
+    """Return seconds, peak traced Python memory (MB) and the PDF size (bytes) for one configuration."""
+    generator_settings = settings.model_copy(update={"PDF_REPORTS_DIR": str(output_dir),
+                                                     "REPORT_IMAGE_DPI": dpi,
+                                                     "REPORT_IMAGE_JPEG_QUALITY": quality})
+    generator = PDFReportGenerator(settings=generator_settings, logger=logger,
+                                   storage=StorageManager(settings=generator_settings, logger=logger))
+    tracemalloc.start()
+    started_at = time.perf_counter()
+    url = generator.generate_aggregated_report(frames)
+    elapsed = time.perf_counter() - started_at
+    peak = tracemalloc.get_traced_memory()[1] / 1024 ** 2
+    tracemalloc.stop()
+    return elapsed, peak, (output_dir / url.split("/pdf_reports/", 1)[-1]).stat().st_size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=1000)
+    parser.add_argument("--dpi", type=int, nargs="+", default=[72, 100, 150])
+    parser.add_argument("--quality", type=int, default=settings.REPORT_IMAGE_JPEG_QUALITY)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--width", type=int, default=1280)
+    args = parser.parse_args()
+
+    frames = make_frames(args.frames, args.height, args.width)
+    print(f"{'dpi':>5} {'seconds':>8} {'frames/s':>9} {'peak MB':>8} {'PDF MB':>7}")
+    with tempfile.TemporaryDirectory() as output_dir:
+        for dpi in args.dpi:
+            elapsed, peak, size = run(frames, dpi, args.quality, Path(output_dir))
+            print(f"{dpi:>5} {elapsed:>8.2f} {len(frames) / elapsed:>9.1f} {peak:>8.1f} {size / 1024 ** 2:>7.1f}")
+    print(f"max RSS: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
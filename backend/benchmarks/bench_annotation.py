@@ -0,0 +1,97 @@
+"""
+Annotation + encode cost per image: ultralytics' Results.plot() versus the PPE AnnotationRenderer,
+with the encode settings (JPEG/WebP, quality, ANNOTATED_IMAGE_MAX_SIDE preview) of ImageService.
+
+Results are built from synthetic boxes (a crowded site: heads, helmets and persons), so no model is needed.
+"plot" is the drawing alone, "total" drawing plus encoding, "KB" the encoded size.
+
+Usage (from the backend directory):
+    python benchmarks/bench_annotation.py --sizes 1280x720 1920x1080 4000x3000 --boxes 30 --repeats 20
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import cv2
+import numpy as np
+import torch
+from ultralytics.engine.results import Results
+
+from annotation import AnnotationRenderer
+from image_service import ImageService
+from logger import logger
+from settings import settings
+from storage_manager import storage_manager
+
+CLASS_NAMES = {0: "head", 1: "helmet", 2: "person"}
+
+
+def make_frame(width: int, height: int, boxes: int) -> tuple[np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(0)
+    image = cv2.resize(rng.integers(40, 180, (height // 16, width // 16, 3), dtype=np.uint8), (width, height))
+    sizes = rng.uniform(0.03, 0.1, (boxes, 1)) * min(width, height)
+    corners = rng.uniform(0, 1, (boxes, 2)) * [width * 0.9, height * 0.9]
+    data = np.hstack([corners, corners + sizes, rng.uniform(0.3, 1.0, (boxes, 1)), rng.integers(0, 3, (boxes, 1))])
+    return image, data.astype(np.float32)
+
+
+def timed(function, repeats: int) -> tuple[float, float]:
+    """Median ms of the drawing step and of drawing plus encoding."""
+    plots, totals = [], []
+    for _ in range(repeats + 1):
+        started_at = time.perf_counter()
+        encode = function()
+        plotted_at = time.perf_counter()
+        encode()
+        plots.append((plotted_at - started_at) * 1000)
+        totals.append((time.perf_counter() - started_at) * 1000)
+    return statistics.median(plots[1:]), statistics.median(totals[1:])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", nargs="+", default=["1280x720", "1920x1080", "4000x3000"])
+    parser.add_argument("--boxes", type=int, default=30)
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    configurations = [
+        ("Results.plot(), jpeg q95", dict(ANNOTATED_IMAGE_FORMAT="jpeg", ANNOTATED_IMAGE_QUALITY=95), True),
+        ("renderer, jpeg q95", dict(ANNOTATED_IMAGE_FORMAT="jpeg", ANNOTATED_IMAGE_QUALITY=95), False),
+        ("renderer, jpeg q80", dict(ANNOTATED_IMAGE_FORMAT="jpeg", ANNOTATED_IMAGE_QUALITY=80), False),
+        ("renderer, webp q80", dict(ANNOTATED_IMAGE_FORMAT="webp", ANNOTATED_IMAGE_QUALITY=80), False),
+        ("renderer, jpeg q80, preview 1280", dict(ANNOTATED_IMAGE_FORMAT="jpeg", ANNOTATED_IMAGE_QUALITY=80,
+                                                 ANNOTATED_IMAGE_MAX_SIDE=1280), False),
+    ]
+    print(f"{'image':<11} {'annotation':<34} {'plot ms':>8} {'total ms':>9} {'KB':>7}")
+    for size in args.sizes:
+        width, height = (int(side) for side in size.split("x"))
+        frame, data = make_frame(width, height, args.boxes)
+        for name, overrides, use_plot in configurations:
+            config = settings.model_copy(update={"ANNOTATED_IMAGE_MAX_SIDE": 0, **overrides})
+            image_service = ImageService(settings=config, logger=logger, storage=storage_manager)
+            renderer = AnnotationRenderer(settings=config, logger=logger, class_names=CLASS_NAMES)
+            encoded = {}
+
+            # loop variables are bound as defaults, the closures must not see the next configuration (ruff B023)
+            def annotate(frame=frame, data=data, use_plot=use_plot, renderer=renderer, image_service=image_service,
+                         encoded=encoded):
+                # the decoded frame the renderer draws on is fresh for every request
+                image = frame.copy()
+                if use_plot:
+                    annotated = Results(orig_img=image, path="", names=CLASS_NAMES, boxes=torch.from_numpy(data)).plot()
+                else:
+                    annotated = renderer.render(image, data)
+                return lambda: encoded.update(content=image_service.encode_annotated(annotated))
+
+            frame_copy_ms = statistics.median(timed(lambda frame=frame: (frame.copy(), lambda: None)[1], args.repeats))
+            plot_ms, total_ms = timed(annotate, args.repeats)
+            print(f"{size:<11} {name:<34} {plot_ms - frame_copy_ms:>8.2f} {total_ms - frame_copy_ms:>9.2f} "
+                  f"{len(encoded['content']) / 1024:>7.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+"""
+Offline end-to-end benchmark suite for the API.
+
+A tiny randomly initialized YOLO11n (head/helmet/person) is built on the fly, so nothing is downloaded,
+and every request uploads a distinct synthetic site image. The suite measures:
+  - /detect, /detect/batch and /report (job submit -> completed -> download) latency percentiles
+    (p50/p95/p99) and throughput at several concurrency levels, through the ASGI app in-process
+    (or against a running server with --base-url),
+  - per-stage timings of the detection and report pipeline (decode, preprocess, inference, NMS,
+    post-processing, plot, encode, base64, PDF).
+
+Results are written as JSON (commit, environment and settings included) so runs can be compared:
+    python benchmarks/bench_api.py                                  # writes benchmarks/results/bench_api_<commit>.json
+    python benchmarks/bench_api.py --compare benchmarks/results/bench_api_<old commit>.json --max-regression 0.15
+
+The random model produces few detections at the serving threshold, --conf lowers it to get crowded frames.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import cv2
+import numpy as np
+from httpx import AsyncClient, ASGITransport
+
+from logger import logger
+from settings import settings
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+CLASS_NAMES = {0: "head", 1: "helmet", 2: "person"}
+
+
+def build_tiny_model(path: Path) -> Path:
+    """Randomly initialized YOLO11n with the PPE classes (deterministic, no weights are downloaded)."""
+    import torch
+    from ultralytics import YOLO
+    from ultralytics.nn.tasks import DetectionModel
+
+    torch.manual_seed(0)
+    model = YOLO("yolo11n.yaml")
+    model.model = DetectionModel("yolo11n.yaml", nc=len(CLASS_NAMES), verbose=False)
+    model.model.names = CLASS_NAMES
+    model.save(str(path))
+    return path
+
+
+def make_image(seed: int, width: int, height: int) -> bytes:
+    """A site-like JPEG: gradient background, "workers" with helmets/heads and sensor noise."""
+    rng = np.random.default_rng(seed)
+    image = np.empty((height, width, 3), dtype=np.uint8)
+    image[...] = np.linspace(40, 200, width, dtype=np.uint8)[None, :, None]
+    for _ in range(12):
+        x, y = int(rng.integers(0, width - 60)), int(rng.integers(30, height - 120))
+        cv2.rectangle(image, (x, y), (x + 40, y + 110), tuple(int(c) for c in rng.integers(0, 255, 3)), -1)
+        cv2.circle(image, (x + 20, y - 10), 14, (0, 200, 255) if rng.random() < 0.7 else (140, 170, 220), -1)
+    image = cv2.add(image, rng.integers(0, 12, image.shape, dtype=np.uint8))
+    return cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes()
+
+
+def percentiles(samples_ms: list[float]) -> dict:
+    samples = sorted(samples_ms)
+
+    def pick(q: float) -> float:
+        return samples[min(len(samples) - 1, int(round(q * (len(samples) - 1))))]
+    return {"count": len(samples), "mean_ms": round(statistics.fmean(samples), 2), "p50_ms": round(pick(0.50), 2),
+            "p95_ms": round(pick(0.95), 2), "p99_ms": round(pick(0.99), 2)}
+
+
+def git_commit() -> dict:
+    def git(*args):
+        return subprocess.run(["git", *args], cwd=BACKEND_DIR, capture_output=True, text=True).stdout.strip()
+    return {"commit": git("rev-parse", "--short", "HEAD") or "unknown", "dirty": bool(git("status", "--porcelain", "--", "."))}
+
+
+async def load_test(request, concurrency: int, total: int) -> dict:
+    """Run `total` calls of `request(index)` with at most `concurrency` in flight."""
+    slots = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(index: int):
+        async with slots:
+            started_at = time.perf_counter()
+            await request(index)
+            latencies.append((time.perf_counter() - started_at) * 1000)
+
+    started_at = time.perf_counter()
+    await asyncio.gather(*(one(index) for index in range(total)))
+    elapsed = time.perf_counter() - started_at
+    return {"concurrency": concurrency, **percentiles(latencies), "throughput_rps": round(total / elapsed, 2)}
+
+
+async def bench_endpoints(client: AsyncClient, images: list[bytes], args) -> dict:
+    results = {"detect": [], "detect_batch": [], "report": []}
+    image_ids = []
+
+    async def detect(index: int):
+        response = await client.post("/api/v1/detect", files={"file": ("site.jpg", images[index % len(images)], "image/jpeg")})
+        response.raise_for_status()
+        image_ids.append(response.json()["image_id"])
+
+    async def detect_batch(index: int):
+        start = (index * args.batch_size) % len(images)
+        batch = [images[(start + offset) % len(images)] for offset in range(args.batch_size)]
+        response = await client.post("/api/v1/detect/batch",
+                                     files=[("files", (f"site_{offset}.jpg", content, "image/jpeg"))
+                                            for offset, content in enumerate(batch)])
+        response.raise_for_status()
+
+    async def report(index: int):
+        response = await client.post("/api/v1/report", json={"image_id": image_ids[index % len(image_ids)]})
+        response.raise_for_status()
+        job = response.json()
+        while job["status"] in ("queued", "running"):
+            await asyncio.sleep(0.01)
+            job = (await client.get(job["status_url"])).json()
+        if job["status"] != "completed":
+            raise RuntimeError(f"Report job failed: {job['error']}")
+        if job["report_url"] and "/download" in job["report_url"]:
+            (await client.get(job["report_url"])).raise_for_status()
+
+    await detect(0)  # warm-up
+    for concurrency in args.concurrency:
+        results["detect"].append(await load_test(detect, concurrency, args.requests))
+        logger.info(f"/detect x{concurrency}: {results['detect'][-1]}")
+    for concurrency in args.concurrency:
+        results["detect_batch"].append({"batch_size": args.batch_size,
+                                        **await load_test(detect_batch, concurrency, max(2, args.requests // args.batch_size))})
+        logger.info(f"/detect/batch x{concurrency}: {results['detect_batch'][-1]}")
+    for concurrency in args.concurrency:
+        # every report request uses a different stored detection, so no job is coalesced
+        image_ids[:] = image_ids[-args.requests:]
+        results["report"].append(await load_test(report, concurrency, min(args.requests, len(image_ids))))
+        logger.info(f"/report x{concurrency}: {results['report'][-1]}")
+    return results
+
+
+def bench_stages(manager, images: list[bytes], repeats: int) -> dict:
+    """Per-stage timings of one image through the detection pipeline plus the PDF rendering."""
+    from image_service import image_service
+    from pdf_report_generator import report_generator
+    from schemas.detect_schemas import DetectionSchema, DetectionSummarySchema
+
+    stages = {name: [] for name in ("decode", "preprocess", "inference", "nms", "extract_detections",
+                                    "plot", "encode", "base64", "pdf")}
+
+    def timed(stage: str, function, *args, **kwargs):
+        started_at = time.perf_counter()
+        value = function(*args, **kwargs)
+        stages[stage].append((time.perf_counter() - started_at) * 1000)
+        return value
+
+    in_memory = report_generator.in_memory
+    report_generator.in_memory = True
+    try:
+        for index in range(repeats + 1):
+            content = images[index % len(images)]
+            image = timed("decode", image_service.decode, content)
+            result = manager.predict(image)[0]
+            for stage, speed_key in (("preprocess", "preprocess"), ("inference", "inference"), ("nms", "postprocess")):
+                stages[stage].append(result.speed[speed_key])
+            detections, violations, compliances = timed("extract_detections", manager._extract_detections, [result])
+            annotated = timed("plot", manager._annotate, result, image)
+            encoded = timed("encode", image_service.encode_annotated, annotated)
+            timed("base64", image_service.to_base64, encoded)
+            timed("pdf", report_generator.generate_report,
+                  detections=[DetectionSchema(**detection) for detection in detections],
+                  annotated_image_base64=None,
+                  summary=DetectionSummarySchema(helmet_count=compliances, no_helmet_count=violations),
+                  image_id=f"bench_{index}.jpg", timestamp=datetime.now(), annotated_image_bytes=encoded)
+            if index == 0:  # warm-up pass
+                for samples in stages.values():
+                    samples.clear()
+    finally:
+        report_generator.in_memory = in_memory
+    return {stage: percentiles(samples) for stage, samples in stages.items()}
+
+
+def compare(current: dict, baseline: dict, max_regression: float) -> bool:
+    """Print p50 deltas against a baseline result file. Returns False if anything regressed more than allowed."""
+    rows = []
+    for section in ("detect", "detect_batch", "report"):
+        old_runs = {run["concurrency"]: run for run in baseline.get(section, [])}
+        for run in current.get(section, []):
+            old = old_runs.get(run["concurrency"])
+            if old:
+                rows.append((f"{section} x{run['concurrency']} p50", old["p50_ms"], run["p50_ms"]))
+                rows.append((f"{section} x{run['concurrency']} p95", old["p95_ms"], run["p95_ms"]))
+    for stage, timing in current.get("stages", {}).items():
+        if stage in baseline.get("stages", {}):
+            rows.append((f"stage {stage} p50", baseline["stages"][stage]["p50_ms"], timing["p50_ms"]))
+
+    ok = True
+    print(f"\n{'metric':<28} {'baseline':>10} {'current':>10} {'change':>8}   ({baseline['meta']['commit']} -> {current['meta']['commit']})")
+    for name, old, new in rows:
+        change = (new - old) / old if old else 0.0
+        regressed = change > max_regression and new - old > 1.0  # ignore sub-millisecond noise
+        ok &= not regressed
+        print(f"{name:<28} {old:>10.2f} {new:>10.2f} {change:>+8.1%}{'  REGRESSION' if regressed else ''}")
+    return ok
+
+
+def print_summary(results: dict) -> None:
+    print(f"\n{'endpoint':<14} {'conc':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>8}")
+    for section in ("detect", "detect_batch", "report"):
+        for run in results.get(section, []):
+            print(f"{section:<14} {run['concurrency']:>5} {run['p50_ms']:>9.1f} {run['p95_ms']:>9.1f} "
+                  f"{run['p99_ms']:>9.1f} {run['throughput_rps']:>8.2f}")
+    if results.get("stages"):
+        print(f"\n{'stage':<20} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+        for stage, timing in results["stages"].items():
+            print(f"{stage:<20} {timing['p50_ms']:>9.2f} {timing['p95_ms']:>9.2f} {timing['p99_ms']:>9.2f}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=32, help="requests per endpoint and concurrency level")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--batch-size", type=int, default=8, help="images per /detect/batch request")
+    parser.add_argument("--images", type=int, default=16, help="distinct synthetic images")
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--stage-repeats", type=int, default=20)
+    parser.add_argument("--conf", type=float, default=settings.CONFIDENCE_THRESHOLD, help="confidence threshold")
+    parser.add_argument("--model", type=Path, help="weights to serve instead of the tiny random model")
+    parser.add_argument("--base-url", help="benchmark a running server instead of the in-process app (no stage timings)")
+    parser.add_argument("--output", type=Path, help="result file (default: benchmarks/results/bench_api_<commit>.json)")
+    parser.add_argument("--compare", type=Path, help="baseline result file to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.15, help="allowed relative p50/p95 slowdown")
+    args = parser.parse_args()
+
+    images = [make_image(seed, args.width, args.height) for seed in range(args.images)]
+    results = {"meta": {**git_commit(),
+                        "timestamp": datetime.now().isoformat(timespec="seconds"),
+                        "python": platform.python_version(),
+                        "platform": platform.platform(),
+                        "cpu_count": os.cpu_count(),
+                        "image_size": [args.width, args.height],
+                        "requests": args.requests,
+                        "batch_size": args.batch_size,
+                        "confidence_threshold": args.conf,
+                        "settings": {key: getattr(settings, key) for key in
+                                     ("INFERENCE_BACKEND", "MODEL_PRECISION", "MAX_BATCH_SIZE", "MAX_BATCH_WAIT_MS",
+                                      "INFERENCE_WORKERS", "INFERENCE_WORKER_PROCESSES", "TILE_INFERENCE",
+                                      "ANNOTATED_IMAGE_FORMAT", "ANNOTATED_IMAGE_QUALITY", "REPORT_MAX_CONCURRENT_JOBS")}}}
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        if args.base_url:
+            results["meta"]["target"] = args.base_url
+            async with AsyncClient(base_url=args.base_url, timeout=120) as client:
+                results.update(await bench_endpoints(client, images, args))
+        else:
+            from inference import InferenceManager
+            from inference_scheduler import inference_scheduler
+            from main import app
+            from pdf_report_generator import report_generator
+            from result_cache import result_cache
+
+            model_path = args.model or build_tiny_model(Path(temp_dir) / "tiny_ppe_yolo11n.pt")
+            results["meta"]["model"] = "tiny random yolo11n" if not args.model else str(args.model)
+            manager = InferenceManager(model_path=str(model_path), settings=settings.model_copy(update={"CONFIDENCE_THRESHOLD": args.conf}),
+                                       logger=logger)
+            inference_scheduler.inference_manager = manager
+            result_cache.enabled = False  # every request runs the full pipeline
+            report_generator.in_memory = True  # reports are downloaded once instead of piling up in pdf_reports/
+            results["meta"]["target"] = "in-process ASGI app"
+
+            async with AsyncClient(transport=ASGITransport(app), base_url="http://127.0.0.1", timeout=120) as client:
+                results.update(await bench_endpoints(client, images, args))
+            results["stages"] = bench_stages(manager, images, args.stage_repeats)
+            await inference_scheduler.stop()
+
+    output = args.output or BACKEND_DIR / "benchmarks" / "results" / f"bench_api_{results['meta']['commit']}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2))
+    print_summary(results)
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        if not compare(results, json.loads(args.compare.read_text()), args.max_regression):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,103 @@
+"""
+Payload size and latency of the /detect response formats: base64 JSON, multipart, raw image,
+detections-only, annotated image quality / max side and gzip compression.
+
+Requests go through the ASGI app in-process with the real model (TRAINED_MODEL_PATH), the result cache
+is cleared before every request so each one runs the full pipeline.
+
+Usage (from the backend directory):
+    python benchmarks/bench_detect_responses.py --requests 20 --width 1280 --height 720
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import cv2
+import numpy as np
+from fastapi.middleware.gzip import GZipMiddleware
+from httpx import AsyncClient, ASGITransport
+
+import detection_service as detection_service_module
+import routes.detect_routes as detect_routes
+from image_service import ImageService
+from logger import logger
+from main import app
+from result_cache import result_cache
+from settings import settings
+from storage_manager import storage_manager
+
+
+def make_upload(width: int, height: int) -> bytes:
+    """A site-like JPEG: gradient background, a few "workers" and sensor noise."""
+    rng = np.random.default_rng(0)
+    image = np.zeros((height, width, 3), dtype=np.uint8)
+    image[...] = np.linspace(40, 200, width, dtype=np.uint8)[None, :, None]
+    for _ in range(12):
+        x, y = int(rng.integers(0, width - 60)), int(rng.integers(0, height - 120))
+        cv2.rectangle(image, (x, y), (x + 40, y + 110), tuple(int(c) for c in rng.integers(0, 255, 3)), -1)
+        cv2.circle(image, (x + 20, y - 10), 14, (0, 200, 255), -1)
+    image = cv2.add(image, rng.integers(0, 12, image.shape, dtype=np.uint8))
+    return cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes()
+
+
+def use_image_service(**overrides) -> None:
+    service = ImageService(settings=settings.model_copy(update=overrides), logger=logger, storage=storage_manager)
+    detect_routes.image_service = service
+    detection_service_module.detection_service.image_service = service
+
+
+async def run(asgi_app, upload: bytes, requests: int, headers: dict, params: dict) -> tuple[float, float, int]:
+    """Median and p95 latency in ms and the response body size in bytes."""
+    latencies, size = [], 0
+    async with AsyncClient(transport=ASGITransport(asgi_app), base_url="http://127.0.0.1") as client:
+        for _ in range(requests + 1):
+            result_cache.clear()
+            started_at = time.perf_counter()
+            response = await client.post("/api/v1/detect", params=params, headers=headers,
+                                         files={"file": ("site.jpg", upload, "image/jpeg")})
+            latencies.append((time.perf_counter() - started_at) * 1000)
+            response.raise_for_status()
+            size = int(response.headers.get("content-length", len(response.content)))
+    latencies = sorted(latencies[1:])  # the first request warms the model up
+    return statistics.median(latencies), latencies[int(0.95 * (len(latencies) - 1))], size
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    args = parser.parse_args()
+
+    upload = make_upload(args.width, args.height)
+    gzip_app = GZipMiddleware(app, minimum_size=settings.RESPONSE_COMPRESSION_MIN_BYTES,
+                              compresslevel=settings.RESPONSE_COMPRESSION_LEVEL,
+                              exclude_content_types=("image/*", "multipart/*"))
+    scenarios = [
+        ("json + base64 (default)", app, {}, {}, {}),
+        ("json + base64, gzip", gzip_app, {"Accept-Encoding": "gzip"}, {}, {}),
+        ("multipart/form-data", app, {"Accept": "multipart/form-data"}, {}, {}),
+        ("image/jpeg", app, {"Accept": "image/jpeg"}, {}, {}),
+        ("detections only (annotate=false)", app, {}, {"annotate": "false"}, {}),
+        ("detections only, gzip", gzip_app, {"Accept-Encoding": "gzip"}, {"annotate": "false"}, {}),
+        ("multipart, quality 75", app, {"Accept": "multipart/form-data"}, {}, {"ANNOTATED_IMAGE_QUALITY": 75}),
+        ("multipart, quality 75, max side 640", app, {"Accept": "multipart/form-data"}, {},
+         {"ANNOTATED_IMAGE_QUALITY": 75, "ANNOTATED_IMAGE_MAX_SIDE": 640}),
+        ("multipart, webp quality 75", app, {"Accept": "multipart/form-data"}, {},
+         {"ANNOTATED_IMAGE_FORMAT": "webp", "ANNOTATED_IMAGE_QUALITY": 75}),
+    ]
+
+    print(f"upload {args.width}x{args.height}: {len(upload):,} bytes")
+    print(f"{'format':<38} {'p50 ms':>8} {'p95 ms':>8} {'bytes':>10}")
+    for name, asgi_app, headers, params, overrides in scenarios:
+        use_image_service(**overrides)
+        p50, p95, size = await run(asgi_app, upload, args.requests, headers, params)
+        print(f"{name:<38} {p50:>8.1f} {p95:>8.1f} {size:>10,}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,88 @@
+"""
+Full-resolution versus reduced-scale (libjpeg 1/2, 1/4, 1/8) decoding of large JPEG uploads.
+
+For every size the upload is decoded through ImageService.decode_for_inference with REDUCED_JPEG_DECODE off and on,
+then letterboxed to MODEL_IMG_SIZE the way ultralytics preprocesses it. Reported are the decode and letterbox
+times, the decoded frame size in memory and the largest box coordinate error after mapping back
+(a box drawn on the synthetic image is located on the decoded frame and scaled back).
+
+Usage (from the backend directory):
+    python benchmarks/bench_jpeg_decode.py --sizes 4000x3000 6000x4000 --repeats 10
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import cv2
+import numpy as np
+
+from image_service import ImageService
+from logger import logger
+from settings import settings
+from storage_manager import storage_manager
+
+BOX = (0.41, 0.37, 0.47, 0.52)  # relative x_min, y_min, x_max, y_max of the marker box
+
+
+def make_jpeg(width: int, height: int) -> bytes:
+    """A textured site-like photo with one solid marker box whose position is known."""
+    rng = np.random.default_rng(0)
+    # texture values stay in 40..180 so the saturated red marker is the only pixel run that matches
+    image = cv2.resize(rng.integers(40, 180, (height // 16, width // 16, 3), dtype=np.uint8), (width, height))
+    x_min, y_min, x_max, y_max = (int(BOX[0] * width), int(BOX[1] * height), int(BOX[2] * width), int(BOX[3] * height))
+    cv2.rectangle(image, (x_min, y_min), (x_max, y_max), (0, 0, 255), -1)
+    return cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, 85])[1].tobytes()
+
+
+def box_error(image: np.ndarray, scale: tuple[float, float], width: int, height: int) -> float:
+    """Largest coordinate error (original pixels) of the red marker box found on the decoded frame."""
+    mask = (image[:, :, 2] > 200) & (image[:, :, 1] < 40) & (image[:, :, 0] < 40)
+    ys, xs = np.nonzero(mask)
+    found = [xs.min() * scale[0], ys.min() * scale[1], (xs.max() + 1) * scale[0], (ys.max() + 1) * scale[1]]
+    expected = [int(BOX[0] * width), int(BOX[1] * height), int(BOX[2] * width) + 1, int(BOX[3] * height) + 1]
+    return max(abs(a - b) for a, b in zip(found, expected, strict=True))
+
+
+def letterbox(image: np.ndarray, size: int) -> np.ndarray:
+    height, width = image.shape[:2]
+    ratio = size / max(height, width)
+    resized = cv2.resize(image, (round(width * ratio), round(height * ratio)), interpolation=cv2.INTER_LINEAR)
+    canvas = np.full((size, size, 3), 114, dtype=np.uint8)
+    canvas[:resized.shape[0], :resized.shape[1]] = resized
+    return canvas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", nargs="+", default=["1920x1080", "4000x3000", "6000x4000"])
+    parser.add_argument("--repeats", type=int, default=10)
+    args = parser.parse_args()
+
+    services = {reduced: ImageService(settings=settings.model_copy(update={"REDUCED_JPEG_DECODE": reduced, "TILE_INFERENCE": False}),
+                                      logger=logger, storage=storage_manager)
+                for reduced in (False, True)}
+    print(f"{'image':<11} {'decode':<9} {'decoded':>11} {'decode ms':>10} {'letterbox ms':>13} {'total ms':>9} "
+          f"{'frame MB':>9} {'box err px':>11}")
+    for size in args.sizes:
+        width, height = (int(side) for side in size.split("x"))
+        content = make_jpeg(width, height)
+        for reduced, service in services.items():
+            decode_times, letterbox_times = [], []
+            for _ in range(args.repeats + 1):
+                started_at = time.perf_counter()
+                image, scale = service.decode_for_inference(content)
+                decoded_at = time.perf_counter()
+                letterbox(image, settings.MODEL_IMG_SIZE)
+                decode_times.append((decoded_at - started_at) * 1000)
+                letterbox_times.append((time.perf_counter() - decoded_at) * 1000)
+            decode_ms, letterbox_ms = statistics.median(decode_times[1:]), statistics.median(letterbox_times[1:])
+            print(f"{size:<11} {'reduced' if reduced else 'full':<9} {f'{image.shape[1]}x{image.shape[0]}':>11} "
+                  f"{decode_ms:>10.1f} {letterbox_ms:>13.1f} {decode_ms + letterbox_ms:>9.1f} "
+                  f"{image.nbytes / 1024 / 1024:>9.1f} {box_error(image, scale, width, height):>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+What logging costs per /detect request on the calling thread (the event loop / inference threads), before and
+after the queue-based structured logging.
+
+Every simulated request emits the records the serving path writes: the micro-batch and two inference lines
+(INFO before, DEBUG now) and, after, one access record with the stage timings. Files go to a temporary
+directory and the console to /dev/null. "caller" is the time spent in the log calls of the request,
+"drain" the time until everything is on disk (the listener thread catches up after the burst).
+
+Usage (from the backend directory):
+    python benchmarks/bench_logging.py --requests 20000
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from logger import Logger, _request_context
+
+TIMINGS_MS = {"upload_read": 0.01, "validation": 0.03, "decode": 1.8, "preprocess": 4.7, "forward": 84.0,
+              "nms": 0.5, "plot": 0.4, "encode": 1.5, "base64": 0.2}
+
+
+def run(log: Logger, requests: int, hot_level: str, access_sample_rate: float) -> tuple[list[float], float]:
+    hot = getattr(log, hot_level)
+    latencies = []
+    started_at = time.perf_counter()
+    for index in range(requests):
+        token = _request_context.set({"request_id": f"{index:032x}", "timings": {}})
+        request_started_at = time.perf_counter()
+        hot("Running micro-batch of 1 images")
+        hot("Running inference on image: array (720, 1280, 3)")
+        hot("Inference completed.")
+        if access_sample_rate and index % round(1 / access_sample_rate) == 0:
+            log.info("request completed", method="POST", path="/api/v1/detect", status=201,
+                     duration_ms=95.3, timings_ms=TIMINGS_MS)
+        latencies.append((time.perf_counter() - request_started_at) * 1e6)
+        _request_context.reset(token)
+    log.stop()
+    for handler in log.logger.handlers:
+        handler.flush()
+    return latencies, time.perf_counter() - started_at
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20000)
+    args = parser.parse_args()
+
+    scenarios = [
+        ("before: sync text, hot lines at INFO", dict(), "info", 0.0),
+        ("sync json + rotation, hot lines at DEBUG", dict(structured=True, max_bytes=10 * 1024 * 1024), "debug", 1.0),
+        ("after: queue json + rotation", dict(structured=True, use_queue=True, max_bytes=10 * 1024 * 1024), "debug", 1.0),
+        ("after, access records sampled 10%", dict(structured=True, use_queue=True, max_bytes=10 * 1024 * 1024), "debug", 0.1),
+    ]
+    stderr = sys.stderr
+    print(f"{'scenario':<42} {'caller us/req':>14} {'p99 us':>8} {'drain s':>8}")
+    with tempfile.TemporaryDirectory() as log_dir, open(os.devnull, "w") as devnull:
+        for index, (name, options, hot_level, sample_rate) in enumerate(scenarios):
+            sys.stderr = devnull  # the console handler binds sys.stderr when it is created
+            try:
+                log = Logger(name=f"bench_logging_{index}", log_dir=log_dir, **options)
+                latencies, elapsed = run(log, args.requests, hot_level, sample_rate)
+            finally:
+                sys.stderr = stderr
+            latencies.sort()
+            print(f"{name:<42} {statistics.fmean(latencies):>14.2f} {latencies[int(0.99 * (len(latencies) - 1))]:>8.1f} "
+                  f"{elapsed:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
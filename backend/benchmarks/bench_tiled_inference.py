@@ -0,0 +1,82 @@
+"""
+Sliced (tiled) inference versus full-frame inference at a larger model input size on high-resolution frames.
+
+Full-frame runs pass the whole frame at --imgsz (the usual workaround for small heads/helmets), tiled runs
+use TILE_SIZE tiles at the default model size. The synthetic frames have textured "yard" regions and flat
+areas (sky/walls) so the foreground skipping has tiles to drop. Detections counts are only meaningful with
+real fine-tuned weights; on random weights compare the latency and model input volume.
+
+Usage (from the backend directory):
+    python benchmarks/bench_tiled_inference.py --frames 5 --imgsz 1280 1920 --width 3840 --height 2160
+"""
+import argparse
+import os
+import sys
+import time
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+
+from inference import InferenceManager
+from logger import logger
+from settings import settings
+from tiling import TileSlicer
+
+
+def make_frames(count: int, width: int, height: int) -> list[np.ndarray]:
+    rng = np.random.default_rng(0)
+    frames = []
+    for _ in range(count):
+        frame = np.full((height, width, 3), 180, dtype=np.uint8)  # flat sky / walls
+        yard_top = height // 3
+        frame[yard_top:] = rng.integers(0, 255, (height - yard_top, width, 3), dtype=np.uint8)
+        frames.append(frame)
+    return frames
+
+
+def time_runs(run, frames: list[np.ndarray]) -> tuple[float, int]:
+    run(frames[:1])  # warm-up
+    started_at = time.perf_counter()
+    detections = sum(len(result.boxes) for result in run(frames))
+    return (time.perf_counter() - started_at) / len(frames), detections
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=5)
+    parser.add_argument("--width", type=int, default=3840)
+    parser.add_argument("--height", type=int, default=2160)
+    parser.add_argument("--imgsz", type=int, nargs="+", default=[settings.MODEL_IMG_SIZE, 1280, 1920],
+                        help="full-frame model input sizes to compare against")
+    parser.add_argument("--merge", choices=["nms", "wbf"], default="nms")
+    args = parser.parse_args()
+
+    frames = make_frames(args.frames, args.width, args.height)
+    full_settings = settings.model_copy(update={"TILE_INFERENCE": False})
+    manager = InferenceManager(model_path=str(settings.MODEL_WEIGHTS_PATH), settings=full_settings, logger=logger)
+    print(f"{'mode':<34} {'ms/frame':>10} {'model px/frame':>15} {'detections':>11}")
+
+    for imgsz in args.imgsz:
+        def run_full(batch, imgsz=imgsz):
+            return [manager.model.predict(source=frame, imgsz=imgsz, device=manager.device, verbose=False,
+                                          conf=manager.confidence_threshold, iou=manager.iou_threshold)[0]
+                    for frame in batch]
+        seconds, detections = time_runs(run_full, frames)
+        print(f"{f'full frame imgsz={imgsz}':<34} {seconds * 1000:>10.1f} {imgsz * imgsz:>15,} {detections:>11}")
+
+    for skip in (False, True):
+        for include_full_frame in (False, True):
+            tiled_settings = settings.model_copy(update={"TILE_INFERENCE": True,
+                                                         "TILE_MERGE_METHOD": args.merge,
+                                                         "TILE_INCLUDE_FULL_FRAME": include_full_frame,
+                                                         "TILE_MIN_EDGE_ENERGY": settings.TILE_MIN_EDGE_ENERGY if skip else 0})
+            manager.slicer = TileSlicer(settings=tiled_settings, logger=logger)
+            seconds, detections = time_runs(manager.predict_tiled, frames)
+            sliced = manager.slicer.tiles_total - manager.slicer.tiles_skipped
+            model_pixels = (sliced / (args.frames + 1) + include_full_frame) * settings.MODEL_IMG_SIZE ** 2
+            label = f"tiled {settings.TILE_SIZE}{' +full' if include_full_frame else ''}{' skip-flat' if skip else ''}"
+            print(f"{label:<34} {seconds * 1000:>10.1f} {int(model_pixels):>15,} {detections:>11}")
+
+
+if __name__ == "__main__":
+    main()
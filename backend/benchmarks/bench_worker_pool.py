@@ -0,0 +1,65 @@
+"""
+Throughput of the multi-process inference worker pool for different worker counts.
+
+Usage (from the backend directory):
+    python benchmarks/bench_worker_pool.py --workers 1 2 4 8 --images 256 --batch-size 4
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+
+from logger import logger
+from settings import settings
+from worker_pool import InferenceWorkerPool
+
+
+def run(workers: int, threads_per_worker: int, images: list[np.ndarray], batch_size: int) -> float:
+    """Return images per second for one pool configuration."""
+    pool_settings = settings.model_copy(update={"INFERENCE_WORKER_PROCESSES": workers,
+                                                "INFERENCE_THREADS_PER_WORKER": threads_per_worker})
+    pool = InferenceWorkerPool(settings=pool_settings, logger=logger)
+    batches = [images[i:i + batch_size] for i in range(0, len(images), batch_size)]
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as dispatchers:
+            # warm-up: every worker loads its model replica before timing starts
+            list(dispatchers.map(pool.detect_batch, batches[:workers]))
+
+            started_at = time.perf_counter()
+            list(dispatchers.map(pool.detect_batch, batches))
+            elapsed = time.perf_counter() - started_at
+    finally:
+        pool.shutdown()
+    return len(images) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--threads-per-worker", type=int, default=0, 
+                        help="torch threads per worker (0 = split the CPU cores evenly)")
+    parser.add_argument("--images", type=int, default=128)
+    parser.add_argument("--batch-size", type=int, default=4)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--width", type=int, default=1280)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    images = [rng.integers(0, 255, (args.height, args.width, 3), dtype=np.uint8) for _ in range(args.images)]
+    cores = os.cpu_count() or 1
+
+    print(f"{'workers':>8} {'threads/worker':>15} {'images/s':>10} {'speedup':>8}")
+    baseline = None
+    for workers in args.workers:
+        threads_per_worker = args.threads_per_worker or max(1, cores // workers)
+        throughput = run(workers, threads_per_worker, images, args.batch_size)
+        baseline = baseline or throughput
+        print(f"{workers:>8} {threads_per_worker:>15} {throughput:>10.1f} {throughput / baseline:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
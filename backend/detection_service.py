@@ -0,0 +1,239 @@
+import asyncio
+import io
+import mimetypes
+import zipfile
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import AsyncIterator, Optional
+from uuid import uuid4
+
+import numpy as np
+
+from detection_store import DetectionStore, StoredDetection, detection_store
+from image_service import ImageService, image_service
+from inference import detections_to_columns
+from inference_scheduler import BatchInferenceScheduler, InferenceQueueFullError, inference_scheduler
+from logger import add_request_timings, logger, Logger
+from metrics import MetricsRegistry, metrics
+from model_loader import ModelNotReadyError
+from result_cache import CachedDetection, ResultCache, result_cache
+from schemas.detect_schemas import ImageUploadSchema
+from settings import Settings, settings
+
+
+@dataclass
+class UploadedImage:
+    """One image of a batch request (a multipart file or an entry of a zip archive)."""
+    filename: str
+    content_type: str
+    content: bytes
+    size: int
+
+
+class DetectionService:
+    """
+    The PPE detection pipeline shared by the single-image and batch endpoints:
+    result cache lookup, in-memory decoding, micro-batched inference, encoding and optional persistence.
+    Decoding, encoding and base64 run in worker threads so these CPU stages of concurrent requests overlap.
+    Every result is kept in the detection store so reports can later be generated from the image_id alone.
+    Stage timings (validation, decode, encode, base64) and image/violation counters go to `metrics`.
+    """
+    ARCHIVE_TYPES = ("application/zip", "application/x-zip-compressed")
+
+    def __init__(self, scheduler: BatchInferenceScheduler, cache: ResultCache, store: DetectionStore, 
+                 image_service: ImageService, metrics: MetricsRegistry, settings: Settings, logger: Logger):
+        self.scheduler = scheduler
+        self.cache = cache
+        self.store = store
+        self.image_service = image_service
+        self.metrics = metrics
+        self.settings = settings
+        self.logger = logger
+
+    async def _submit(self, image, retries: int, annotate: bool = True):
+        """Submit to the scheduler, optionally waiting and retrying while the inference queue is full."""
+        for attempt in range(retries + 1):
+            try:
+                return await self.scheduler.submit(image, annotate=annotate)
+            except InferenceQueueFullError:
+                if attempt == retries:
+                    raise
+                await asyncio.sleep(self.settings.INFERENCE_RETRY_AFTER_SECONDS)
+
+    async def detect(self, content: bytes, image_id: str, retries: int = 0, 
+                     batch_id: Optional[str] = None, annotate: bool = True) -> tuple[StoredDetection, str]:
+        """
+        Run detection on one validated upload. Returns the stored result and the cache status (hit/miss).
+        Without `annotate` the annotated image is neither drawn nor encoded (detections-only requests).
+        """
+        cached, cache_status = await self._detect(content, image_id, retries=retries, annotate=annotate)
+        self.metrics.inc("images", cache=cache_status)
+        self.metrics.inc("violations", cached.violations)
+        self.metrics.inc("compliances", cached.compliances)
+        stored = StoredDetection(image_id=image_id,
+                                 timestamp=datetime.now(),
+                                 detections=cached.detections,
+                                 violations=cached.violations,
+                                 compliances=cached.compliances,
+                                 annotated_image=cached.annotated_image,
+                                 model_version=cached.model_version,
+                                 batch_id=batch_id)
+        self.store.put(stored)
+        return stored, cache_status
+
+    def _decode(self, content: bytes) -> tuple[np.ndarray, tuple[float, float], Optional[int]]:
+        """Decode an upload and hash it for the perceptual cache (runs in a worker thread)."""
+        with self.metrics.time("decode"):
+            image, scale = self.image_service.decode_for_inference(content)
+        # hashed before inference, the annotations are drawn onto the decoded frame
+        return image, scale, self.cache.image_hash(image)
+
+    def _encode(self, annotated_image: np.ndarray) -> bytes:
+        with self.metrics.time("encode"):
+            return self.image_service.encode_annotated(annotated_image)
+
+    def to_base64(self, content: bytes) -> str:
+        with self.metrics.time("base64"):
+            return self.image_service.to_base64(content)
+
+    async def _detect(self, content: bytes, image_id: str, retries: int, annotate: bool) -> tuple[CachedDetection, str]:
+        model_signature = self.scheduler.model_signature
+
+        # Identical re-uploads are answered from the cache without even decoding the image
+        # (a detections-only entry cannot answer a request that needs the annotated image)
+        cached = self.cache.get(content, model_signature, annotated=annotate)
+        if cached is not None:
+            return cached, "hit"
+
+        # Decoding the upload straight from memory (large JPEGs at a reduced scale) in a worker thread,
+        # so the decoding of concurrent requests overlaps. Disk is touched only if persistence is enabled
+        image, scale, image_hash = await asyncio.to_thread(self._decode, content)
+        # near-duplicates only match at the original resolution, the bboxes are in its coordinates
+        height, width = image.shape[:2]
+        image_size = (round(width * scale[0]), round(height * scale[1]))
+        cached = self.cache.get_similar(image, model_signature, image_hash=image_hash, image_size=image_size, annotated=annotate)
+        if cached is not None:
+            return cached, "hit"
+
+        if self.settings.PERSIST_UPLOADS:
+            await self.image_service.save_upload(content, image_id=image_id)
+
+        # Single model pass (micro-batched with concurrent requests):
+        # detections and the annotated image come from the same results
+        inference_result = await self._submit(image, retries=retries, annotate=annotate)
+        add_request_timings(inference_result.timings)
+
+        annotated_content = None
+        if inference_result.annotated_image is not None:
+            annotated_content = await asyncio.to_thread(self._encode, inference_result.annotated_image)
+        if annotated_content is not None and self.settings.PERSIST_ANNOTATED_IMAGES:
+            await self.image_service.save_annotated(annotated_content, image_id=image_id)
+
+        cached = CachedDetection(detections=self.image_service.rescale_detections(inference_result.detections, scale),
+                                 violations=inference_result.violations,
+                                 compliances=inference_result.compliances,
+                                 annotated_image=annotated_content,
+                                 model_version=inference_result.model_version,
+                                 image_size=image_size)
+        self.cache.put(content, model_signature, cached, image_hash=image_hash)
+        return cached, "miss"
+
+    def extract_archive(self, archive: bytes, max_images: Optional[int] = None) -> list[UploadedImage]:
+        """
+        Read the image entries of a zip archive. The entry count and the declared sizes are checked before
+        anything is decompressed, and every entry is read with a bound so a lying header cannot expand further.
+        `max_images` is how many more images the batch can take (BATCH_DETECT_MAX_IMAGES by default).
+        """
+        max_images = self.settings.BATCH_DETECT_MAX_IMAGES if max_images is None else max_images
+        limit = self.settings.MAX_IMAGE_UPLOAD_BYTES
+        images = []
+        try:
+            with zipfile.ZipFile(io.BytesIO(archive)) as zip_file:
+                entries = [info for info in zip_file.infolist()
+                           if not (info.is_dir() or Path(info.filename).name.startswith(".") or "__MACOSX" in Path(info.filename).parts)]
+                if len(entries) > max_images:
+                    raise ValueError(f"Too many images in one batch: the archive holds {len(entries)} "
+                                     f"(max {self.settings.BATCH_DETECT_MAX_IMAGES})")
+                declared_size = sum(info.file_size for info in entries if info.file_size <= limit)
+                if declared_size > self.settings.BATCH_DETECT_MAX_EXTRACTED_MB * 1024 * 1024:
+                    raise ValueError(f"Archive is too large when extracted: max {self.settings.BATCH_DETECT_MAX_EXTRACTED_MB} MB")
+                for info in entries:
+                    name = Path(info.filename)
+                    content_type = mimetypes.guess_type(name.name)[0] or "application/octet-stream"
+                    # oversized entries are reported by the per-image validation without being extracted
+                    content, size = b"", info.file_size
+                    if info.file_size <= limit:
+                        with zip_file.open(info) as entry:
+                            content = entry.read(limit + 1)
+                        if len(content) > limit:
+                            content, size = b"", len(content)
+                    images.append(UploadedImage(filename=name.name, content_type=content_type, content=content, size=size))
+        except zipfile.BadZipFile as e:
+            raise ValueError(f"Invalid zip archive: {e}")
+        return images
+
+    def is_archive(self, filename: Optional[str], content_type: Optional[str]) -> bool:
+        return content_type in self.ARCHIVE_TYPES or (filename or "").lower().endswith(".zip")
+
+    async def _detect_batch_item(self, item: UploadedImage, batch_id: str, include_annotated_image: bool,
+                                 columns: bool) -> dict:
+        image_id = f"{uuid4()}_{item.filename}"
+        record = {"filename": item.filename, "image_id": image_id}
+        try:
+            with self.metrics.time("validation"):
+                ImageUploadSchema(filename=item.filename, content_type=item.content_type, size=item.size)
+                self.image_service.check_header(self.image_service.probe(item.content), item.content_type)
+            # batch requests wait for queue capacity instead of failing the whole batch
+            stored, cache_status = await self.detect(item.content, image_id, retries=3, batch_id=batch_id)
+        except (ValueError, InferenceQueueFullError, ModelNotReadyError) as e:
+            return {**record, "error": str(e)}
+
+        if columns:
+            record["detection_columns"] = detections_to_columns(stored.detections)
+        else:
+            record["detections"] = stored.detections
+        record.update({
+            "summary": {"helmet_count": stored.compliances, "no_helmet_count": stored.violations},
+            "cache": cache_status,
+            "model_version": stored.model_version,
+        })
+        if include_annotated_image:
+            record["annotated_image"] = await asyncio.to_thread(self.to_base64, stored.annotated_image)
+        return record
+
+    async def detect_many(self, items: list[UploadedImage], batch_id: str, 
+                          include_annotated_images: bool = False, columns: bool = False) -> AsyncIterator[dict]:
+        """
+        Run detection over many images. Images are submitted in chunks of MAX_BATCH_SIZE so every chunk
+        becomes one tensor batch, and per-image records are yielded in order as soon as their chunk is done.
+        With `columns` the detections of a record are in the compact columnar form.
+        """
+        chunk_size = max(1, self.settings.MAX_BATCH_SIZE)
+        for start in range(0, len(items), chunk_size):
+            chunk = items[start:start + chunk_size]
+            records = await asyncio.gather(*(self._detect_batch_item(item, batch_id, include_annotated_images, columns) for item in chunk))
+            for record in records:
+                yield record
+
+    @staticmethod
+    def aggregate(records: list[dict]) -> dict:
+        """Aggregate violation/compliance summary over the per-image records of a batch."""
+        succeeded = [record for record in records if "error" not in record]
+        return {
+            "total_images": len(records),
+            "processed_images": len(succeeded),
+            "failed_images": len(records) - len(succeeded),
+            "helmet_count": sum(record["summary"]["helmet_count"] for record in succeeded),
+            "no_helmet_count": sum(record["summary"]["no_helmet_count"] for record in succeeded),
+            "images_with_violations": sum(1 for record in succeeded if record["summary"]["no_helmet_count"] > 0),
+        }
+
+
+detection_service = DetectionService(scheduler=inference_scheduler,
+                                     cache=result_cache,
+                                     store=detection_store,
+                                     image_service=image_service,
+                                     metrics=metrics,
+                                     settings=settings,
+                                     logger=logger)
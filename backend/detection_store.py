@@ -0,0 +1,98 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Iterator, Optional
+
+from logger import logger, Logger
+from settings import Settings, settings
+
+
+@dataclass
+class StoredDetection:
+    """Detections and the encoded annotated image (None if it was not requested) of one processed image, kept for report generation."""
+    image_id: str
+    timestamp: datetime
+    detections: list[dict]
+    violations: int
+    compliances: int
+    annotated_image: Optional[bytes]
+    model_version: Optional[str] = None
+    batch_id: Optional[str] = None
+    stored_at: float = field(default_factory=time.monotonic)
+
+    @property
+    def size_bytes(self) -> int:
+        return len(self.annotated_image or b"") + 128 * len(self.detections) + 256
+
+
+class DetectionStore:
+    """
+    Bounded server-side store of detection results keyed by image_id, so reports can be generated
+    from an image_id alone instead of clients sending the base64 annotated image back.
+    Oldest entries are evicted above DETECTION_STORE_MAX_ENTRIES / DETECTION_STORE_MAX_BYTES
+    and entries expire after DETECTION_STORE_TTL_SECONDS.
+    """
+    def __init__(self, settings: Settings, logger: Logger):
+        self.settings = settings
+        self.logger = logger
+        self.max_entries = self.settings.DETECTION_STORE_MAX_ENTRIES
+        self.max_bytes = self.settings.DETECTION_STORE_MAX_BYTES
+        self.ttl = self.settings.DETECTION_STORE_TTL_SECONDS
+
+        self._entries: OrderedDict[str, StoredDetection] = OrderedDict()
+        self._size_bytes = 0
+        self._evictions = 0
+        self._lock = threading.Lock()
+
+    def _remove(self, image_id: str) -> None:
+        entry = self._entries.pop(image_id)
+        self._size_bytes -= entry.size_bytes
+
+    def _is_expired(self, entry: StoredDetection) -> bool:
+        return time.monotonic() - entry.stored_at > self.ttl
+
+    def put(self, entry: StoredDetection) -> None:
+        if entry.size_bytes > self.max_bytes:
+            self.logger.warning(f"Detection {entry.image_id} is larger than the whole store budget, not stored")
+            return
+        with self._lock:
+            if entry.image_id in self._entries:
+                self._remove(entry.image_id)
+            self._entries[entry.image_id] = entry
+            self._size_bytes += entry.size_bytes
+            while len(self._entries) > self.max_entries or self._size_bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self._evictions += 1
+
+    def get(self, image_id: str) -> Optional[StoredDetection]:
+        with self._lock:
+            entry = self._entries.get(image_id)
+            if entry is not None and self._is_expired(entry):
+                self._remove(image_id)
+                return None
+            return entry
+
+    def batch(self, batch_id: str) -> Iterator[StoredDetection]:
+        """Stored detections of one batch in the order they were processed."""
+        with self._lock:
+            entries = [entry for entry in self._entries.values() if entry.batch_id == batch_id and not self._is_expired(entry)]
+        return iter(entries)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._size_bytes = 0
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "size_bytes": self._size_bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "evictions": self._evictions,
+        }
+
+
+detection_store = DetectionStore(settings=settings, logger=logger)
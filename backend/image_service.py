@@ -0,0 +1,219 @@
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+import base64
+
+import aiofiles
+import numpy as np
+import cv2
+
+from logger import logger, Logger
+from settings import Settings, settings
+from storage_manager import StorageManager, storage_manager
+
+
+class UploadTooLargeError(ValueError):
+    """Raised when an upload is bigger than the configured limit (answered with HTTP 413)."""
+
+
+@dataclass
+class ImageHeader:
+    """Format and dimensions of an encoded image, read from its header without decoding the pixels."""
+    format: str
+    media_type: str
+    width: int
+    height: int
+
+
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# JPEG start-of-frame markers (the ones carrying the frame size), DHT/JPG/DAC share the 0xC? range
+_JPEG_SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+# markers without a length field
+_JPEG_STANDALONE_MARKERS = frozenset(range(0xD0, 0xDA)) | {0x01}
+
+
+class ImageService:
+    """
+    Handles in-memory image decoding/encoding for the detection pipeline.
+    Images are only written to disk when persistence is explicitly enabled in the settings,
+    annotated images go to the sharded inference_results storage area.
+    Annotated images are encoded as ANNOTATED_IMAGE_FORMAT at ANNOTATED_IMAGE_QUALITY, downscaled to
+    ANNOTATED_IMAGE_MAX_SIDE when it is set.
+    With REDUCED_JPEG_DECODE (opt-in) large JPEGs are decoded straight at a libjpeg scale (1/2, 1/4, 1/8) whose longer
+    side still covers MODEL_IMG_SIZE, since the model letterboxes to that size anyway.
+    """
+    REDUCED_JPEG_FLAGS = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2))
+    FORMATS = {
+        "jpeg": (".jpg", "image/jpeg", cv2.IMWRITE_JPEG_QUALITY),
+        "webp": (".webp", "image/webp", cv2.IMWRITE_WEBP_QUALITY),
+    }
+
+    def __init__(self, settings: Settings, logger: Logger, storage: StorageManager):
+        self.settings = settings
+        self.logger = logger
+        self.storage = storage
+        self.upload_dir = Path(self.settings.IMAGE_UPLOAD_DIR)
+        self.annotated_extension, self.annotated_media_type, self._quality_flag = self.FORMATS[self.settings.ANNOTATED_IMAGE_FORMAT]
+        self.annotated_quality = min(max(self.settings.ANNOTATED_IMAGE_QUALITY, 1), 100)
+        self.annotated_max_side = max(0, self.settings.ANNOTATED_IMAGE_MAX_SIDE)
+        # sliced inference needs the full resolution
+        self.reduced_decode = self.settings.REDUCED_JPEG_DECODE and not self.settings.TILE_INFERENCE
+
+    @staticmethod
+    def decode(content: bytes) -> np.ndarray:
+        """Decode raw uploaded bytes straight into a BGR image array."""
+        image = cv2.imdecode(np.frombuffer(content, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            raise ValueError("Uploaded file could not be decoded as an image.")
+        return image
+
+    def reduction_factor(self, header: Optional[ImageHeader]) -> int:
+        """Largest JPEG scale-down factor that leaves the longer side at MODEL_IMG_SIZE or more (1: full decode)."""
+        if not self.reduced_decode or header is None or header.format != "jpeg":
+            return 1
+        longer_side = max(header.width, header.height)
+        return next((factor for factor, _ in self.REDUCED_JPEG_FLAGS if longer_side / factor >= self.settings.MODEL_IMG_SIZE), 1)
+
+    def decode_for_inference(self, content: bytes) -> tuple[np.ndarray, tuple[float, float]]:
+        """
+        Decode an upload for the model, large JPEGs at a reduced scale (the DCT is only partially inverted,
+        most of the decode work is skipped). Returns the image and the (x, y) factors mapping its
+        coordinates back to the original image.
+        """
+        try:
+            header = self.probe(content)
+        except ValueError:
+            header = None  # left to the full decode to report
+        factor = self.reduction_factor(header)
+        if factor == 1:
+            return self.decode(content), (1.0, 1.0)
+
+        flag = next(flag for reduction, flag in self.REDUCED_JPEG_FLAGS if reduction == factor)
+        image = cv2.imdecode(np.frombuffer(content, dtype=np.uint8), flag)
+        if image is None:
+            raise ValueError("Uploaded file could not be decoded as an image.")
+        height, width = image.shape[:2]
+        original_width, original_height = header.width, header.height
+        if (width > height) != (original_width > original_height):
+            # the EXIF orientation was applied on decode, the header has the stored (unrotated) size
+            original_width, original_height = original_height, original_width
+        return image, (original_width / width, original_height / height)
+
+    @staticmethod
+    def rescale_detections(detections: list[dict], scale: tuple[float, float]) -> list[dict]:
+        """Map detection boxes of a reduced decode back to original image coordinates."""
+        if scale == (1.0, 1.0):
+            return detections
+        scale_x, scale_y = scale
+        return [{**detection, "bbox": [round(x_min * scale_x), round(y_min * scale_y), round(x_max * scale_x), round(y_max * scale_y)]}
+                for detection in detections
+                for x_min, y_min, x_max, y_max in [detection["bbox"]]]
+
+    @staticmethod
+    def probe(head: bytes) -> Optional[ImageHeader]:
+        """
+        Sniff the format from the magic bytes and read the dimensions from the PNG IHDR chunk or the JPEG
+        start-of-frame segment. Returns None while `head` is too short to tell, raises ValueError for
+        anything that is not a JPEG or PNG.
+        """
+        if head.startswith(_PNG_SIGNATURE):
+            if len(head) < 24:
+                return None
+            if head[12:16] != b"IHDR":
+                raise ValueError("Uploaded file is not a valid PNG image.")
+            return ImageHeader("png", "image/png", int.from_bytes(head[16:20], "big"), int.from_bytes(head[20:24], "big"))
+
+        if head.startswith(b"\xff\xd8\xff"):
+            offset = 2
+            while offset + 4 <= len(head):
+                if head[offset] != 0xFF:
+                    raise ValueError("Uploaded file is not a valid JPEG image.")
+                marker = head[offset + 1]
+                if marker == 0xFF:  # fill byte
+                    offset += 1
+                    continue
+                if marker in _JPEG_STANDALONE_MARKERS:
+                    offset += 2
+                    continue
+                if marker in _JPEG_SOF_MARKERS:
+                    if offset + 9 > len(head):
+                        return None
+                    height = int.from_bytes(head[offset + 5:offset + 7], "big")
+                    width = int.from_bytes(head[offset + 7:offset + 9], "big")
+                    return ImageHeader("jpeg", "image/jpeg", width, height)
+                if marker == 0xDA:  # image data started without a frame header
+                    raise ValueError("Uploaded file is not a valid JPEG image.")
+                offset += 2 + int.from_bytes(head[offset + 2:offset + 4], "big")
+            return None
+
+        if len(head) < len(_PNG_SIGNATURE) and (_PNG_SIGNATURE.startswith(head) or b"\xff\xd8\xff".startswith(head[:3])):
+            return None
+        raise ValueError("Uploaded file is not a JPEG or PNG image.")
+
+    def check_header(self, header: Optional[ImageHeader], content_type: Optional[str]) -> ImageHeader:
+        """The sniffed format has to match the declared content type and the pixel count MAX_IMAGE_PIXELS."""
+        if header is None:
+            raise ValueError("Uploaded image is truncated or empty.")
+        declared = "image/jpeg" if content_type == "image/jpg" else content_type
+        if declared != header.media_type:
+            raise ValueError(f"Uploaded file content is {header.media_type} but it was sent as {content_type}.")
+        if header.width * header.height > self.settings.MAX_IMAGE_PIXELS:
+            raise ValueError(f"Image is too large: {header.width}x{header.height} pixels "
+                             f"(max {self.settings.MAX_IMAGE_PIXELS} pixels)")
+        return header
+
+    def check_content(self, content: bytes, content_type: Optional[str] = None) -> ImageHeader:
+        """
+        Size (MAX_IMAGE_UPLOAD_BYTES), magic bytes and pixel count of a complete encoded image, before it is decoded.
+        Without a declared content type (websocket frames) only the pixel count is checked against the sniffed format.
+        """
+        if len(content) > self.settings.MAX_IMAGE_UPLOAD_BYTES:
+            raise UploadTooLargeError(f"Image file is too large: max size is {self.settings.MAX_IMAGE_UPLOAD_BYTES} bytes")
+        header = self.probe(content)
+        return self.check_header(header, content_type or (header.media_type if header is not None else None))
+
+    @staticmethod
+    def encode(image: np.ndarray, extension: str = ".jpg") -> bytes:
+        """Encode an image array in memory (JPEG by default)."""
+        success, buffer = cv2.imencode(extension, image)
+        if not success:
+            raise ValueError(f"Failed to encode image as {extension}.")
+        return buffer.tobytes()
+
+    def encode_annotated(self, image: np.ndarray) -> bytes:
+        """Encode an annotated frame for responses with the configured format, quality and max size."""
+        height, width = image.shape[:2]
+        if self.annotated_max_side and max(height, width) > self.annotated_max_side:
+            scale = self.annotated_max_side / max(height, width)
+            image = cv2.resize(image, (max(1, round(width * scale)), max(1, round(height * scale))),
+                               interpolation=cv2.INTER_AREA)
+        success, buffer = cv2.imencode(self.annotated_extension, image, [self._quality_flag, self.annotated_quality])
+        if not success:
+            raise ValueError(f"Failed to encode image as {self.annotated_extension}.")
+        return buffer.tobytes()
+
+    @staticmethod
+    def to_base64(content: bytes) -> str:
+        """Base64 representation of encoded image bytes for JSON responses."""
+        return base64.b64encode(content).decode('utf-8')
+
+    async def save_upload(self, content: bytes, image_id: str) -> Path:
+        """Persist the original upload (only used when PERSIST_UPLOADS is enabled)."""
+        self.upload_dir.mkdir(parents=True, exist_ok=True)
+        output_path = self.upload_dir / image_id
+        async with aiofiles.open(output_path, 'wb') as out_file:
+            await out_file.write(content)
+        self.logger.info(f"Uploaded image saved to: {output_path}")
+        return output_path
+
+    async def save_annotated(self, content: bytes, image_id: str) -> Path:
+        """Persist the encoded annotated image (only used when PERSIST_ANNOTATED_IMAGES is enabled)."""
+        output_path = self.storage.path_for("inference_results", f"{Path(image_id).stem}_annotated{self.annotated_extension}")
+        async with aiofiles.open(output_path, 'wb') as out_file:
+            await out_file.write(content)
+        self.storage.track("inference_results", output_path)
+        self.logger.info(f"Annotated image saved to: {output_path}")
+        return output_path
+
+
+image_service = ImageService(settings=settings, logger=logger, storage=storage_manager)
@@ -1,17 +1,69 @@
 from pathlib import Path
 from typing import Optional
+from dataclasses import dataclass, field
+import hashlib
+import threading
+import time
 
-from ultralytics import YOLO
-import torch
-import cv2  
+import numpy as np
 
+from annotation import AnnotationRenderer
 from logger import logger, Logger
 from settings import Settings, settings
+from tiling import TileSlicer
+
+
+@dataclass
+class InferenceResult:
+    """
+    Detections, violation/compliance counts and the annotated frame (None if not requested) of a single model pass.
+    `timings` holds the per-image stage durations in seconds (preprocess, forward, nms, plot) for the metrics.
+    """
+    detections: list[dict]
+    violations: int
+    compliances: int
+    annotated_image: Optional[np.ndarray]
+    model_version: Optional[str] = None
+    timings: dict[str, float] = field(default_factory=dict)
+
+
+def _stage_timings(result) -> dict[str, float]:
+    """Per-image preprocess / forward / NMS durations (seconds) from the ultralytics speed figures (ms)."""
+    return {stage: result.speed[key] / 1000 for stage, key in (("preprocess", "preprocess"), ("forward", "inference"), ("nms", "postprocess"))
+            if result.speed.get(key) is not None}
+
+
+def detections_to_columns(detections: list[dict]) -> dict:
+    """Compact columnar form of detection dicts: parallel `classes`, `confidences` and `bboxes` arrays."""
+    return {
+        "classes": [detection["class"] for detection in detections],
+        "confidences": [detection["confidence"] for detection in detections],
+        "bboxes": [detection["bbox"] for detection in detections],
+    }
+
+
+def result_signature(model_version: str, confidence_threshold: float, iou_threshold: float, slicer: TileSlicer) -> str:
+    """Everything besides the image that changes the detections (used as part of result cache keys)."""
+    signature = f"{model_version}:{confidence_threshold}:{iou_threshold}"
+    return signature if not slicer.enabled else f"{signature}:{slicer.signature}"
+
+
+def compute_model_version(model_path: Path, backend: str, precision: str) -> str:
+    """Short content hash of the weights plus the serving backend/precision."""
+    model_path = Path(model_path)
+    sha256 = hashlib.sha256()
+    with open(model_path, "rb") as weights:
+        for chunk in iter(lambda: weights.read(1024 * 1024), b""):
+            sha256.update(chunk)
+    return f"{model_path.stem}-{sha256.hexdigest()[:12]}-{backend}-{precision}"
 
 
 class InferenceManager:
     """
     Manages the inference process using a pre-trained YOLO model.
+    torch / ultralytics are imported when the model is loaded, not when this module is imported.
+    With TILE_INFERENCE large frames are run as batches of overlapping tiles (see TileSlicer).
+    Annotated frames are drawn by AnnotationRenderer onto the input images themselves (they are modified in place).
     """
     def __init__(self, model_path: str, settings: Settings, logger: Logger):
         self.model_path = Path(model_path)
@@ -21,76 +73,184 @@ class InferenceManager:
         
         self.settings = settings
         self.logger = logger
-        self.model = YOLO(self.model_path)
+        self.backend = self.settings.INFERENCE_BACKEND
+        self.precision = self.settings.MODEL_PRECISION
+        self.model = self._load_model()
+        self.model_version = self._compute_model_version()
         self.device = self._detect_device_for_training()
         self.classes = self.model.names
+        # class id -> name lookup and the ids counted as violations/compliances, resolved once
+        self._class_names = np.array([self.classes.get(index, str(index)) for index in range(max(self.classes) + 1)], dtype=object)
+        self._head_id = self._class_id("head")
+        self._helmet_id = self._class_id("helmet")
         self.confidence_threshold = self.settings.CONFIDENCE_THRESHOLD
         self.iou_threshold = self.settings.IOU_THRESHOLD
+        self.slicer = TileSlicer(settings=self.settings, logger=self.logger)
+        self.renderer = AnnotationRenderer(settings=self.settings, logger=self.logger, class_names=self.classes)
+        # Ultralytics predictors are not thread-safe, so the forward pass is serialized
+        # while decoding, plotting and post-processing of other batches can run in parallel
+        self._predict_lock = threading.Lock()
         
-        self.annotated_image_save_path = settings.BASE_DIR / "inference_results"
-        self.annotated_image_save_path.mkdir(parents=True, exist_ok=True)
-        
+    def _load_model(self):
+        """Load the model for the configured backend (ONNX / OpenVINO artifacts are exported next to the weights)."""
+        from ultralytics import YOLO
+        from model_export import ModelExporter
+
+        self.logger.info(f"Loading model {self.model_path} with the {self.backend} backend ({self.precision})")
+        if self.backend == "torch" and self.precision == "fp32":
+            return YOLO(self.model_path)
+        exporter = ModelExporter(model_path=str(self.model_path), settings=self.settings, logger=self.logger)
+        return exporter.load(self.backend, precision=self.precision)
+    
+    def _class_id(self, name: str) -> Optional[int]:
+        return next((index for index, class_name in self.classes.items() if class_name == name), None)
+
+    def _compute_model_version(self) -> str:
+        return compute_model_version(self.model_path, self.backend, self.precision)
+    
+    @property
+    def result_signature(self) -> str:
+        """Everything besides the image that changes the detections (used as part of result cache keys)."""
+        return result_signature(self.model_version, self.confidence_threshold, self.iou_threshold, self.slicer)
+    
     def _detect_device_for_training(self) -> str:
         """Detect if CUDA is available for training."""
+        import torch
         device = 'cuda' if torch.cuda.is_available() else 'cpu'
         self.logger.info(f"Using device for training: {device}")
         return device
     
-    def predict(self, image_path: str):
-        """Run inference on the given image."""
-        self.logger.info(f"Running inference on image: {image_path}")
-        results = self.model.predict(source=image_path, device=self.device, conf=self.confidence_threshold, iou=self.iou_threshold)
-        self.logger.info("Inference completed.")
+    def predict(self, image: np.ndarray | str | list[np.ndarray]):
+        """Run inference on the given image (decoded BGR array or image path) or on a list of arrays as one batch."""
+        if isinstance(image, list):
+            source = f"batch of {len(image)} images"
+        else:
+            source = f"array {image.shape}" if isinstance(image, np.ndarray) else image
+        self.logger.debug(f"Running inference on image: {source}")
+        with self._predict_lock:
+            results = self.model.predict(source=image, device=self.device, conf=self.confidence_threshold, iou=self.iou_threshold)
+        self.logger.debug("Inference completed.")
         return results
     
-    def annotate_image_and_save(self, image_path: str) -> Path:
-        """Annotate the image with detection results and save it."""
-        results = self.predict(image_path)
-        annotated_image = results[0].plot()
-        
-        input_filename = Path(image_path).stem
-        output_filename = f"{input_filename}_annotated.jpg"
-        output_path = str(self.annotated_image_save_path / output_filename)
-        cv2.imwrite(output_path, annotated_image)
-        self.logger.info(f"Annotated image saved to: {output_path}")
-        return output_path
+    def detect(self, image: np.ndarray | str) -> InferenceResult:
+        """Run the model once and build detections, counts and the annotated image from the same results."""
+        results = self.predict(image)
+        detections, violations, compliances = self._extract_detections(results)
+        return InferenceResult(detections=detections,
+                               violations=violations,
+                               compliances=compliances,
+                               annotated_image=self._annotate(results[0], results[0].orig_img),
+                               model_version=self.model_version)
     
+    def detect_batch(self, images: list[np.ndarray], annotate: Optional[list[bool]] = None) -> list[InferenceResult]:
+        """
+        Run a single batched forward pass over several images and split the results per image.
+        `annotate` flags the images that need an annotated frame (all by default), plotting is skipped for the others.
+        """
+        results = self.predict_tiled(images) if self.slicer.enabled else self.predict(images)
+        annotate = annotate or [True] * len(images)
+        inference_results = []
+        for image, result, plot in zip(images, results, annotate, strict=True):
+            detections, violations, compliances = self._extract_detections([result])
+            timings = _stage_timings(result)
+            annotated_image = None
+            if plot:
+                started_at = time.perf_counter()
+                annotated_image = self._annotate(result, image)
+                timings["plot"] = time.perf_counter() - started_at
+            inference_results.append(InferenceResult(detections=detections,
+                                                     violations=violations,
+                                                     compliances=compliances,
+                                                     annotated_image=annotated_image,
+                                                     model_version=self.model_version,
+                                                     timings=timings))
+        return inference_results
+    
+    def _annotate(self, result, image: np.ndarray) -> np.ndarray:
+        boxes = result.boxes.data.cpu().numpy() if result.boxes is not None else np.zeros((0, 6), dtype=np.float32)
+        return self.renderer.render(image, boxes)
+
+    def predict_tiled(self, images: list[np.ndarray]) -> list:
+        """
+        Sliced inference: the tiles of all images go through the model in batches of TILE_BATCH_SIZE and
+        the boxes of every image are shifted back to frame coordinates and merged across tiles.
+        Images that are not sliced keep their plain model results.
+        """
+        import torch
+        from ultralytics.engine.results import Results
+
+        sources, owners = [], []
+        for index, image in enumerate(images):
+            for crop, offset in self.slicer.slice(image):
+                sources.append(crop)
+                owners.append((index, offset))
+        results = []
+        for start in range(0, len(sources), self.slicer.batch_size):
+            results.extend(self.predict(sources[start:start + self.slicer.batch_size]))
+
+        parts = [[] for _ in images]
+        for (index, offset), result in zip(owners, results, strict=True):
+            parts[index].append((offset, result))
+
+        merged_results = []
+        for image, image_parts in zip(images, parts, strict=True):
+            if not self.slicer.should_slice(image):
+                merged_results.append(image_parts[0][1])
+                continue
+            boxes = []
+            for (x_offset, y_offset), result in image_parts:
+                data = result.boxes.data.cpu().numpy().copy()
+                data[:, [0, 2]] += x_offset
+                data[:, [1, 3]] += y_offset
+                boxes.append(data)
+            merged = self.slicer.merge(boxes)
+            merged_result = Results(orig_img=image, path="", names=self.classes,
+                                    boxes=torch.from_numpy(np.ascontiguousarray(merged, dtype=np.float32)))
+            # the stage timings of a sliced image are the sums over its tiles
+            merged_result.speed = {key: sum(result.speed[key] or 0.0 for _, result in image_parts) for key in merged_result.speed}
+            merged_results.append(merged_result)
+        return merged_results
+
+    def warmup(self) -> None:
+        """One full pass on a dummy image so the first request does not pay for lazy initialisation."""
+        size = self.settings.MODEL_IMG_SIZE
+        self.detect_batch([np.zeros((size, size, 3), dtype=np.uint8)])
+
     def get_detections(self, image_path: str):
         """Get detection results in a structured format."""
-        results = self.predict(image_path)
-        detections = []
-        violations = 0
-        complaints = 0
-        
-        for result in results:
-            for box in result.boxes:
-                cls_id = int(box.cls[0])
-                confidence = float(box.conf[0])
-                bbox = box.xyxy[0].tolist()  # [x_min, y_min, x_max, y_max]
-                detections.append({
-                    "class": self.classes[cls_id],
-                    "confidence": round(confidence, 2),
-                    "bbox": [round(coord) for coord in bbox]
-                })
-                
-                if self.classes[cls_id] == "head":
-                    violations += 1
-                elif self.classes[cls_id] == "helmet":
-                    complaints += 1
-        return detections, violations, complaints
-
-
-inference_manager = InferenceManager(model_path=str(settings.BASE_DIR / "trained_models" / "best_ppe_model.pt"), 
-                                     settings=settings, 
-                                     logger=logger)
+        return self._extract_detections(self.predict(image_path))
     
+    def _extract_detections(self, results):
+        """
+        Convert raw YOLO results into detection dicts and violation/compliance counts.
+        Works on the whole (N, 6) box tensor at once: class names come from a lookup array,
+        counts from one bincount and coordinates/confidences are rounded in one step each.
+        """
+        data = [result.boxes.data.cpu().numpy() for result in results if result.boxes is not None]
+        data = np.concatenate(data) if data else np.zeros((0, 6), dtype=np.float32)
+        columns = self._columns(data)
+        counts = np.bincount(data[:, 5].astype(np.intp), minlength=len(self._class_names))
+        detections = [{"class": name, "confidence": confidence, "bbox": bbox}
+                      for name, confidence, bbox in zip(columns["classes"], columns["confidences"], columns["bboxes"], strict=True)]
+        violations = int(counts[self._head_id]) if self._head_id is not None else 0
+        compliances = int(counts[self._helmet_id]) if self._helmet_id is not None else 0
+        return detections, violations, compliances
+
+    def _columns(self, data: np.ndarray) -> dict:
+        class_ids = data[:, 5].astype(np.intp)
+        return {
+            "classes": self._class_names[class_ids].tolist(),
+            "confidences": np.round(data[:, 4].astype(np.float64), 2).tolist(),
+            "bboxes": np.rint(data[:, :4]).astype(np.int64).tolist(),  # [x_min, y_min, x_max, y_max]
+        }
+
     
 if __name__ == "__main__":
-    model_path = settings.BASE_DIR / "trained_models" / "best_ppe_model.pt"
+    model_path = settings.MODEL_WEIGHTS_PATH
     test_image_path = settings.BASE_DIR / "uploads" / "test_img_2.jpeg"
     
     inference_manager = InferenceManager(model_path=str(model_path), settings=settings, logger=logger)
-    #inference_manager.annotate_image_and_save(image_path=str(test_image_path))
+    #inference_manager.detect(image_path=str(test_image_path))
     print(inference_manager.get_detections(image_path=str(test_image_path)))
     print("Model classes: ", inference_manager.classes)
     
@@ -0,0 +1,290 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import numpy as np
+
+from inference import InferenceManager, InferenceResult
+from logger import logger, Logger
+from metrics import MetricsRegistry, metrics
+from model_loader import ModelLoader, ModelNotReadyError, model_loader
+from settings import Settings, settings
+from worker_pool import InferenceWorkerPool
+
+
+class InferenceQueueFullError(Exception):
+    """Raised when the inference queue is full and the request should be retried later."""
+
+
+class BatchInferenceScheduler:
+    """
+    Dynamic micro-batching in front of the model.
+    Images submitted by concurrent requests are collected for up to MAX_BATCH_WAIT_MS
+    (or until MAX_BATCH_SIZE images are pending), run through YOLO as one batched forward pass
+    on a dedicated thread pool and the per-image results are handed back to the waiting coroutines.
+    With a worker pool the threads only dispatch batches to the model replicas in the worker processes.
+    The queue in front of the pool is bounded by INFERENCE_QUEUE_MAX_SIZE.
+    Without an explicit inference_manager the model is taken from the model loader on the first submit.
+    The serving model can be hot-swapped: batches that already started finish on the old model.
+    Queue waits and the per-image stage timings of every batch are recorded in `metrics` when it is given.
+    """
+    def __init__(self, inference_manager: Optional[InferenceManager], settings: Settings, logger: Logger,
+                 worker_pool: Optional[InferenceWorkerPool] = None, model_loader: Optional[ModelLoader] = None,
+                 metrics: Optional[MetricsRegistry] = None):
+        self.inference_manager = inference_manager
+        self.worker_pool = worker_pool
+        self.model_loader = model_loader
+        self.metrics = metrics
+        self.settings = settings
+        self.logger = logger
+        self.max_batch_size = max(1, self.settings.MAX_BATCH_SIZE)
+        self.max_batch_wait = max(0.0, self.settings.MAX_BATCH_WAIT_MS) / 1000
+        self.max_queue_size = max(1, self.settings.INFERENCE_QUEUE_MAX_SIZE)
+        self.workers = self.worker_pool.processes if self.worker_pool is not None else max(1, self.settings.INFERENCE_WORKERS)
+
+        # Blocking model calls never run on the event loop
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="inference")
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker_slots: Optional[asyncio.Semaphore] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._batch_tasks: set[asyncio.Task] = set()
+        self._reload_lock = asyncio.Lock()
+        self._watcher: Optional[asyncio.Task] = None
+        # registry state (see _registry_state) of the serving model, compared by the watcher
+        self._loaded_state: Optional[tuple] = None
+
+        # Monitoring counters
+        self._in_flight = 0
+        self._rejected_requests = 0
+        self._processed_images = 0
+        self._processed_batches = 0
+        self._total_queue_wait = 0.0
+        self._max_queue_wait = 0.0
+
+    def _ensure_worker(self) -> None:
+        """Start the batching loop lazily on the running event loop."""
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+            self._worker_slots = asyncio.Semaphore(self.workers)
+            self._worker = asyncio.create_task(self._run())
+
+    async def submit(self, image: np.ndarray, annotate: bool = True) -> InferenceResult:
+        """Queue an image for the next batch and wait for its result (without annotated frame if not `annotate`)."""
+        if self.inference_manager is None and self.worker_pool is None:
+            # raises ModelNotReadyError if the model cannot be loaded
+            self.inference_manager = await self.model_loader.get()
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((image, future, time.perf_counter(), annotate))
+        except asyncio.QueueFull:
+            self._rejected_requests += 1
+            self.logger.warning(f"Inference queue is full ({self.max_queue_size} images pending), rejecting request")
+            raise InferenceQueueFullError("Inference queue is full, please retry later.")
+        return await future
+
+    @property
+    def model_signature(self) -> str:
+        """Signature of the model serving the submitted images (see InferenceManager.result_signature)."""
+        if self.inference_manager is not None:
+            return self.inference_manager.result_signature
+        return self.model_loader.result_signature
+
+    def start_loading(self) -> None:
+        """Load the model (or start and warm up the worker processes) in the background."""
+        if self.worker_pool is not None:
+            threading.Thread(target=self.worker_pool.warmup, name="worker-pool-warmup", daemon=True).start()
+        elif self.inference_manager is None:
+            self.model_loader.start()
+
+    async def reload_model(self, version: Optional[str] = None) -> str:
+        """
+        Load and warm up `version` (default: the active registry version) next to the serving model, then
+        switch new batches over to it. Returns the new result signature; on failure the old model keeps serving.
+        """
+        async with self._reload_lock:
+            if self.worker_pool is None:
+                manager = await asyncio.to_thread(self.model_loader.reload, version)
+                self.inference_manager = manager
+                self._loaded_state = await asyncio.to_thread(self._registry_state)
+                return manager.result_signature
+
+            registry = self.model_loader.registry
+            model_path = registry.weights_path(version) if version else registry.active_weights_path()
+            new_pool = InferenceWorkerPool(settings=self.settings, logger=self.logger, model_path=model_path)
+            await asyncio.to_thread(new_pool.warmup)
+            if not new_pool.ready:
+                await asyncio.to_thread(new_pool.shutdown)
+                raise ModelNotReadyError(f"Worker processes could not load {model_path}")
+            if version:
+                registry.activate(version)
+            old_pool, self.worker_pool = self.worker_pool, new_pool
+            self.model_loader.invalidate_signature()
+            self._loaded_state = await asyncio.to_thread(self._registry_state)
+            # batches already handed to the old replicas finish before they are stopped
+            await asyncio.to_thread(old_pool.shutdown, False)
+            return self.model_signature
+
+    def _registry_state(self) -> tuple:
+        """
+        What the watcher compares: the active registry version and the mtime of its weights. Without an active
+        version nothing is watched, the legacy TRAINED_MODEL_PATH copy is rewritten by every training run and
+        must not be hot-swapped in unless a version is activated.
+        """
+        registry = self.model_loader.registry
+        version = registry.active_version()
+        if version is None:
+            return None, None
+        try:
+            return version, registry.weights_path(version).stat().st_mtime_ns
+        except (FileNotFoundError, KeyError):
+            return None, None
+
+    async def _watch_registry(self, interval: float) -> None:
+        if self._loaded_state is None:
+            self._loaded_state = await asyncio.to_thread(self._registry_state)
+        while True:
+            await asyncio.sleep(interval)
+            state = await asyncio.to_thread(self._registry_state)
+            # a reload in progress (e.g. from the admin endpoint) updates the loaded state when it is done
+            if state == self._loaded_state or state == (None, None) or self._reload_lock.locked():
+                continue
+            self.logger.info(f"Model registry changed ({self._loaded_state[0]} -> {state[0]}), reloading the model")
+            try:
+                await self.reload_model()
+            except Exception as e:
+                self.logger.error(f"Model reload failed, the previous model keeps serving: {e}")
+                self._loaded_state = state
+
+    def start_watching(self, interval: float) -> None:
+        """Hot-reload the model whenever the active registry version (or its weights file) changes."""
+        if self._watcher is None and interval > 0:
+            self._watcher = asyncio.create_task(self._watch_registry(interval))
+
+    @property
+    def is_ready(self) -> bool:
+        """Whether submitted images are served without waiting for a model load."""
+        if self.worker_pool is not None:
+            return self.worker_pool.ready
+        return self.inference_manager is not None or self.model_loader.state == "ready"
+
+    def stats(self) -> dict:
+        """Queue depth and wait time figures for monitoring."""
+        return {
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "max_queue_size": self.max_queue_size,
+            "in_flight": self._in_flight,
+            "workers": self.workers,
+            "rejected_requests": self._rejected_requests,
+            "processed_images": self._processed_images,
+            "processed_batches": self._processed_batches,
+            "avg_queue_wait_ms": round(self._total_queue_wait / self._processed_images * 1000, 2) if self._processed_images else 0.0,
+            "max_queue_wait_ms": round(self._max_queue_wait * 1000, 2),
+        }
+
+    async def stop(self) -> None:
+        """Stop the batching loop (pending requests are cancelled)."""
+        if self._watcher is not None:
+            self._watcher.cancel()
+            self._watcher = None
+        # the loop may have been started on another event loop (e.g. a previous app instance in tests)
+        same_loop = self._worker is not None and self._worker.get_loop() is asyncio.get_running_loop()
+        if self._worker is not None:
+            self._worker.cancel()
+            if same_loop:
+                try:
+                    await self._worker
+                except asyncio.CancelledError:
+                    pass
+            self._worker = None
+        if self._batch_tasks and same_loop:
+            await asyncio.gather(*self._batch_tasks, return_exceptions=True)
+        while self._queue is not None and not self._queue.empty():
+            _, future, _, _ = self._queue.get_nowait()
+            future.cancel()
+        if self.worker_pool is not None:
+            self.worker_pool.shutdown()
+
+    async def _collect_batch(self) -> list[tuple[np.ndarray, asyncio.Future, float, bool]]:
+        """Wait for the first image, then keep collecting until the batch is full or the wait window closes."""
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_batch_wait
+        while len(batch) < self.max_batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout=timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        while True:
+            # Waiting for a free worker first, so images keep piling up into bigger batches under load
+            await self._worker_slots.acquire()
+            try:
+                batch = await self._collect_batch()
+            except BaseException:
+                self._worker_slots.release()
+                raise
+            task = asyncio.create_task(self._run_batch(batch))
+            self._batch_tasks.add(task)
+            task.add_done_callback(self._batch_tasks.discard)
+
+    async def _run_batch(self, batch: list[tuple[np.ndarray, asyncio.Future, float, bool]]) -> None:
+        try:
+            # Skipping requests whose clients already went away
+            batch = [item for item in batch if not item[1].done()]
+            if not batch:
+                return
+
+            started_at = time.perf_counter()
+            for _, _, enqueued_at, _ in batch:
+                wait = started_at - enqueued_at
+                self._total_queue_wait += wait
+                self._max_queue_wait = max(self._max_queue_wait, wait)
+                if self.metrics is not None:
+                    self.metrics.observe("queue_wait", wait)
+            self._in_flight += len(batch)
+
+            images = [image for image, _, _, _ in batch]
+            annotate = [annotate for _, _, _, annotate in batch]
+            self.logger.debug(f"Running micro-batch of {len(images)} images")
+            detect_batch = self.worker_pool.detect_batch if self.worker_pool is not None else self.inference_manager.detect_batch
+            try:
+                loop = asyncio.get_running_loop()
+                results = await loop.run_in_executor(self._executor, detect_batch, images, annotate)
+            except Exception as e:
+                self.logger.error(f"Batched inference failed: {e}")
+                for _, future, _, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+            finally:
+                self._in_flight -= len(batch)
+                self._processed_images += len(batch)
+                self._processed_batches += 1
+
+            for (_, future, _, _), result in zip(batch, results, strict=True):
+                if self.metrics is not None:
+                    self.metrics.observe_stages(result.timings)
+                if not future.done():
+                    future.set_result(result)
+        finally:
+            self._worker_slots.release()
+
+
+inference_scheduler = BatchInferenceScheduler(inference_manager=None,
+                                              settings=settings,
+                                              logger=logger,
+                                              model_loader=model_loader,
+                                              metrics=metrics,
+                                              worker_pool=InferenceWorkerPool(settings=settings, logger=logger) 
+                                                          if settings.INFERENCE_WORKER_PROCESSES > 0 else None)
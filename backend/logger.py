@@ -1,59 +1,256 @@
+import atexit
+import json
 import logging
+import queue
+import random
+import time
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from typing import Optional
 from pathlib import Path
+from uuid import uuid4
+
+from settings import settings
+
+
+# Request id and stage timings of the HTTP request being handled (set by RequestLoggingMiddleware)
+_request_context: ContextVar[Optional[dict]] = ContextVar("request_context", default=None)
+
+
+def current_request_id() -> Optional[str]:
+    context = _request_context.get()
+    return context["request_id"] if context is not None else None
+
+
+def add_request_timing(stage: str, seconds: float) -> None:
+    """Add a stage duration to the timings of the current request (no-op outside of a request)."""
+    context = _request_context.get()
+    if context is not None:
+        context["timings"][stage] = context["timings"].get(stage, 0.0) + seconds
+
+
+def add_request_timings(timings: dict[str, float]) -> None:
+    for stage, seconds in timings.items():
+        add_request_timing(stage, seconds)
+
+
+class RequestContextFilter(logging.Filter):
+    """Stamps records with the request id on the logging thread, before they are queued."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = current_request_id()
+        return True
+
+
+class TextFormatter(logging.Formatter):
+    """The classic one-line format, the request id and structured fields are appended when present."""
+
+    def __init__(self):
+        super().__init__('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        if getattr(record, "request_id", None):
+            line += f" [request_id={record.request_id}]"
+        fields = getattr(record, "fields", None)
+        if fields:
+            line += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: timestamp, level, logger, message, request id and the structured fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "timestamp": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        entry.update(getattr(record, "fields", None) or {})
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class _ForwardingHandler(logging.Handler):
+    """Hands records received from other processes to a logger of this process."""
+
+    def __init__(self, target: logging.Logger):
+        super().__init__()
+        self.target = target
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.target.handle(record)
 
 
 class Logger:
-    """A customizable logger class for logging messages to console and/or file."""
-    def __init__(self, 
-                 name: str, 
-                 log_level: str = "INFO", 
+    """
+    A customizable logger class for logging messages to console and/or file.
+    With `use_queue` the calling thread only puts records on an in-memory queue and a QueueListener thread
+    does the formatting and the file/console I/O, so logging never blocks the event loop or inference threads.
+    `structured` writes JSON lines, keyword arguments of the log methods become fields of the record.
+    With `max_bytes` the log file is rotated at that size keeping `backup_count` old files.
+    """
+    def __init__(self,
+                 name: str,
+                 log_level: str = "INFO",
                  log_dir: Optional[str] = None,
                  log_to_file: bool = True,
-                 log_to_console: bool = True) -> None:
+                 log_to_console: bool = True,
+                 structured: bool = False,
+                 use_queue: bool = False,
+                 max_bytes: int = 0,
+                 backup_count: int = 5) -> None:
         self.name = name
         self.log_level = log_level
         self.log_dir = Path(log_dir) if log_dir else Path(__file__).parent / "logs"
         self.log_to_file = log_to_file
         self.log_to_console = log_to_console
-        
+        self.structured = structured
+        self.use_queue = use_queue
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._listener: Optional[QueueListener] = None
+
         self.logger = logging.getLogger(self.name)
         self.logger.setLevel(getattr(logging, self.log_level.upper()))
         self._setup_handlers()
-        
+
     def _setup_handlers(self) -> None:
-        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-        
+        formatter = JsonFormatter() if self.structured else TextFormatter()
+        handlers = []
+
         if self.log_to_file:
             self.log_dir.mkdir(parents=True, exist_ok=True)
-            file_handler = logging.FileHandler(self.log_dir / f"{self.name}.log")
+            log_file = self.log_dir / f"{self.name}.log"
+            if self.max_bytes > 0:
+                file_handler = RotatingFileHandler(log_file, maxBytes=self.max_bytes, backupCount=self.backup_count)
+            else:
+                file_handler = logging.FileHandler(log_file)
             file_handler.setFormatter(formatter)
-            self.logger.addHandler(file_handler)
-        
+            handlers.append(file_handler)
+
         if self.log_to_console:
             console_handler = logging.StreamHandler()
             console_handler.setFormatter(formatter)
-            self.logger.addHandler(console_handler)
-            
-    def debug(self, message: str) -> None:
-        self.logger.debug(message)
-        
-    def info(self, message: str) -> None:
-        self.logger.info(message)
-        
-    def warning(self, message: str) -> None:
-        self.logger.warning(message)
-        
-    def error(self, message: str) -> None:
-        self.logger.error(message)
-        
-    def critical(self, message: str) -> None:
-        self.logger.critical(message)
-    
-    
-logger = Logger(name="PPE Vision Detection Logger", log_to_console=True, log_to_file=True)  
-    
-    
+            handlers.append(console_handler)
+
+        self.logger.addFilter(RequestContextFilter())
+        if self.use_queue and handlers:
+            log_queue = queue.SimpleQueue()
+            self.logger.addHandler(QueueHandler(log_queue))
+            self._listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+            self._listener.start()
+            atexit.register(self.stop)
+        else:
+            for handler in handlers:
+                self.logger.addHandler(handler)
+
+    def stop(self) -> None:
+        """Write out the queued records and stop the listener thread."""
+        if self._listener is not None:
+            self._listener.stop()
+            self._listener = None
+
+    def forward_to(self, log_queue) -> None:
+        """
+        Send the records of this process to `log_queue` instead of the own file/console handlers.
+        Worker processes log through the parent, so a single process writes and rotates the log file.
+        """
+        self.stop()
+        for handler in list(self.logger.handlers):
+            self.logger.removeHandler(handler)
+            handler.close()
+        self.logger.addHandler(QueueHandler(log_queue))
+
+    def listen(self, log_queue) -> QueueListener:
+        """Write the records other processes put on `log_queue` (see forward_to) through this logger."""
+        listener = QueueListener(log_queue, _ForwardingHandler(self.logger))
+        listener.start()
+        return listener
+
+    def is_enabled_for(self, level: int) -> bool:
+        return self.logger.isEnabledFor(level)
+
+    def _log(self, level: int, message: str, fields: dict) -> None:
+        if self.logger.isEnabledFor(level):
+            self.logger.log(level, message, extra={"fields": fields} if fields else None)
+
+    def debug(self, message: str, **fields) -> None:
+        self._log(logging.DEBUG, message, fields)
+
+    def info(self, message: str, **fields) -> None:
+        self._log(logging.INFO, message, fields)
+
+    def warning(self, message: str, **fields) -> None:
+        self._log(logging.WARNING, message, fields)
+
+    def error(self, message: str, **fields) -> None:
+        self._log(logging.ERROR, message, fields)
+
+    def critical(self, message: str, **fields) -> None:
+        self._log(logging.CRITICAL, message, fields)
+
+
+class RequestLoggingMiddleware:
+    """
+    Plain ASGI middleware giving every HTTP request an id (the client's X-Request-ID or a new one, echoed back)
+    for its log records, and writing one access record with the status, latency and stage timings.
+    Under load only `sample_rate` of the successful requests get an access record,
+    server errors and requests slower than `slow_ms` are always logged.
+    """
+
+    def __init__(self, app, logger: Logger, sample_rate: float = 1.0, slow_ms: float = 1000.0):
+        self.app = app
+        self.logger = logger
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = next((value.decode("latin-1") for key, value in scope["headers"] if key == b"x-request-id"), None)
+        context = {"request_id": (request_id or uuid4().hex)[:64], "timings": {}}
+        token = _request_context.set(context)
+        status_code = 500
+        started_at = time.perf_counter()
+
+        async def send_with_request_id(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message["headers"] = [*message.get("headers", []), (b"x-request-id", context["request_id"].encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            duration_ms = (time.perf_counter() - started_at) * 1000
+            if status_code >= 500 or duration_ms >= self.slow_ms or random.random() < self.sample_rate:
+                fields = {"method": scope["method"], "path": scope["path"], "status": status_code,
+                          "duration_ms": round(duration_ms, 2)}
+                if context["timings"]:
+                    fields["timings_ms"] = {stage: round(seconds * 1000, 3) for stage, seconds in context["timings"].items()}
+                self.logger.info("request completed", **fields)
+            _request_context.reset(token)
+
+
+logger = Logger(name="PPE Vision Detection Logger",
+                log_level=settings.LOG_LEVEL,
+                log_to_console=True,
+                log_to_file=True,
+                structured=settings.LOG_FORMAT == "json",
+                use_queue=settings.LOG_QUEUE,
+                max_bytes=settings.LOG_MAX_BYTES,
+                backup_count=settings.LOG_BACKUP_COUNT)
+
+
 if __name__ == "__main__":
     logger = Logger(name="test_logger", log_to_console=True, log_to_file=True)
     logger.info("This is an info message.")
@@ -1,20 +1,49 @@
+from contextlib import asynccontextmanager
 from datetime import datetime
 
 import uvicorn 
 from fastapi import FastAPI, Request, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 from pydantic import ValidationError
 from fastapi.exceptions import ResponseValidationError, RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.staticfiles import StaticFiles
 
 from settings import settings
 from routes.detect_routes import detect_router
 from routes.report_routes import report_router
+from routes.admin_routes import admin_router
+from inference_scheduler import inference_scheduler
+from logger import RequestLoggingMiddleware, logger
+from metrics import MetricsMiddleware, metrics
+from model_loader import model_loader
+from report_jobs import report_job_manager
+from result_cache import result_cache
+from storage_manager import storage_manager
+from upload_limits import RequestBodyLimitMiddleware
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Starts the background workers of the app and stops them on shutdown.
+    The model loads in the background so the server binds right away, /ready reports when it can serve.
+    The model registry is watched so a newly activated model version is hot-swapped in.
+    """
+    if settings.MODEL_PRELOAD:
+        inference_scheduler.start_loading()
+    storage_manager.start()
+    inference_scheduler.start_watching(settings.MODEL_WATCH_INTERVAL_SECONDS)
+    yield
+    await storage_manager.stop()
+    await inference_scheduler.stop()
+    report_job_manager.shutdown()
 
 
 app = FastAPI(title="PPE Vision Detection App",
-              version="0.0.1")
+              version="0.0.1",
+              lifespan=lifespan)
 
 
 @app.get("/health", tags=["Health Check"])  
@@ -33,6 +62,43 @@ async def health_check():
     )
 
 
+@app.get("/ready", tags=["Health Check"])
+async def readiness_check():
+    """
+    Readiness probe: 200 once the model is loaded and warmed up, 503 while it is loading or if loading failed.
+    """
+    ready = inference_scheduler.is_ready
+    return JSONResponse(
+        content={
+            "status": "ready" if ready else "not_ready",
+            "model": model_loader.status(),
+            "timestamp": datetime.now().isoformat(),
+        },
+        status_code=200 if ready else 503,
+        headers={"Cache-Control": "no-cache"}
+    )
+
+
+@app.get("/metrics", tags=["Health Check"], response_class=PlainTextResponse)
+async def metrics_endpoint():
+    """
+    Prometheus scrape endpoint: per-stage latency histograms, request and pipeline counters,
+    inference queue, result cache and report job gauges.
+    """
+    if not metrics.enabled:
+        raise HTTPException(status_code=404, detail="Metrics are disabled.")
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8",
+                             headers={"Cache-Control": "no-cache"})
+
+
+# component stats are read when /metrics is scraped, nothing is recorded for them on the request path
+metrics.register_collector("inference_queue", inference_scheduler.stats)
+metrics.register_collector("result_cache", result_cache.stats)
+metrics.register_collector("report_jobs", report_job_manager.stats)
+# in-memory reports that are never downloaded are dropped on the storage sweeps
+storage_manager.add_sweep_hook(report_job_manager.release_expired_content)
+
+
 def add_exception_handlers(app: FastAPI):
     """
     This function adds exception handlers to the FastAPI application.
@@ -83,6 +149,16 @@ def add_exception_handlers(app: FastAPI):
 add_exception_handlers(app)
         
 
+# Oversized upload bodies are refused from the Content-Length (or cut off while streaming) before multipart parsing.
+# Added before CORS so the CORS middleware wraps it and the 413 responses carry the CORS headers
+MB = 1024 * 1024
+app.add_middleware(RequestBodyLimitMiddleware, limits={
+    "/api/v1/detect": settings.MAX_IMAGE_UPLOAD_BYTES + settings.UPLOAD_MULTIPART_OVERHEAD_BYTES,
+    "/api/v1/detect/batch": max(settings.BATCH_DETECT_MAX_IMAGES * settings.MAX_IMAGE_UPLOAD_BYTES,
+                                settings.BATCH_DETECT_MAX_ARCHIVE_MB * MB) + settings.UPLOAD_MULTIPART_OVERHEAD_BYTES,
+    "/api/v1/detect/video": settings.VIDEO_MAX_UPLOAD_MB * MB + settings.UPLOAD_MULTIPART_OVERHEAD_BYTES,
+})
+
 # CORS or "Cross-Origin Resource Sharing" is a mechanism that 
 # allows restricted resources on a web page to be requested from another domain 
 # outside the domain from which the first resource was served.
@@ -95,9 +171,24 @@ app.add_middleware(
     allow_headers=settings.CORS_ALLOWED_HEADERS,
 )
 
+# Optional gzip for JSON/NDJSON responses, already compressed images (and multipart bodies carrying them) are left alone
+if settings.RESPONSE_COMPRESSION:
+    app.add_middleware(GZipMiddleware,
+                       minimum_size=settings.RESPONSE_COMPRESSION_MIN_BYTES,
+                       compresslevel=settings.RESPONSE_COMPRESSION_LEVEL,
+                       exclude_content_types=("image/*", "multipart/*", "application/pdf", "application/zip"))
+
+# Request counters/latencies by route and the request id / access record, added last so they wrap the whole stack
+app.add_middleware(MetricsMiddleware, metrics=metrics)
+app.add_middleware(RequestLoggingMiddleware,
+                   logger=logger,
+                   sample_rate=settings.LOG_REQUEST_SAMPLE_RATE,
+                   slow_ms=settings.LOG_SLOW_REQUEST_MS)
+
 # including all the routers to the app
 app.include_router(detect_router, prefix="/api/v1")
 app.include_router(report_router, prefix="/api/v1")
+app.include_router(admin_router, prefix="/api/v1")
 
 # Static files serving for PDF reports
 app.mount("/pdf_reports", StaticFiles(directory="pdf_reports"), name="pdf_reports")
@@ -105,4 +196,6 @@ app.mount("/pdf_reports", StaticFiles(directory="pdf_reports"), name="pdf_report
 
 
 if __name__ == "__main__":
-    uvicorn.run(app, host=settings.APP_HOST, port=settings.APP_PORT)
\ No newline at end of file
+    # websocket messages (live stream frames) are capped like image uploads, RequestBodyLimitMiddleware only sees HTTP
+    uvicorn.run(app, host=settings.APP_HOST, port=settings.APP_PORT,
+                ws_max_size=settings.MAX_IMAGE_UPLOAD_BYTES + settings.UPLOAD_MULTIPART_OVERHEAD_BYTES)
\ No newline at end of file
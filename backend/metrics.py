@@ -0,0 +1,212 @@
+from bisect import bisect_left
+from typing import Callable
+import threading
+import time
+
+from logger import add_request_timing, logger, Logger
+from settings import Settings, settings
+
+
+class Histogram:
+    """Latency histogram with fixed bucket upper bounds (seconds), rendered as cumulative Prometheus buckets."""
+
+    def __init__(self, buckets: tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last slot is the +Inf bucket
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class StageTimer:
+    """Context manager recording the duration of its block as one pipeline stage (also in the request's log record)."""
+    __slots__ = ("metrics", "stage", "started_at")
+
+    def __init__(self, metrics: "MetricsRegistry", stage: str):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self) -> "StageTimer":
+        self.started_at = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> None:
+        if exc_type is None:
+            seconds = time.perf_counter() - self.started_at
+            self.metrics.observe(self.stage, seconds)
+            add_request_timing(self.stage, seconds)
+
+
+class MetricsRegistry:
+    """
+    In-process metrics of the service exposed in the Prometheus text format at /metrics:
+    per-stage latency histograms, HTTP request counters/latencies, pipeline counters (images, violations)
+    and gauges read from the cache, queue and report job stats at scrape time.
+    Recording is a perf_counter delta, a bisect and a few additions under one lock, cheap enough to stay on.
+    """
+    STAGES = ("upload_read", "validation", "decode", "queue_wait", "preprocess", "forward", "nms",
+              "plot", "encode", "base64", "pdf_render")
+
+    def __init__(self, settings: Settings, logger: Logger, prefix: str = "ppe"):
+        self.settings = settings
+        self.logger = logger
+        self.prefix = prefix
+        self.enabled = self.settings.METRICS_ENABLED
+        self.buckets = tuple(sorted(self.settings.METRICS_LATENCY_BUCKETS))
+        self._lock = threading.Lock()
+        self._stages = {stage: Histogram(self.buckets) for stage in self.STAGES}
+        self._requests: dict[tuple[str, str, int], int] = {}
+        self._request_latency: dict[str, Histogram] = {}
+        self._counters: dict[tuple[str, tuple], float] = {}
+        self._collectors: dict[str, Callable[[], dict]] = {}
+
+    def observe(self, stage: str, seconds: float) -> None:
+        """Record the duration of one pipeline stage."""
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self._stages.get(stage)
+            if histogram is None:
+                histogram = self._stages[stage] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    def observe_stages(self, timings: dict[str, float]) -> None:
+        """Record several stage durations at once (the timings carried by an inference result)."""
+        for stage, seconds in timings.items():
+            self.observe(stage, seconds)
+
+    def time(self, stage: str) -> StageTimer:
+        """`with metrics.time("decode"): ...` records the block duration (failed blocks are not recorded)."""
+        return StageTimer(self, stage)
+
+    def observe_request(self, method: str, route: str, status_code: int, seconds: float) -> None:
+        """Count one HTTP request by route template and status and record its latency."""
+        if not self.enabled:
+            return
+        with self._lock:
+            key = (method, route, status_code)
+            self._requests[key] = self._requests.get(key, 0) + 1
+            histogram = self._request_latency.get(route)
+            if histogram is None:
+                histogram = self._request_latency[route] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    def inc(self, name: str, value: float = 1, **labels: str) -> None:
+        """Increase the counter `<prefix>_<name>_total` with the given labels."""
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def register_collector(self, name: str, collect: Callable[[], dict]) -> None:
+        """Expose the numeric values of `collect()` (e.g. a component's stats()) as `<prefix>_<name>_<key>` gauges."""
+        self._collectors[name] = collect
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stages = {stage: Histogram(self.buckets) for stage in self.STAGES}
+            self._requests.clear()
+            self._request_latency.clear()
+            self._counters.clear()
+
+    @staticmethod
+    def _labels(labels: dict) -> str:
+        if not labels:
+            return ""
+        escaped = {key: str(value).replace("\\", "\\\\").replace('"', '\\"') for key, value in labels.items()}
+        return "{" + ",".join(f'{key}="{value}"' for key, value in escaped.items()) + "}"
+
+    def _histogram_lines(self, name: str, histogram: Histogram, labels: dict) -> list[str]:
+        lines, cumulative = [], 0
+        for bound, count in zip(self.buckets + (float("inf"),), histogram.counts, strict=True):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            lines.append(f"{name}_bucket{self._labels({**labels, 'le': le})} {cumulative}")
+        lines.append(f"{name}_sum{self._labels(labels)} {histogram.sum!r}")
+        lines.append(f"{name}_count{self._labels(labels)} {histogram.count}")
+        return lines
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+        prefix = self.prefix
+        with self._lock:
+            stage_lines = [line for stage, histogram in self._stages.items()
+                           for line in self._histogram_lines(f"{prefix}_stage_duration_seconds", histogram, {"stage": stage})]
+            request_lines = [line for route, histogram in sorted(self._request_latency.items())
+                             for line in self._histogram_lines(f"{prefix}_http_request_duration_seconds", histogram, {"route": route})]
+            requests = sorted(self._requests.items())
+            counters = sorted(self._counters.items())
+
+        lines = [f"# HELP {prefix}_stage_duration_seconds Duration of the stages of the detection and report pipeline.",
+                 f"# TYPE {prefix}_stage_duration_seconds histogram", *stage_lines,
+                 f"# HELP {prefix}_http_requests_total HTTP requests by method, route and status code.",
+                 f"# TYPE {prefix}_http_requests_total counter"]
+        lines.extend(f"{prefix}_http_requests_total{self._labels({'method': method, 'route': route, 'status': status})} {count}"
+                     for (method, route, status), count in requests)
+        lines.extend([f"# HELP {prefix}_http_request_duration_seconds HTTP request latency by route.",
+                      f"# TYPE {prefix}_http_request_duration_seconds histogram", *request_lines])
+
+        for name in sorted({name for (name, _), _ in counters}):
+            lines.append(f"# TYPE {prefix}_{name}_total counter")
+            lines.extend(f"{prefix}_{name}_total{self._labels(dict(labels))} {value:g}"
+                         for (counter, labels), value in counters if counter == name)
+
+        for name, collect in self._collectors.items():
+            try:
+                values = collect()
+            except Exception as e:
+                self.logger.warning(f"Metrics collector {name} failed: {e}")
+                continue
+            for key, value in values.items():
+                if isinstance(value, (bool, int, float)):
+                    lines.append(f"# TYPE {prefix}_{name}_{key} gauge")
+                    lines.append(f"{prefix}_{name}_{key} {float(value):g}")
+        return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """
+    Plain ASGI middleware counting HTTP requests by route template (not raw path, to keep label cardinality bounded)
+    and status code, and recording the full request latency including streamed bodies.
+    """
+
+    def __init__(self, app, metrics: MetricsRegistry):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.metrics.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        started_at = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            self.metrics.observe_request(scope["method"], self._route_template(scope), status_code,
+                                         time.perf_counter() - started_at)
+
+    @staticmethod
+    def _route_template(scope) -> str:
+        # newer FastAPI versions keep routes of included routers unprefixed and put the full template on
+        # the effective route context, older ones copy the routes with the prefix into the app router
+        fastapi_scope = scope.get("fastapi")
+        route = fastapi_scope.get("effective_route_context") if isinstance(fastapi_scope, dict) else None
+        route = route or scope.get("route")
+        return getattr(route, "path_format", None) or getattr(route, "path", None) or "unmatched"
+
+
+metrics = MetricsRegistry(settings=settings, logger=logger)
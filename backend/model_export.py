@@ -0,0 +1,194 @@
+from pathlib import Path
+from typing import Optional
+import argparse
+import hashlib
+import shutil
+
+from ultralytics import YOLO
+import numpy as np
+import cv2
+
+from settings import Settings, settings
+from logger import Logger, logger
+
+
+class ModelExporter:
+    """
+    Exports the trained PyTorch weights into CPU-optimized inference formats (ONNX / OpenVINO IR),
+    stored next to the weights, and checks that every backend produces the same detections.
+    Every artifact gets a `<artifact>.source.sha256` sidecar with the hash of the weights it was built from,
+    artifacts of other (e.g. retrained) weights are exported again instead of being served.
+    """
+    SUPPORTED_BACKENDS = ("torch", "onnx", "openvino")
+
+    def __init__(self, model_path: str, settings: Settings, logger: Logger):
+        self.model_path = Path(model_path)
+        if not self.model_path.exists():
+            logger.error(f"Model path {self.model_path} does not exist.")
+            raise FileNotFoundError(f"Model path {self.model_path} does not exist.")
+        self.settings = settings
+        self.logger = logger
+        self._weights_sha256: Optional[str] = None
+
+    def weights_sha256(self) -> str:
+        if self._weights_sha256 is None:
+            sha256 = hashlib.sha256()
+            with open(self.model_path, "rb") as weights:
+                for chunk in iter(lambda: weights.read(1024 * 1024), b""):
+                    sha256.update(chunk)
+            self._weights_sha256 = sha256.hexdigest()
+        return self._weights_sha256
+
+    @staticmethod
+    def source_hash_path(artifact: Path) -> Path:
+        return artifact.with_name(f"{artifact.name}.source.sha256")
+
+    def is_current(self, artifact: Path) -> bool:
+        """Whether `artifact` exists and was built from the current weights."""
+        sidecar = self.source_hash_path(artifact)
+        return artifact.exists() and sidecar.exists() and sidecar.read_text().strip() == self.weights_sha256()
+
+    def mark_current(self, artifact: Path) -> None:
+        """Record that `artifact` was built from the current weights."""
+        self.source_hash_path(artifact).write_text(self.weights_sha256())
+
+    def replace_artifact(self, exported: Path, output_path: Path) -> None:
+        """Move a freshly exported file or directory to `output_path`, replacing an outdated artifact."""
+        if exported.resolve() == output_path.resolve():
+            return
+        if output_path.is_dir():
+            shutil.rmtree(output_path)
+        exported.replace(output_path)
+
+    def export_path(self, backend: str, precision: str = "fp32") -> Path:
+        """Where the exported artifact of the given backend and precision lives (the .pt itself for torch)."""
+        if precision not in ("fp32", "int8"):
+            raise ValueError(f"Unsupported model precision: {precision}. Supported: fp32, int8")
+        if backend == "torch":
+            if precision == "int8":
+                raise ValueError("INT8 models are served with the onnx or openvino backend.")
+            return self.model_path
+        stem = self.model_path.stem if precision == "fp32" else f"{self.model_path.stem}_int8"
+        if backend == "onnx":
+            return self.model_path.parent / f"{stem}.onnx"
+        if backend == "openvino":
+            return self.model_path.parent / f"{stem}_openvino_model"
+        raise ValueError(f"Unsupported inference backend: {backend}. Supported: {', '.join(self.SUPPORTED_BACKENDS)}")
+
+    def export(self, backend: str, force: bool = False) -> Path:
+        """One-time export of the .pt weights into the given backend format."""
+        output_path = self.export_path(backend)
+        if backend == "torch" or (self.is_current(output_path) and not force):
+            return output_path
+        if output_path.exists() and not force:
+            self.logger.warning(f"{output_path} was exported from other weights than {self.model_path}, exporting again")
+
+        self.logger.info(f"Exporting {self.model_path} to {backend}...")
+        # dynamic axes keep batched and non-square inputs working with the exported graph
+        exported = YOLO(self.model_path).export(format=backend,
+                                                imgsz=self.settings.MODEL_IMG_SIZE,
+                                                dynamic=True,
+                                                device="cpu")
+        self.replace_artifact(Path(exported), output_path)
+        self.mark_current(output_path)
+        self.logger.info(f"Model exported to: {output_path}")
+        return output_path
+
+    def load(self, backend: str, precision: str = "fp32") -> YOLO:
+        """Load the model for the given backend, exporting it first if needed and allowed."""
+        path = self.export_path(backend, precision)
+        if backend != "torch" and not self.is_current(path):
+            problem = "is outdated (built from other weights)" if path.exists() else "does not exist"
+            if precision == "int8":
+                self.logger.error(f"The INT8 {backend} model {path} {problem}.")
+                raise FileNotFoundError(f"The INT8 {backend} model {path} {problem}. "
+                                        f"Run `python model_quantizer.py --backend {backend} --weights {self.model_path}` first.")
+            if not self.settings.MODEL_AUTO_EXPORT:
+                self.logger.error(f"The {backend} model {path} {problem} and MODEL_AUTO_EXPORT is disabled.")
+                raise FileNotFoundError(f"The {backend} model {path} {problem}. "
+                                        f"Run `python model_export.py --backend {backend} --weights {self.model_path}` first.")
+            path = self.export(backend)
+        return YOLO(str(path), task="detect")
+
+    @staticmethod
+    def _iou(box_a: list, box_b: list) -> float:
+        x_min, y_min = max(box_a[0], box_b[0]), max(box_a[1], box_b[1])
+        x_max, y_max = min(box_a[2], box_b[2]), min(box_a[3], box_b[3])
+        intersection = max(0, x_max - x_min) * max(0, y_max - y_min)
+        union = (box_a[2] - box_a[0]) * (box_a[3] - box_a[1]) + (box_b[2] - box_b[0]) * (box_b[3] - box_b[1]) - intersection
+        return intersection / union if union > 0 else 0.0
+
+    def _predict(self, model: YOLO, image: np.ndarray) -> list[tuple[int, float, list]]:
+        result = model.predict(source=image,
+                               imgsz=self.settings.MODEL_IMG_SIZE,
+                               conf=self.settings.CONFIDENCE_THRESHOLD,
+                               iou=self.settings.IOU_THRESHOLD,
+                               device="cpu",
+                               verbose=False)[0]
+        return [(int(cls_id), float(conf), bbox)
+                for cls_id, conf, bbox in zip(result.boxes.cls.tolist(), result.boxes.conf.tolist(), result.boxes.xyxy.tolist(),
+                                               strict=True)]
+
+    def check_parity(self, images: list[np.ndarray], backends: tuple = ("onnx", "openvino"), iou_threshold: float = 0.5) -> dict:
+        """
+        Compare the detections of every backend against the torch reference on the sample images.
+        Detections are matched greedily by class and IoU.
+        """
+        reference_model = self.load("torch")
+        references = [self._predict(reference_model, image) for image in images]
+
+        report = {}
+        for backend in backends:
+            model = self.load(backend)
+            matched = missing = extra = 0
+            confidence_deltas, ious = [], []
+            for image, reference in zip(images, references, strict=True):
+                candidates = self._predict(model, image)
+                for cls_id, conf, bbox in reference:
+                    best_index, best_iou = None, iou_threshold
+                    for index, (other_cls, _, other_bbox) in enumerate(candidates):
+                        iou = self._iou(bbox, other_bbox)
+                        if other_cls == cls_id and iou >= best_iou:
+                            best_index, best_iou = index, iou
+                    if best_index is None:
+                        missing += 1
+                        continue
+                    matched += 1
+                    ious.append(best_iou)
+                    confidence_deltas.append(abs(conf - candidates.pop(best_index)[1]))
+                extra += len(candidates)
+
+            report[backend] = {
+                "images": len(images),
+                "reference_detections": sum(len(reference) for reference in references),
+                "matched": matched,
+                "missing": missing,
+                "extra": extra,
+                "mean_iou": round(float(np.mean(ious)), 4) if ious else None,
+                "max_confidence_delta": round(max(confidence_deltas), 4) if confidence_deltas else None,
+            }
+            self.logger.info(f"Parity torch vs {backend}: {report[backend]}")
+        return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the trained PPE model and check accuracy parity between backends.")
+    parser.add_argument("--backend", choices=["onnx", "openvino"], nargs="+", default=["onnx"])
+    parser.add_argument("--force", action="store_true", help="re-export even if the artifact already exists")
+    parser.add_argument("--parity-images", type=str, default=None, help="folder with sample images for the parity check")
+    parser.add_argument("--limit", type=int, default=20, help="max number of sample images for the parity check")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--version", help="export a registered model version instead of TRAINED_MODEL_PATH")
+    target.add_argument("--weights", type=Path, help="export this weights file instead of TRAINED_MODEL_PATH")
+    args = parser.parse_args()
+
+    from model_registry import model_registry
+    model_path = model_registry.weights_path(args.version) if args.version else args.weights or settings.MODEL_WEIGHTS_PATH
+    exporter = ModelExporter(model_path=str(model_path), settings=settings, logger=logger)
+    for backend in args.backend:
+        exporter.export(backend, force=args.force)
+
+    if args.parity_images:
+        image_paths = sorted(p for p in Path(args.parity_images).iterdir() if p.suffix.lower() in (".jpg", ".jpeg", ".png"))
+        sample_images = [cv2.imread(str(p)) for p in image_paths[:args.limit]]
+        print(exporter.check_parity(sample_images, backends=tuple(args.backend)))
@@ -0,0 +1,139 @@
+import asyncio
+import threading
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Literal, Optional
+
+from logger import logger, Logger
+from model_registry import ModelRegistry, model_registry
+from settings import Settings, settings
+
+if TYPE_CHECKING:
+    from inference import InferenceManager
+
+
+class ModelNotReadyError(Exception):
+    """Raised when the model could not be loaded and detection requests cannot be served."""
+
+
+class ModelLoader:
+    """
+    Loads the serving InferenceManager outside of the import path: in the background from the app lifespan
+    (MODEL_PRELOAD) or on the first detection request. torch and ultralytics are only imported here,
+    so importing the app stays cheap. The model is warmed up on a dummy image before it is reported ready.
+    The weights come from the active version of the model registry (legacy TRAINED_MODEL_PATH otherwise)
+    and `reload` builds and warms up a new version before it replaces the serving one.
+    """
+    def __init__(self, settings: Settings, logger: Logger, registry: ModelRegistry):
+        self.settings = settings
+        self.logger = logger
+        self.registry = registry
+        self.state: Literal["not_loaded", "loading", "ready", "failed"] = "not_loaded"
+        self.manager: Optional["InferenceManager"] = None
+        self.error: Optional[str] = None
+        self.load_seconds: Optional[float] = None
+        self.warmup_seconds: Optional[float] = None
+        self._signature: Optional[str] = None
+        self._lock = threading.Lock()
+
+    @property
+    def result_signature(self) -> str:
+        """Result signature of the active model, computed from the weights without loading them."""
+        if self.manager is not None:
+            return self.manager.result_signature
+        if self._signature is None:
+            from inference import compute_model_version, result_signature
+            from tiling import TileSlicer
+            model_version = compute_model_version(self.registry.active_weights_path(),
+                                                  self.settings.INFERENCE_BACKEND,
+                                                  self.settings.MODEL_PRECISION)
+            self._signature = result_signature(model_version, self.settings.CONFIDENCE_THRESHOLD, self.settings.IOU_THRESHOLD,
+                                               TileSlicer(settings=self.settings, logger=self.logger))
+        return self._signature
+
+    def invalidate_signature(self) -> None:
+        """Forget the cached signature after the active model changed outside of this loader (worker pool)."""
+        self._signature = None
+
+    def build(self, model_path: Path) -> "InferenceManager":
+        """Load and warm up a model from the given weights without touching the serving one."""
+        from inference import InferenceManager
+        started_at = time.perf_counter()
+        manager = InferenceManager(model_path=str(model_path), settings=self.settings, logger=self.logger)
+        self.load_seconds = time.perf_counter() - started_at
+        self.warmup_seconds = None
+        if self.settings.MODEL_WARMUP:
+            started_at = time.perf_counter()
+            manager.warmup()
+            self.warmup_seconds = time.perf_counter() - started_at
+        return manager
+
+    def load(self) -> "InferenceManager":
+        """Load the active model (blocking, concurrent callers wait for the same load)."""
+        with self._lock:
+            if self.manager is not None:
+                return self.manager
+            self.state = "loading"
+            try:
+                manager = self.build(self.registry.active_weights_path())
+            except Exception as e:
+                self.state = "failed"
+                self.error = str(e)
+                self.logger.error(f"Loading the model failed: {e}")
+                raise ModelNotReadyError(f"Model is not available: {e}") from e
+
+            self.manager = manager
+            self.state = "ready"
+            self.error = None
+            self.logger.info(f"Model {manager.model_version} ready (load {self.load_seconds:.2f}s, "
+                             f"warm-up {self.warmup_seconds or 0:.2f}s)")
+            return manager
+
+    def reload(self, version: Optional[str] = None) -> "InferenceManager":
+        """
+        Build and warm up `version` (default: the active registry version) and make it the serving model.
+        The registry pointer only moves once the new model is ready, a failed load keeps the old model serving.
+        """
+        model_path = self.registry.weights_path(version) if version else self.registry.active_weights_path()
+        manager = self.build(model_path)
+        with self._lock:
+            if version:
+                self.registry.activate(version)
+            self.manager = manager
+            self.state = "ready"
+            self.error = None
+            self._signature = None
+        self.logger.info(f"Model {manager.model_version} is now serving (load {self.load_seconds:.2f}s, "
+                         f"warm-up {self.warmup_seconds or 0:.2f}s)")
+        return manager
+
+    def _load_in_background(self) -> None:
+        try:
+            self.load()
+        except ModelNotReadyError:
+            pass
+
+    def start(self) -> None:
+        """Start loading in a daemon thread (a slow load never holds up startup or shutdown)."""
+        if self.state == "not_loaded":
+            self.state = "loading"
+            threading.Thread(target=self._load_in_background, name="model-loader", daemon=True).start()
+
+    async def get(self) -> "InferenceManager":
+        """The loaded model, loading it first if needed."""
+        if self.manager is not None:
+            return self.manager
+        return await asyncio.to_thread(self.load)
+
+    def status(self) -> dict:
+        return {
+            "state": self.state,
+            "model_version": self.manager.model_version if self.manager is not None else None,
+            "registry_version": self.registry.active_version(),
+            "load_seconds": round(self.load_seconds, 3) if self.load_seconds is not None else None,
+            "warmup_seconds": round(self.warmup_seconds, 3) if self.warmup_seconds is not None else None,
+            "error": self.error,
+        }
+
+
+model_loader = ModelLoader(settings=settings, logger=logger, registry=model_registry)
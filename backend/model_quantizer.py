@@ -0,0 +1,191 @@
+from pathlib import Path
+from typing import Optional
+import argparse
+import time
+
+from ultralytics import YOLO
+from ultralytics.data.augment import LetterBox
+import numpy as np
+import cv2
+
+try:
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+except ImportError:  # onnxruntime is only needed for the ONNX INT8 path
+    CalibrationDataReader = object
+    quantize_static = None
+
+from settings import Settings, settings
+from logger import Logger, logger
+from model_export import ModelExporter
+
+
+def build_serving_artifact(model_path: Path, settings: Settings, logger: Logger) -> Path:
+    """
+    Export (or INT8-quantize) `model_path` for the configured INFERENCE_BACKEND / MODEL_PRECISION, so the weights
+    can be served as soon as they are activated. Up-to-date artifacts are reused.
+    """
+    if settings.MODEL_PRECISION == "int8":
+        return ModelQuantizer(model_path=str(model_path), settings=settings, logger=logger).quantize(backend=settings.INFERENCE_BACKEND)
+    return ModelExporter(model_path=str(model_path), settings=settings, logger=logger).export(settings.INFERENCE_BACKEND)
+
+
+class CalibrationImageReader(CalibrationDataReader):
+    """Feeds letterboxed validation images to the ONNX Runtime calibrator one at a time."""
+    def __init__(self, image_paths: list[Path], input_name: str, image_size: int):
+        self.image_paths = image_paths
+        self.input_name = input_name
+        self.letterbox = LetterBox(new_shape=(image_size, image_size), auto=False)
+        self._index = 0
+
+    def _preprocess(self, image_path: Path) -> np.ndarray:
+        image = self.letterbox(image=cv2.imread(str(image_path)))
+        image = image[..., ::-1].transpose(2, 0, 1)  # BGR HWC -> RGB CHW
+        return np.ascontiguousarray(image, dtype=np.float32)[None] / 255.0
+
+    def get_next(self) -> Optional[dict]:
+        if self._index >= len(self.image_paths):
+            return None
+        image_path = self.image_paths[self._index]
+        self._index += 1
+        return {self.input_name: self._preprocess(image_path)}
+
+    def rewind(self) -> None:
+        self._index = 0
+
+    def __len__(self) -> int:
+        return len(self.image_paths)
+
+
+class ModelQuantizer:
+    """
+    Post-training INT8 quantization of the trained PPE model for CPU inference.
+    Calibrates on a subset of the dataset's valid/images and reports size, latency and mAP deltas.
+    """
+    def __init__(self, model_path: str, settings: Settings, logger: Logger):
+        self.settings = settings
+        self.logger = logger
+        self.exporter = ModelExporter(model_path=model_path, settings=settings, logger=logger)
+        self.calibration_dir = self.settings.DATASET_PATH / "valid" / "images"
+        self.image_size = self.settings.MODEL_IMG_SIZE
+
+    def _calibration_images(self) -> list[Path]:
+        image_paths = sorted(p for p in self.calibration_dir.glob("*") if p.suffix.lower() in (".jpg", ".jpeg", ".png"))
+        if not image_paths:
+            self.logger.error(f"No calibration images found in {self.calibration_dir}")
+            raise ValueError(f"No calibration images found in {self.calibration_dir}")
+        # evenly spread subset instead of the first N files
+        step = max(1, len(image_paths) // self.settings.QUANTIZATION_CALIBRATION_IMAGES)
+        return image_paths[::step][:self.settings.QUANTIZATION_CALIBRATION_IMAGES]
+
+    def _quantize_onnx(self, output_path: Path) -> Path:
+        if quantize_static is None:
+            raise ImportError("onnxruntime is required for ONNX INT8 quantization: pip install onnxruntime")
+        fp32_path = self.exporter.export("onnx")
+        import onnxruntime
+        input_name = onnxruntime.InferenceSession(str(fp32_path), providers=["CPUExecutionProvider"]).get_inputs()[0].name
+
+        reader = CalibrationImageReader(self._calibration_images(), input_name=input_name, image_size=self.image_size)
+        self.logger.info(f"Calibrating INT8 ONNX model on {len(reader)} images from {self.calibration_dir}")
+        quantize_static(model_input=str(fp32_path),
+                        model_output=str(output_path),
+                        calibration_data_reader=reader,
+                        quant_format=QuantFormat.QDQ,
+                        per_channel=True,
+                        activation_type=QuantType.QUInt8,
+                        weight_type=QuantType.QInt8)
+        return output_path
+
+    def _quantize_openvino(self, output_path: Path) -> Path:
+        self.logger.info(f"Calibrating INT8 OpenVINO model on {self.settings.DATASET_YAML_PATH}")
+        # ultralytics runs NNCF calibration on the validation split of the dataset YAML
+        exported = YOLO(self.exporter.model_path).export(format="openvino",
+                                                         int8=True,
+                                                         data=str(self.settings.DATASET_YAML_PATH),
+                                                         imgsz=self.image_size,
+                                                         dynamic=True,
+                                                         device="cpu")
+        self.exporter.replace_artifact(Path(exported), output_path)
+        return output_path
+
+    def quantize(self, backend: str = "onnx", force: bool = False) -> Path:
+        """Produce the INT8 model next to the weights (best_ppe_model_int8.onnx / ..._int8_openvino_model)."""
+        output_path = self.exporter.export_path(backend, precision="int8")
+        if self.exporter.is_current(output_path) and not force:
+            self.logger.info(f"INT8 model already exists: {output_path}")
+            return output_path
+        if backend == "onnx":
+            self._quantize_onnx(output_path)
+        elif backend == "openvino":
+            self._quantize_openvino(output_path)
+        else:
+            raise ValueError(f"INT8 quantization is supported for the onnx and openvino backends, not {backend}.")
+        self.exporter.mark_current(output_path)
+        self.logger.info(f"INT8 model saved to: {output_path}")
+        return output_path
+
+    @staticmethod
+    def _size_mb(path: Path) -> float:
+        size = sum(p.stat().st_size for p in path.rglob("*")) if path.is_dir() else path.stat().st_size
+        return round(size / (1024 ** 2), 2)
+
+    def _latency_ms(self, model_path: Path, images: list[np.ndarray]) -> float:
+        model = YOLO(str(model_path), task="detect")
+        model.predict(source=images[0], imgsz=self.image_size, device="cpu", verbose=False)  # warm-up
+        started_at = time.perf_counter()
+        for image in images:
+            model.predict(source=image, imgsz=self.image_size, device="cpu", verbose=False)
+        return round((time.perf_counter() - started_at) / len(images) * 1000, 2)
+
+    def _map(self, model_path: Path) -> dict:
+        metrics = YOLO(str(model_path), task="detect").val(data=str(self.settings.DATASET_YAML_PATH),
+                                                           imgsz=self.image_size,
+                                                           device="cpu",
+                                                           plots=False,
+                                                           verbose=False)
+        return {"map50": round(float(metrics.box.map50), 4), "map50_95": round(float(metrics.box.map), 4)}
+
+    def report(self, backend: str = "onnx", baseline_metrics=None, latency_images: int = 20) -> dict:
+        """
+        Size, CPU latency and mAP of the FP32 vs the INT8 model of the same backend.
+        `baseline_metrics` can be the result of YOLOmodelTrainer.evaluate() to avoid validating the FP32 model again.
+        """
+        fp32_path = self.exporter.export(backend)
+        int8_path = self.exporter.export_path(backend, precision="int8")
+        images = [cv2.imread(str(p)) for p in self._calibration_images()[:latency_images]]
+
+        fp32_map = ({"map50": round(float(baseline_metrics.box.map50), 4), "map50_95": round(float(baseline_metrics.box.map), 4)}
+                    if baseline_metrics is not None else self._map(fp32_path))
+        int8_map = self._map(int8_path)
+        report = {
+            "backend": backend,
+            "fp32_size_mb": self._size_mb(fp32_path),
+            "int8_size_mb": self._size_mb(int8_path),
+            "fp32_latency_ms": self._latency_ms(fp32_path, images),
+            "int8_latency_ms": self._latency_ms(int8_path, images),
+            "fp32_map50_95": fp32_map["map50_95"],
+            "int8_map50_95": int8_map["map50_95"],
+            "map50_delta": round(int8_map["map50"] - fp32_map["map50"], 4),
+            "map50_95_delta": round(int8_map["map50_95"] - fp32_map["map50_95"], 4),
+        }
+        report["size_delta_mb"] = round(report["int8_size_mb"] - report["fp32_size_mb"], 2)
+        report["latency_delta_ms"] = round(report["int8_latency_ms"] - report["fp32_latency_ms"], 2)
+        self.logger.info(f"INT8 quantization report: {report}")
+        return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="INT8 post-training quantization of the trained PPE model.")
+    parser.add_argument("--backend", choices=["onnx", "openvino"], default="onnx")
+    parser.add_argument("--force", action="store_true", help="re-quantize even if the INT8 artifact already exists")
+    parser.add_argument("--report", action="store_true", help="compare size, latency and mAP against the FP32 model")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--version", help="quantize a registered model version instead of TRAINED_MODEL_PATH")
+    target.add_argument("--weights", type=Path, help="quantize this weights file instead of TRAINED_MODEL_PATH")
+    args = parser.parse_args()
+
+    from model_registry import model_registry
+    model_path = model_registry.weights_path(args.version) if args.version else args.weights or settings.MODEL_WEIGHTS_PATH
+    quantizer = ModelQuantizer(model_path=str(model_path), settings=settings, logger=logger)
+    quantizer.quantize(backend=args.backend, force=args.force)
+    if args.report:
+        print(quantizer.report(backend=args.backend))
@@ -0,0 +1,157 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+from logger import logger, Logger
+from settings import Settings, settings
+
+
+@dataclass
+class ModelVersion:
+    """Metadata of one registered model version (stored as metadata.json next to its weights)."""
+    version: str
+    weights_file: str
+    sha256: str
+    created_at: str = field(default_factory=lambda: datetime.now().isoformat(timespec="seconds"))
+    source: Optional[str] = None
+    classes: Optional[dict[int, str]] = None
+    image_size: Optional[int] = None
+    metrics: dict[str, float] = field(default_factory=dict)
+
+
+class ModelRegistry:
+    """
+    Versioned model registry in MODEL_REGISTRY_DIR: every version lives in its own directory
+    (`<version>/<version>.pt` + `metadata.json`) and the ACTIVE file names the version that should be served.
+    The pointer is replaced atomically, so a watcher never sees a half written file. Without an active
+    version the legacy TRAINED_MODEL_PATH weights are served.
+    """
+    ACTIVE_FILE = "ACTIVE"
+
+    def __init__(self, settings: Settings, logger: Logger):
+        self.settings = settings
+        self.logger = logger
+        self.root = self.settings.BASE_DIR / self.settings.MODEL_REGISTRY_DIR
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _sha256(path: Path) -> str:
+        sha256 = hashlib.sha256()
+        with open(path, "rb") as weights:
+            for chunk in iter(lambda: weights.read(1024 * 1024), b""):
+                sha256.update(chunk)
+        return sha256.hexdigest()
+
+    def _next_version(self) -> str:
+        numbers = [int(version[1:]) for version in self.versions() if version[1:].isdigit()]
+        return f"v{max(numbers, default=0) + 1:04d}"
+
+    def versions(self) -> list[str]:
+        if not self.root.exists():
+            return []
+        return sorted(path.name for path in self.root.iterdir() if (path / "metadata.json").exists())
+
+    def get(self, version: str) -> Optional[ModelVersion]:
+        metadata_path = self.root / version / "metadata.json"
+        if not metadata_path.exists():
+            return None
+        metadata = json.loads(metadata_path.read_text())
+        if metadata.get("classes"):
+            metadata["classes"] = {int(key): name for key, name in metadata["classes"].items()}
+        return ModelVersion(**metadata)
+
+    def models(self) -> list[ModelVersion]:
+        return [self.get(version) for version in self.versions()]
+
+    def weights_path(self, version: str) -> Path:
+        metadata = self.get(version)
+        if metadata is None:
+            raise KeyError(f"Model version {version} is not registered")
+        return self.root / version / metadata.weights_file
+
+    def register(self, weights_path: Path, metrics: Optional[dict] = None, classes: Optional[dict] = None,
+                 image_size: Optional[int] = None, activate: bool = False) -> ModelVersion:
+        """Copy the weights into a new version directory together with their metadata."""
+        weights_path = Path(weights_path)
+        with self._lock:
+            version = self._next_version()
+            version_dir = self.root / version
+            version_dir.mkdir(parents=True)
+            shutil.copy2(weights_path, version_dir / f"{version}{weights_path.suffix}")
+            metadata = ModelVersion(version=version,
+                                    weights_file=f"{version}{weights_path.suffix}",
+                                    sha256=self._sha256(weights_path),
+                                    source=str(weights_path),
+                                    classes={int(key): str(name) for key, name in (classes or {}).items()} or None,
+                                    image_size=image_size,
+                                    metrics={key: float(value) for key, value in (metrics or {}).items()})
+            # metadata.json is written last, a version without it is not listed
+            (version_dir / "metadata.json").write_text(json.dumps(asdict(metadata), indent=2))
+        self.logger.info(f"Registered model version {version} from {weights_path}")
+        if activate:
+            self.activate(version)
+        return metadata
+
+    def active_version(self) -> Optional[str]:
+        active_path = self.root / self.ACTIVE_FILE
+        if not active_path.exists():
+            return None
+        version = active_path.read_text().strip()
+        return version or None
+
+    def active_weights_path(self) -> Path:
+        """Weights of the active version, or the legacy TRAINED_MODEL_PATH when nothing is activated."""
+        version = self.active_version()
+        return self.weights_path(version) if version else self.settings.MODEL_WEIGHTS_PATH
+
+    def activate(self, version: str) -> None:
+        """Point ACTIVE at a registered version (atomic rename of a temporary file)."""
+        if self.get(version) is None:
+            raise KeyError(f"Model version {version} is not registered")
+        self.root.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile("w", dir=self.root, delete=False) as pointer:
+            pointer.write(version)
+        os.replace(pointer.name, self.root / self.ACTIVE_FILE)
+        self.logger.info(f"Model version {version} activated")
+
+
+model_registry = ModelRegistry(settings=settings, logger=logger)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the versioned PPE model registry.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    register_parser = subparsers.add_parser("register", help="register a weights file as a new version")
+    register_parser.add_argument("weights", type=Path)
+    register_parser.add_argument("--image-size", type=int, default=settings.MODEL_IMG_SIZE)
+    register_parser.add_argument("--activate", action="store_true")
+    activate_parser = subparsers.add_parser("activate", help="serve a registered version")
+    activate_parser.add_argument("version")
+    subparsers.add_parser("list", help="list the registered versions")
+    args = parser.parse_args()
+
+    if args.command == "register":
+        from model_quantizer import build_serving_artifact
+        model_version = model_registry.register(args.weights, image_size=args.image_size)
+        # the artifact of the configured backend/precision must exist before the version can be served
+        build_serving_artifact(model_registry.weights_path(model_version.version), settings=settings, logger=logger)
+        if args.activate:
+            model_registry.activate(model_version.version)
+        print(asdict(model_version))
+    elif args.command == "activate":
+        from model_quantizer import build_serving_artifact
+        build_serving_artifact(model_registry.weights_path(args.version), settings=settings, logger=logger)
+        model_registry.activate(args.version)
+    else:
+        active = model_registry.active_version()
+        for model_version in model_registry.models():
+            print(f"{'*' if model_version.version == active else ' '} {model_version.version} {model_version.created_at} "
+                  f"{model_version.metrics}")
@@ -8,6 +8,8 @@ import shutil
 
 from settings import Settings, settings
 from logger import Logger, logger
+from model_quantizer import ModelQuantizer, build_serving_artifact
+from model_registry import model_registry
 
 
 class YOLOmodelTrainer:
@@ -46,6 +48,7 @@ class YOLOmodelTrainer:
         self.number_of_epochs = self._detect_number_of_epochs(requested_epochs=self.settings.NUMBER_OF_EPOCHS)
         
         self.best_model_path = None
+        self.registered_model_path = None  # the registry copy of the last run's best weights
         self.last_trained_model = None
         
     def _detect_vram_gb(self) -> float:
@@ -191,6 +194,17 @@ class YOLOmodelTrainer:
             shutil.copy(best_weights, final_model_path)
             self.best_model_path = final_model_path
             self.logger.info(f"Best model copied to: {final_model_path}")
+
+            # Every training run becomes a new registry version, the serving app picks it up once activated
+            model_version = model_registry.register(best_weights,
+                                                    metrics=getattr(results, "results_dict", None),
+                                                    classes=self.last_trained_model.names,
+                                                    image_size=self.model_image_size)
+            self.registered_model_path = model_registry.weights_path(model_version.version)
+            # the ONNX / OpenVINO (INT8) artifact of the configured backend has to exist before the version is served
+            build_serving_artifact(self.registered_model_path, settings=self.settings, logger=self.logger)
+            if self.settings.MODEL_REGISTRY_AUTO_ACTIVATE:
+                model_registry.activate(model_version.version)
         else: 
             self.logger.warning("Best model weights not found after training.")
         return results
@@ -206,6 +220,20 @@ class YOLOmodelTrainer:
         self.logger.info("Model evaluation completed.")
         return metrics
     
+    def quantize(self, backend: str = "onnx") -> dict:
+        """
+        Post-training INT8 quantization of the best model, reporting size, latency and mAP deltas.
+        The registered version of the run is quantized (the legacy TRAINED_MODEL_PATH copy without a registry version).
+        """
+        if not self.best_model_path:
+            self.logger.error("No trained model available for quantization.")
+            raise ValueError("Model has not been trained yet.")
+        
+        model_path = self.registered_model_path or self.best_model_path
+        quantizer = ModelQuantizer(model_path=str(model_path), settings=self.settings, logger=self.logger)
+        quantizer.quantize(backend=backend, force=True)
+        return quantizer.report(backend=backend, baseline_metrics=self.evaluate())
+    
     def __str__(self):
         return (f"YOLOmodelTrainer: {self.settings.MODEL_NAME_AND_SIZE}, \n"
                 f"dataset_path: {self.dataset_path}, \n"
@@ -226,6 +254,7 @@ if __name__ == "__main__":
     print(model_trainer)
 
     model_trainer.train()
+    print(model_trainer.quantize())
     
     # Load previously trained model
     # best_model_path = model_trainer.trained_models_dir / "best_ppe_model.pt"
@@ -1,11 +1,17 @@
 from uuid import uuid4
+from contextlib import contextmanager
 import io
 import base64
 import os
+import threading
 from pathlib import Path
 from datetime import datetime
+from typing import Callable, Optional, Sequence, Union
 
+import numpy as np
+from PIL import Image
 import reportlab
+from reportlab.lib import colors
 from reportlab.lib.pagesizes import letter
 from reportlab.pdfgen import canvas
 from reportlab.lib.utils import ImageReader
@@ -13,20 +19,72 @@ from reportlab.pdfbase.pdfmetrics import stringWidth
 
 from settings import Settings, settings
 from logger import Logger, logger
+from detection_store import StoredDetection
+from storage_manager import StorageManager, storage_manager
 from schemas.detect_schemas import DetectionResponseSchema
 
 
+_a85_lock = threading.Lock()
+_a85_renders = 0
+_a85_default = reportlab.rl_config.useA85
+
+
+@contextmanager
+def _binary_streams():
+    """
+    Embed the streams of the reports rendered inside as binary instead of ASCII85: the pure Python encoder
+    dominated the render time of image heavy reports and ASCII85 makes every embedded image 25% larger.
+    reportlab has no per-document option and reads rl_config.useA85 while drawing and saving, so it is
+    switched off for the duration of the renders only (counted, reports render concurrently in the job threads).
+    """
+    global _a85_renders, _a85_default
+    with _a85_lock:
+        if _a85_renders == 0:
+            _a85_default = reportlab.rl_config.useA85
+            reportlab.rl_config.useA85 = 0
+        _a85_renders += 1
+    try:
+        yield
+    finally:
+        with _a85_lock:
+            _a85_renders -= 1
+            if _a85_renders == 0:
+                reportlab.rl_config.useA85 = _a85_default
+
+
 class PDFReportGenerator:
-    """Service to generate PDF reports from detection data and annotated images."""
-    def __init__(self, settings: Settings, logger: Logger):
+    """
+    Service to generate PDF reports from detection data and annotated images.
+    Reports are written to the sharded pdf_reports storage area, or kept in memory for
+    one-shot downloads when REPORT_IN_MEMORY_DOWNLOADS is enabled.
+    """
+    def __init__(self, settings: Settings, logger: Logger, storage: StorageManager):
         self.settings = settings
         self.logger = logger
+        self.storage = storage
+        self.in_memory = self.settings.REPORT_IN_MEMORY_DOWNLOADS
         self.output_path = Path(self.settings.PDF_REPORTS_DIR)
         self.output_path.mkdir(parents=True, exist_ok=True)
         
     @staticmethod
     def _generate_unique_filename() -> str:
         return f"report_{uuid4().hex}.pdf"
+
+    def _new_output(self) -> tuple[Union[str, io.BytesIO], Optional[Path]]:
+        """Canvas target of a new report: a sharded file path, or a buffer for in-memory one-shot downloads."""
+        if self.in_memory:
+            return io.BytesIO(), None
+        output_path = self.storage.path_for("pdf_reports", self._generate_unique_filename())
+        return str(output_path), output_path
+
+    def _finish(self, target: Union[str, io.BytesIO], output_path: Optional[Path]) -> Union[str, bytes]:
+        """The URL of the written report, or the PDF bytes of an in-memory report."""
+        if output_path is None:
+            return target.getvalue()
+        self.storage.track("pdf_reports", output_path)
+        pdf_url = f"http://localhost:8000/pdf_reports/{self.storage.relative_path('pdf_reports', output_path)}"
+        self.logger.info(f"PDF report accessible at: {pdf_url}")
+        return pdf_url
     
     def _draw_wrapped_text(self, c, text, x, y, max_width, font_name="Helvetica", font_size=12, line_height=20):
         words = text.split()
@@ -44,10 +102,16 @@ class PDFReportGenerator:
             y -= line_height
         return y
         
-    def generate_report(self, detections: list, annotated_image_base64: str, summary, image_id: str, timestamp: datetime) -> Path:
+    @_binary_streams()
+    def generate_report(self, detections: list, annotated_image_base64: Optional[str], summary, image_id: str, timestamp: datetime,
+                        annotated_image_bytes: Optional[bytes] = None, progress: Optional[Callable[[float], None]] = None) -> Union[str, bytes]:
+        """
+        The annotated image is taken as encoded bytes when available (stored detections), otherwise base64.
+        `progress` is called with the completed fraction while the report renders (used by background jobs).
+        """
+        progress = progress or (lambda fraction: None)
         try:  
-            filename = self._generate_unique_filename()
-            output_path = self.output_path / filename
+            target, output_path = self._new_output()
             width, height = letter
             
             total_detections = len(detections)
@@ -56,7 +120,7 @@ class PDFReportGenerator:
             violations = summary.no_helmet_count
             complaints = summary.helmet_count
             
-            c = canvas.Canvas(str(output_path), pagesize=letter)
+            c = canvas.Canvas(target, pagesize=letter)
             c.setFont("Helvetica", 12)
             c.drawString(30, height - 30, "PPE Safety Incident Report")
 
@@ -79,7 +143,7 @@ class PDFReportGenerator:
             left_margin = 30
             max_text_width = width - left_margin * 2
 
-            for detection in detections:
+            for index, detection in enumerate(detections, start=1):
                 if y_position < bottom_margin:
                     c.showPage()
                     c.setFont("Helvetica", 12)
@@ -88,34 +152,161 @@ class PDFReportGenerator:
                 y_position = self._draw_wrapped_text(
                     c, detection_text, left_margin, y_position, max_text_width, "Helvetica", 12, line_height
                 )
+                progress(0.5 * index / total_detections)
 
-            # Ensure enough space for the image, otherwise move to new page
-            image_height = 300
-            image_width = 500
-            if y_position - image_height < bottom_margin:
-                c.showPage()
-                c.setFont("Helvetica", 12)
-                y_position = height - 30
+            # Detections-only results have no annotated image to embed
+            if annotated_image_bytes is not None or annotated_image_base64:
+                # Ensure enough space for the image, otherwise move to new page
+                image_height = 300
+                image_width = 500
+                if y_position - image_height < bottom_margin:
+                    c.showPage()
+                    c.setFont("Helvetica", 12)
+                    y_position = height - 30
 
-            # Decode the base64 image
-            image_data = base64.b64decode(annotated_image_base64)
-            image_stream = io.BytesIO(image_data)
-            image = ImageReader(image_stream)
+                # Decode the base64 image (stored detections already hold the encoded bytes)
+                image_data = annotated_image_bytes if annotated_image_bytes is not None else base64.b64decode(annotated_image_base64)
+                image_stream = io.BytesIO(image_data)
+                image = ImageReader(image_stream)
 
-            c.drawImage(image, left_margin, y_position - image_height, width=image_width, height=image_height)
+                c.drawImage(image, left_margin, y_position - image_height, width=image_width, height=image_height)
+            progress(0.8)
 
             c.save()
-            self.logger.info(f"PDF report generated at: {output_path}")
-            
-            pdf_url = f"http://localhost:8000/pdf_reports/{filename}"
-            self.logger.info(f"PDF report accessible at: {pdf_url}")
-            return pdf_url
+            return self._finish(target, output_path)
         except Exception as e:
             self.logger.error(f"Failed to generate PDF report: {e}")
             raise
+
+    def _thumbnail(self, image_bytes: bytes, box_width: float, box_height: float) -> tuple[ImageReader, float, float]:
+        """
+        Downscale an encoded image to REPORT_IMAGE_DPI at the size it is drawn with and re-encode it
+        as a JPEG of REPORT_IMAGE_JPEG_QUALITY (reportlab embeds JPEG bytes without decoding them again).
+        JPEGs are decoded at a reduced DCT scale when the target is much smaller than the original.
+        Returns the image and its drawn width and height in points.
+        """
+        with Image.open(io.BytesIO(image_bytes)) as image:
+            width, height = image.size
+            scale = min(box_width / width, box_height / height)
+            draw_width, draw_height = width * scale, height * scale
+
+            # points are 1/72 inch: pixels needed for the drawn size at the target DPI
+            target_width = max(1, round(draw_width / 72 * self.settings.REPORT_IMAGE_DPI))
+            target_height = max(1, round(height * target_width / width))
+            image.draft("RGB", (target_width, target_height))
+            thumbnail = image.convert("RGB")
+            if thumbnail.width > target_width:
+                thumbnail = thumbnail.resize((target_width, target_height), Image.Resampling.BILINEAR)
+
+        buffer = io.BytesIO()
+        thumbnail.save(buffer, format="JPEG", quality=self.settings.REPORT_IMAGE_JPEG_QUALITY)
+        buffer.seek(0)
+        return ImageReader(buffer), draw_width, draw_height
+
+    def _draw_timeline(self, c, frames: Sequence[StoredDetection], x: float, y: float, chart_width: float, chart_height: float):
+        """Violations over the frames as a bar chart, frames are binned when there are more than fit the width."""
+        bins = max(1, min(len(frames), int(chart_width // 2)))
+        violations = np.array([frame.violations for frame in frames], dtype=np.int64)
+        # violations summed per bin of consecutive frames
+        binned = np.bincount(np.arange(len(frames)) * bins // len(frames), weights=violations, minlength=bins)
+        peak = max(1.0, float(binned.max()))
+        bar_width = chart_width / bins
+
+        c.setStrokeColor(colors.grey)
+        c.line(x, y, x + chart_width, y)
+        c.line(x, y, x, y + chart_height)
+        c.setFillColor(colors.red)
+        for index in np.flatnonzero(binned):
+            c.rect(x + index * bar_width, y, bar_width, binned[index] / peak * chart_height, stroke=0, fill=1)
+        c.setFillColor(colors.black)
+        c.setFont("Helvetica", 8)
+        c.drawString(x + 2, y + chart_height + 2, f"max {peak:g} violations per {len(frames) / bins:.3g} frame(s)")
+        c.drawString(x, y - 10, frames[0].timestamp.strftime("%Y-%m-%d %H:%M:%S"))
+        c.drawRightString(x + chart_width, y - 10, frames[-1].timestamp.strftime("%Y-%m-%d %H:%M:%S"))
+
+    @_binary_streams()
+    def generate_aggregated_report(self, frames: Sequence[StoredDetection], title: str = "PPE Shift Report",
+                                   progress: Optional[Callable[[float], None]] = None) -> Union[str, bytes]:
+        """
+        One report over many stored detections (a shift, a site or a whole batch): totals, a violation timeline
+        and a grid of per-frame thumbnails with their counts. Only one frame is decoded at a time and the embedded
+        thumbnails are downscaled to REPORT_IMAGE_DPI, but the canvas keeps every page (with its compressed
+        thumbnails) in memory until save(), the PDF is not streamed.
+        """
+        if not frames:
+            raise ValueError("No detections to report on.")
+        progress = progress or (lambda fraction: None)
+        frames = sorted(frames, key=lambda frame: frame.timestamp)
+        target, output_path = self._new_output()
+        width, height = letter
+        margin = 30
+
+        try:
+            c = canvas.Canvas(target, pagesize=letter, pageCompression=1)
+            c.setTitle(title)
+
+            # Totals
+            helmets = sum(frame.compliances for frame in frames)
+            violations = sum(frame.violations for frame in frames)
+            frames_with_violations = sum(1 for frame in frames if frame.violations)
+            c.setFont("Helvetica-Bold", 16)
+            c.drawString(margin, height - 40, title)
+            c.setFont("Helvetica", 12)
+            lines = [
+                f"Period: {frames[0].timestamp:%Y-%m-%d %H:%M:%S} - {frames[-1].timestamp:%Y-%m-%d %H:%M:%S}",
+                f"Frames: {len(frames)}",
+                f"Helmets: {helmets}",
+                f"Violations: {violations}",
+                f"Frames with violations: {frames_with_violations} ({frames_with_violations / len(frames):.1%})",
+            ]
+            y_position = height - 70
+            for line in lines:
+                c.drawString(margin, y_position, line)
+                y_position -= 20
+
+            c.setFont("Helvetica-Bold", 12)
+            c.drawString(margin, y_position - 10, "Violation timeline")
+            chart_height = 120
+            self._draw_timeline(c, frames, margin, y_position - 30 - chart_height, width - 2 * margin, chart_height)
+            y_top = y_position - 30 - chart_height - 40
+
+            # Per-frame thumbnails
+            columns, caption_height = 3, 28
+            cell_width = (width - 2 * margin) / columns
+            cell_height = 150
+            thumbnail_width, thumbnail_height = cell_width - 10, cell_height - caption_height - 6
+            column = 0
+            for index, frame in enumerate(frames, start=1):
+                if column == 0 and y_top - cell_height < margin:
+                    c.showPage()
+                    y_top = height - margin
+                x = margin + column * cell_width
+                if frame.annotated_image is not None:
+                    thumbnail, draw_width, draw_height = self._thumbnail(frame.annotated_image, thumbnail_width, thumbnail_height)
+                    c.drawImage(thumbnail, x, y_top - draw_height, width=draw_width, height=draw_height)
+
+                c.setFont("Helvetica", 8)
+                c.setFillColor(colors.black)
+                c.drawString(x, y_top - thumbnail_height - 12, f"#{index} {frame.timestamp:%H:%M:%S} {frame.image_id[:32]}")
+                c.setFillColor(colors.red if frame.violations else colors.darkgreen)
+                c.drawString(x, y_top - thumbnail_height - 22, f"violations: {frame.violations}  helmets: {frame.compliances}")
+                c.setFillColor(colors.black)
+
+                column = (column + 1) % columns
+                if column == 0:
+                    y_top -= cell_height
+                progress(0.95 * index / len(frames))
+
+            c.save()
+        except Exception as e:
+            self.logger.error(f"Failed to generate aggregated PDF report: {e}")
+            raise
+
+        self.logger.info(f"Aggregated PDF report rendered over {len(frames)} frames")
+        return self._finish(target, output_path)
         
     
-report_generator = PDFReportGenerator(settings=settings, logger=logger)
+report_generator = PDFReportGenerator(settings=settings, logger=logger, storage=storage_manager)
     
 
 if __name__ == "__main__":
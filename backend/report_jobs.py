@@ -0,0 +1,206 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, Literal, Optional, Union
+from uuid import uuid4
+
+from logger import logger, Logger
+from metrics import MetricsRegistry, metrics
+from pdf_report_generator import PDFReportGenerator, report_generator
+from settings import Settings, settings
+
+
+class ReportQueueFullError(Exception):
+    """Raised when too many report jobs are pending and the request should be retried later."""
+
+
+@dataclass
+class ReportJob:
+    """State of one background PDF report job, polled through GET /report/{job_id}."""
+    job_id: str
+    key: str
+    status: Literal["queued", "running", "completed", "failed"] = "queued"
+    progress: float = 0.0
+    report_url: Optional[str] = None
+    content: Optional[bytes] = None  # PDF of an in-memory report until it is downloaded
+    downloaded: bool = False
+    expired: bool = False  # the in-memory PDF was dropped before it was downloaded
+    error: Optional[str] = None
+    created_at: datetime = field(default_factory=datetime.now)
+    finished_at: Optional[datetime] = None
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in ("completed", "failed")
+
+    @property
+    def is_reusable(self) -> bool:
+        """
+        Whether a duplicate request can be coalesced into this job: while it is queued or running, or while the
+        PDF of a completed in-memory report is still held. PDFs on disk may be swept by the storage manager
+        at any time, so completed file reports are rendered again.
+        """
+        return self.status in ("queued", "running") or (self.status == "completed" and self.content is not None)
+
+
+class ReportJobManager:
+    """
+    Renders PDF reports on a dedicated thread pool so the reportlab work never blocks the event loop.
+    At most REPORT_MAX_CONCURRENT_JOBS reports render at once and at most REPORT_JOB_MAX_PENDING jobs
+    may be queued or running. Requests for a key (image_id) that already has a queued or running job
+    (or a completed in-memory report not downloaded yet) are coalesced into that job. Finished jobs are forgotten oldest-first above REPORT_JOB_MAX_RETAINED.
+    In-memory PDFs are dropped when they are not downloaded within REPORT_IN_MEMORY_RETENTION_SECONDS (on the storage
+    sweeps, see release_expired_content) and oldest-first when they hold more than REPORT_IN_MEMORY_MAX_MB.
+    """
+    def __init__(self, generator: PDFReportGenerator, settings: Settings, logger: Logger,
+                 metrics: Optional[MetricsRegistry] = None):
+        self.generator = generator
+        self.metrics = metrics
+        self.settings = settings
+        self.logger = logger
+        self.max_concurrent = max(1, self.settings.REPORT_MAX_CONCURRENT_JOBS)
+        self.max_pending = max(1, self.settings.REPORT_JOB_MAX_PENDING)
+        self.max_retained = max(1, self.settings.REPORT_JOB_MAX_RETAINED)
+        self.content_max_age = self.settings.REPORT_IN_MEMORY_RETENTION_SECONDS
+        self.content_max_bytes = self.settings.REPORT_IN_MEMORY_MAX_MB * 1024 * 1024
+
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._jobs: OrderedDict[str, ReportJob] = OrderedDict()
+        self._jobs_by_key: dict[str, str] = {}
+        self._lock = threading.Lock()
+
+        self._submitted = 0
+        self._coalesced = 0
+        self._rejected = 0
+        self._expired = 0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_concurrent, thread_name_prefix="report")
+        return self._executor
+
+    def _pending(self) -> int:
+        return sum(1 for job in self._jobs.values() if not job.is_finished)
+
+    def _forget_finished_jobs(self) -> None:
+        finished = [job_id for job_id, job in self._jobs.items() if job.is_finished]
+        for job_id in finished[:max(0, len(self._jobs) - self.max_retained)]:
+            job = self._jobs.pop(job_id)
+            if self._jobs_by_key.get(job.key) == job_id:
+                del self._jobs_by_key[job.key]
+
+    def submit(self, key: str, render: Callable[[Callable[[float], None]], Union[str, bytes]]) -> tuple[ReportJob, bool]:
+        """
+        Schedule `render(progress_callback)` unless a job for `key` already exists. The render returns
+        the report URL, or the PDF bytes of an in-memory report that is downloaded once through the job.
+        Returns the job and whether the request was coalesced into an existing one.
+        """
+        with self._lock:
+            existing_id = self._jobs_by_key.get(key)
+            existing = self._jobs.get(existing_id) if existing_id else None
+            if existing is not None and existing.is_reusable:
+                self._coalesced += 1
+                return existing, True
+            if self._pending() >= self.max_pending:
+                self._rejected += 1
+                raise ReportQueueFullError("Too many report jobs are pending, please retry later.")
+
+            job = ReportJob(job_id=uuid4().hex, key=key)
+            self._jobs[job.job_id] = job
+            self._jobs_by_key[key] = job.job_id
+            self._submitted += 1
+            self._forget_finished_jobs()
+
+        self._get_executor().submit(self._run, job, render)
+        return job, False
+
+    def _run(self, job: ReportJob, render: Callable[[Callable[[float], None]], Union[str, bytes]]) -> None:
+        job.status = "running"
+        started_at = time.perf_counter()
+
+        def set_progress(progress: float) -> None:
+            job.progress = round(min(max(progress, 0.0), 1.0), 3)
+
+        try:
+            result = render(set_progress)
+            if isinstance(result, bytes):
+                job.content = result
+            else:
+                job.report_url = result
+            job.progress = 1.0
+            job.finished_at = datetime.now()
+            if job.content is not None:
+                # the new PDF counts against REPORT_IN_MEMORY_MAX_MB before the job is reported as completed
+                self.release_expired_content()
+            job.status = "completed"
+            elapsed = time.perf_counter() - started_at
+            if self.metrics is not None:
+                self.metrics.observe("pdf_render", elapsed)
+            self.logger.info(f"Report job {job.job_id} completed in {elapsed:.2f}s")
+        except Exception as e:
+            job.error = str(e)
+            job.finished_at = datetime.now()
+            job.status = "failed"
+            self.logger.error(f"Report job {job.job_id} failed: {e}")
+
+    def release_expired_content(self) -> None:
+        """
+        Drop the in-memory PDFs older than REPORT_IN_MEMORY_RETENTION_SECONDS, then the oldest ones until the rest fits
+        REPORT_IN_MEMORY_MAX_MB. Runs on every storage sweep and when a report completes.
+        """
+        now = datetime.now()
+        with self._lock:
+            held = sorted((job for job in self._jobs.values() if job.content is not None),
+                          key=lambda job: job.finished_at or now)
+            total = sum(len(job.content) for job in held)
+            expired = 0
+            for job in held:
+                if (now - (job.finished_at or now)).total_seconds() > self.content_max_age or total > self.content_max_bytes:
+                    total -= len(job.content)
+                    job.content, job.expired = None, True
+                    expired += 1
+            self._expired += expired
+        if expired:
+            self.logger.info(f"Dropped {expired} in-memory reports that were not downloaded")
+
+    def get(self, job_id: str) -> Optional[ReportJob]:
+        return self._jobs.get(job_id)
+
+    def take_content(self, job_id: str) -> Optional[bytes]:
+        """Hand out the PDF of an in-memory report exactly once and release it."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.content is None:
+                return None
+            content, job.content, job.downloaded = job.content, None, True
+            return content
+
+    def stats(self) -> dict:
+        with self._lock:
+            statuses = [job.status for job in self._jobs.values()]
+            content_bytes = sum(len(job.content) for job in self._jobs.values() if job.content is not None)
+        return {
+            "queued": statuses.count("queued"),
+            "running": statuses.count("running"),
+            "completed": statuses.count("completed"),
+            "failed": statuses.count("failed"),
+            "max_concurrent": self.max_concurrent,
+            "max_pending": self.max_pending,
+            "submitted": self._submitted,
+            "coalesced": self._coalesced,
+            "rejected": self._rejected,
+            "in_memory_bytes": content_bytes,
+            "expired": self._expired,
+        }
+
+    def shutdown(self) -> None:
+        """Cancel queued renders and release the thread pool (a later submit starts a new one)."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+report_job_manager = ReportJobManager(generator=report_generator, settings=settings, logger=logger, metrics=metrics)
@@ -0,0 +1,190 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Optional
+
+import numpy as np
+import cv2
+
+from logger import logger, Logger
+from settings import Settings, settings
+
+
+@dataclass
+class CachedDetection:
+    """
+    A cached /detect result: detections, summary counts and the encoded annotated image (None for detections-only requests).
+    `image_size` is the (width, height) of the image the bboxes refer to.
+    """
+    detections: list[dict]
+    violations: int
+    compliances: int
+    annotated_image: Optional[bytes]
+    model_version: Optional[str] = None
+    perceptual_hash: Optional[int] = None
+    image_size: Optional[tuple[int, int]] = None
+    created_at: float = field(default_factory=time.monotonic)
+
+    @property
+    def size_bytes(self) -> int:
+        """Approximate memory footprint used for the LRU budget."""
+        return len(self.annotated_image or b"") + 128 * len(self.detections) + 256
+
+
+class ResultCache:
+    """
+    Result cache for repeated images keyed by a content hash of the uploaded bytes plus the model
+    signature (model version, confidence and IoU thresholds).
+    Bounded by memory footprint (LRU eviction) and a TTL. In "perceptual" mode near-duplicate
+    frames of the same dimensions are also matched by the hamming distance of their difference hash (dHash).
+    Lookups that need the annotated image skip detections-only entries (they count as misses).
+    """
+    def __init__(self, settings: Settings, logger: Logger):
+        self.settings = settings
+        self.logger = logger
+        self.enabled = self.settings.RESULT_CACHE_ENABLED
+        self.max_bytes = self.settings.RESULT_CACHE_MAX_BYTES
+        self.ttl = self.settings.RESULT_CACHE_TTL_SECONDS
+        self.perceptual = self.settings.RESULT_CACHE_MODE == "perceptual"
+        self.max_hash_distance = self.settings.RESULT_CACHE_PHASH_MAX_DISTANCE
+
+        self._entries: OrderedDict[str, CachedDetection] = OrderedDict()
+        self._size_bytes = 0
+        self._lock = threading.Lock()
+
+        self._hits = 0
+        self._perceptual_hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+
+    @staticmethod
+    def content_key(content: bytes, model_signature: str) -> str:
+        return f"{hashlib.sha256(content).hexdigest()}:{model_signature}"
+
+    @staticmethod
+    def perceptual_hash(image: np.ndarray) -> int:
+        """64-bit difference hash: robust to re-encoding and sensor noise of otherwise identical frames."""
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+        small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+        bits = (small[:, 1:] > small[:, :-1]).flatten()
+        return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+    def _is_expired(self, entry: CachedDetection) -> bool:
+        return time.monotonic() - entry.created_at > self.ttl
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        self._size_bytes -= entry.size_bytes
+
+    @staticmethod
+    def _image_size(image: np.ndarray) -> tuple[int, int]:
+        height, width = image.shape[:2]
+        return width, height
+
+    def get(self, content: bytes, model_signature: str, annotated: bool = False) -> Optional[CachedDetection]:
+        """
+        Exact lookup by the hash of the uploaded bytes (no decoding needed).
+        With `annotated` only entries holding the annotated image are returned.
+        """
+        if not self.enabled:
+            return None
+        key = self.content_key(content, model_signature)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._is_expired(entry):
+                self._remove(key)
+                self._expirations += 1
+                entry = None
+            if entry is not None and annotated and entry.annotated_image is None:
+                entry = None  # a detections-only entry cannot answer this request
+            if entry is None:
+                # a perceptual lookup may still turn this into a hit
+                if not self.perceptual:
+                    self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return entry
+
+    def image_hash(self, image: np.ndarray) -> Optional[int]:
+        """The perceptual hash of `image` when this cache matches near-duplicates, else None."""
+        return self.perceptual_hash(image) if self.enabled and self.perceptual else None
+
+    def get_similar(self, image: np.ndarray, model_signature: str, image_hash: Optional[int] = None,
+                    image_size: Optional[tuple[int, int]] = None, annotated: bool = False) -> Optional[CachedDetection]:
+        """
+        Near-duplicate lookup by perceptual hash (only in perceptual mode), `image_hash` if already computed.
+        The dHash ignores the scale, so only entries of the same `image_size` (the size of `image` by default) match,
+        the cached bboxes would be in the coordinates of another resolution. With `annotated` only entries
+        holding the annotated image are returned.
+        """
+        if not self.enabled or not self.perceptual:
+            return None
+        image_hash = image_hash if image_hash is not None else self.perceptual_hash(image)
+        image_size = image_size or self._image_size(image)
+        with self._lock:
+            for key, entry in reversed(self._entries.items()):
+                if not key.endswith(f":{model_signature}") or self._is_expired(entry):
+                    continue
+                if entry.perceptual_hash is None or entry.image_size != image_size or (annotated and entry.annotated_image is None):
+                    continue
+                if (entry.perceptual_hash ^ image_hash).bit_count() <= self.max_hash_distance:
+                    self._entries.move_to_end(key)
+                    self._hits += 1
+                    self._perceptual_hits += 1
+                    return entry
+            self._misses += 1
+            return None
+
+    def put(self, content: bytes, model_signature: str, entry: CachedDetection, image: Optional[np.ndarray] = None,
+            image_hash: Optional[int] = None) -> None:
+        """
+        Store a result and evict least recently used entries until the memory budget fits.
+        In perceptual mode the entry is matched by `image_hash`, or the hash of `image` when it is not given,
+        among images of its `image_size` (the size of `image` when it is not set).
+        """
+        if not self.enabled or entry.size_bytes > self.max_bytes:
+            return
+        if entry.image_size is None and image is not None:
+            entry.image_size = self._image_size(image)
+        if self.perceptual and image_hash is not None:
+            entry.perceptual_hash = image_hash
+        elif self.perceptual and image is not None:
+            entry.perceptual_hash = self.perceptual_hash(image)
+        key = self.content_key(content, model_signature)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self._size_bytes += entry.size_bytes
+            while self._size_bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self._evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._size_bytes = 0
+
+    def stats(self) -> dict:
+        """Hit-rate counters and memory usage for monitoring."""
+        lookups = self._hits + self._misses
+        return {
+            "enabled": self.enabled,
+            "mode": self.settings.RESULT_CACHE_MODE,
+            "entries": len(self._entries),
+            "size_bytes": self._size_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self._hits,
+            "perceptual_hits": self._perceptual_hits,
+            "misses": self._misses,
+            "evictions": self._evictions,
+            "expirations": self._expirations,
+            "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+result_cache = ResultCache(settings=settings, logger=logger)
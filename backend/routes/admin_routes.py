@@ -0,0 +1,59 @@
+import secrets
+from dataclasses import asdict
+from typing import Optional
+
+from fastapi import APIRouter, Header, HTTPException, status
+
+from inference_scheduler import inference_scheduler
+from model_registry import model_registry
+from schemas.admin_schemas import ModelRegistrySchema, ModelReloadSchema, ModelVersionSchema
+from settings import settings
+
+admin_router = APIRouter(prefix="/admin", tags=["Admin endpoints"])
+
+
+def _check_token(token: Optional[str]) -> None:
+    """The admin API is only enabled with an ADMIN_API_TOKEN and every call must send it as X-Admin-Token."""
+    if not settings.ADMIN_API_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Admin API is disabled")
+    if token is None or not secrets.compare_digest(token, settings.ADMIN_API_TOKEN):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid admin token")
+
+
+async def _reload(version: Optional[str]) -> ModelReloadSchema:
+    try:
+        signature = await inference_scheduler.reload_model(version)
+    except KeyError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e).strip("'\""))
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                            detail=f"Model reload failed, the previous model keeps serving: {e}")
+    return ModelReloadSchema(active_version=model_registry.active_version(), serving_signature=signature)
+
+
+@admin_router.get("/models",
+                  response_model=ModelRegistrySchema,
+                  summary="List the registered model versions")
+async def list_models(x_admin_token: Optional[str] = Header(None)):
+    _check_token(x_admin_token)
+    return ModelRegistrySchema(versions=[ModelVersionSchema(**asdict(model)) for model in model_registry.models()],
+                               active_version=model_registry.active_version(),
+                               serving_signature=inference_scheduler.model_signature)
+
+
+@admin_router.post("/models/{version}/activate",
+                   response_model=ModelReloadSchema,
+                   summary="Hot-swap the serving model to a registered version",
+                   description="The new version is loaded and warmed up next to the serving model. Requests keep being served "
+                               "by the old model until the switch, requests already running finish on it.")
+async def activate_model(version: str, x_admin_token: Optional[str] = Header(None)):
+    _check_token(x_admin_token)
+    return await _reload(version)
+
+
+@admin_router.post("/models/reload",
+                   response_model=ModelReloadSchema,
+                   summary="Reload the active registry version (e.g. after its weights were replaced)")
+async def reload_model(x_admin_token: Optional[str] = Header(None)):
+    _check_token(x_admin_token)
+    return await _reload(None)
@@ -1,78 +1,331 @@
 from uuid import uuid4
+from pathlib import Path
+import asyncio
+import json
 import os
-import base64
+import shutil
+import tempfile
+from typing import Literal, Optional
 
-from fastapi import APIRouter, UploadFile, File, HTTPException, status
-import aiofiles
+from fastapi import APIRouter, UploadFile, File, Header, HTTPException, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import Response, StreamingResponse
 
-from schemas.detect_schemas import ImageUploadSchema, DetectionResponseSchema, DetectionSummarySchema
-from inference import inference_manager
+from schemas.detect_schemas import (ImageUploadSchema, VideoUploadSchema, DetectionResponseSchema, DetectionSummarySchema, 
+                                    BatchDetectionResponseSchema, InferenceQueueStatsSchema, ResultCacheStatsSchema)
+from inference import detections_to_columns
+from inference_scheduler import inference_scheduler, InferenceQueueFullError
+from model_loader import ModelNotReadyError
+from image_service import ImageHeader, UploadTooLargeError, image_service
+from metrics import metrics
+from result_cache import result_cache
+from detection_service import detection_service, UploadedImage
+from video_stream import video_detection_service
 from settings import settings
 
 detect_router = APIRouter(tags=["PPE Detection endpoints"])
 
 
-# TODO: create an ImageService class to handle image processing logic
+# Listed media types that select a /detect response format. text/html (browser form posts and
+# navigations) gets the JSON, wildcards never select a format on their own
+_RESPONSE_FORMATS = {"application/json": "json", "text/html": "json",
+                     "multipart/form-data": "multipart/form-data", "multipart/mixed": "multipart/mixed"}
+
+
+def _negotiate(accept: Optional[str]) -> str:
+    """
+    Response format of /detect from the Accept header: json, multipart/form-data, multipart/mixed or image
+    (the configured annotated image type). The supported type with the highest q-value wins, JSON on ties
+    and when only wildcards or unsupported types are listed.
+    """
+    best_format, best_quality = "json", 0.0
+    for media_range in (accept or "").split(","):
+        media_type, *parameters = (part.strip().lower() for part in media_range.split(";"))
+        response_format = "image" if media_type == image_service.annotated_media_type else _RESPONSE_FORMATS.get(media_type)
+        if response_format is None:
+            continue
+        quality = 1.0
+        for parameter in parameters:
+            name, _, value = parameter.partition("=")
+            if name.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if quality > best_quality or (quality == best_quality and quality > 0 and response_format == "json"):
+            best_format, best_quality = response_format, quality
+    return best_format
+
+
+def _multipart(media_type: str, detections: DetectionResponseSchema, image: Optional[bytes]) -> Response:
+    """The JSON detections and the raw annotated image as two parts of one multipart body (no base64)."""
+    boundary = uuid4().hex
+    parts = [(b'form-data; name="detections"', b"application/json", detections.model_dump_json(by_alias=True).encode())]
+    if image is not None:
+        filename = f"{Path(detections.image_id).stem}_annotated{image_service.annotated_extension}"
+        parts.append((f'form-data; name="annotated_image"; filename="{filename}"'.encode(),
+                      image_service.annotated_media_type.encode(), image))
+    body = b"".join(b"--" + boundary.encode() + b"\r\nContent-Disposition: " + disposition + 
+                    b"\r\nContent-Type: " + content_type + b"\r\n\r\n" + content + b"\r\n"
+                    for disposition, content_type, content in parts)
+    return Response(content=body + b"--" + boundary.encode() + b"--\r\n",
+                    status_code=status.HTTP_201_CREATED,
+                    media_type=f"{media_type}; boundary={boundary}")
+
+
+async def _read_image_upload(file: UploadFile) -> tuple[bytes, ImageHeader]:
+    """
+    Read and validate an image upload before it is decoded. The body was already capped by RequestBodyLimitMiddleware
+    while starlette spooled it, so it is read at once (at most one byte over the limit) and the byte count actually
+    read, the magic bytes and the declared dimensions are checked.
+    """
+    max_bytes = settings.MAX_IMAGE_UPLOAD_BYTES
+    if file.size is not None and file.size > max_bytes:
+        raise UploadTooLargeError(f"Image file is too large: max size is {max_bytes} bytes")
+    with metrics.time("upload_read"):
+        content = await file.read(max_bytes + 1)
+    if len(content) > max_bytes:
+        raise UploadTooLargeError(f"Image file is too large: max size is {max_bytes} bytes")
+    with metrics.time("validation"):
+        if not content:
+            raise ValueError("Uploaded image is truncated or empty.")
+        ImageUploadSchema(filename=file.filename, content_type=file.content_type, size=len(content))
+        header = image_service.check_content(content, file.content_type)
+    return content, header
+
+
 # TODO: create a custom exceptions for clearbetter error handling
-# TODO: Performance can be suff. icreased using mulytiprocessing or Background Tasks
 @detect_router.post("/detect",
                     status_code=status.HTTP_201_CREATED,
                     response_model=DetectionResponseSchema,
                     summary="Detect Personal Protective Equipment (PPE) in an uploaded image",
-                    description="This endpoint accepts an image file upload and performs PPE detection on the image. Supported image formats are JPEG, PNG  with a maximum size of 2 MB.")
-async def detect_ppe(file: UploadFile = File(...)):
-    file_path = None
-    annotated_image_path = None
+                    description="This endpoint accepts an image file upload and performs PPE detection on the image. Supported image formats are JPEG, PNG  with a maximum size of 2 MB. "
+                                "With detections_format=columns the detections are returned as compact parallel arrays. "
+                                "The response format follows the Accept header: JSON with a base64 annotated image (default), "
+                                "multipart/form-data or multipart/mixed with the JSON detections and the raw annotated image as separate parts, "
+                                "or image/* for the raw annotated image alone (summary in X-* headers). "
+                                "With annotate=false only the detections are computed, no annotated image is drawn or encoded.")
+async def detect_ppe(file: UploadFile = File(...), 
+                     detections_format: Literal["objects", "columns"] = "objects",
+                     annotate: bool = True,
+                     accept: Optional[str] = Header(None)):
+    response_format = _negotiate(accept)
+    if response_format == "image" and not annotate:
+        raise HTTPException(status_code=status.HTTP_406_NOT_ACCEPTABLE,
+                            detail="An image response needs the annotated image, drop annotate=false or accept JSON.")
     try:
         
-        content = await file.read()
-        
-        #validating the image file
-        ImageUploadSchema(
-            filename=file.filename,
-            content_type=file.content_type,
-            size=len(content)
-        )
+        # validating the image file while it is read (size, magic bytes and dimensions)
+        content, _ = await _read_image_upload(file)
         
         unique_filename = f"{uuid4()}_{file.filename}"
-        file_path = os.path.join(settings.IMAGE_UPLOAD_DIR, unique_filename)
-        
-        # Ensure the upload directory exists
-        os.makedirs(settings.IMAGE_UPLOAD_DIR, exist_ok=True)
-        
-        async with aiofiles.open(file_path, 'wb') as out_file:
-            await out_file.write(content)
         
-        annotated_image_path = inference_manager.annotate_image_and_save(image_path=file_path)
-        detections, violations, complaints = inference_manager.get_detections(image_path=file_path)
+        stored, cache_status = await detection_service.detect(content, image_id=unique_filename, annotate=annotate)
+        annotated_image = stored.annotated_image if annotate else None
         
-        # Reading an annotated image and encoding it to base64
-        async with aiofiles.open(annotated_image_path, 'rb') as annotated_file:
-            annotated_content = await annotated_file.read()
+        if response_format == "image":
+            return Response(content=annotated_image,
+                            status_code=status.HTTP_201_CREATED,
+                            media_type=image_service.annotated_media_type,
+                            headers={"X-Image-Id": unique_filename,
+                                     "X-Helmet-Count": str(stored.compliances),
+                                     "X-No-Helmet-Count": str(stored.violations),
+                                     "X-Cache": cache_status,
+                                     "X-Model-Version": stored.model_version or ""})
         
-        encoded_image = base64.b64encode(annotated_content).decode('utf-8')
-        
-        # Clean up the uploaded file after processing
-        os.remove(file_path)
-        os.remove(annotated_image_path)
-        
-        return DetectionResponseSchema(
+        annotated_image_base64 = None
+        if annotated_image is not None and response_format == "json":
+            annotated_image_base64 = await asyncio.to_thread(detection_service.to_base64, annotated_image)
+
+        columns = detections_format == "columns"
+        response = DetectionResponseSchema(
             image_id=unique_filename,
-            detections=detections,
+            timestamp=stored.timestamp,
+            detections=None if columns else stored.detections,
+            detection_columns=detections_to_columns(stored.detections) if columns else None,
             summary=DetectionSummarySchema(
-                helmet_count=complaints,
-                no_helmet_count=violations
+                helmet_count=stored.compliances,
+                no_helmet_count=stored.violations
             ),
-            annotated_image=f"{encoded_image}"
+            annotated_image=annotated_image_base64,
+            cache=cache_status,
+            model_version=stored.model_version
         )
+        if response_format != "json":
+            return _multipart(response_format, response, annotated_image)
+        return response
         
+    except (InferenceQueueFullError, ModelNotReadyError) as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, 
+                            detail=str(e),
+                            headers={"Retry-After": str(settings.INFERENCE_RETRY_AFTER_SECONDS)})
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=status.HTTP_413_CONTENT_TOO_LARGE, detail=str(e))
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred while processing the file: {str(e)}")
+
+
+
+async def _collect_batch_images(files: list[UploadFile]) -> list[UploadedImage]:
+    """Flatten the uploaded files and zip archives into a list of images."""
+    images = []
+    for file in files:
+        if detection_service.is_archive(file.filename, file.content_type):
+            if file.size is not None and file.size > settings.BATCH_DETECT_MAX_ARCHIVE_MB * 1024 * 1024:
+                raise ValueError(f"Archive {file.filename} is too large: max size is {settings.BATCH_DETECT_MAX_ARCHIVE_MB} MB")
+            archive = await file.read()
+            images.extend(await asyncio.to_thread(detection_service.extract_archive, archive,
+                                                  max(0, settings.BATCH_DETECT_MAX_IMAGES - len(images))))
+        elif file.size is not None and file.size > settings.MAX_IMAGE_UPLOAD_BYTES:
+            # oversized files are reported by the per-image validation without being read
+            images.append(UploadedImage(filename=file.filename, content_type=file.content_type, content=b"", size=file.size))
+        else:
+            with metrics.time("upload_read"):
+                content = await file.read()
+            images.append(UploadedImage(filename=file.filename, content_type=file.content_type, 
+                                        content=content, size=len(content)))
+    if not images:
+        raise ValueError("No images found in the request.")
+    if len(images) > settings.BATCH_DETECT_MAX_IMAGES:
+        raise ValueError(f"Too many images in one batch: {len(images)} (max {settings.BATCH_DETECT_MAX_IMAGES})")
+    return images
+
+
+@detect_router.post("/detect/batch",
+                    status_code=status.HTTP_201_CREATED,
+                    response_model=BatchDetectionResponseSchema,
+                    summary="Detect PPE in many images with one request",
+                    description="Accepts many image files and/or zip archives of images. Images run through the model in tensor batches; "
+                                "the response holds per-image results and an aggregate violation/compliance summary. "
+                                "With stream=true the results are streamed as NDJSON records as soon as they are ready, "
+                                "followed by a summary record. With detections_format=columns the detections of every image "
+                                "are returned as compact parallel arrays.")
+async def detect_ppe_batch(files: list[UploadFile] = File(...), 
+                           stream: bool = False, 
+                           include_annotated_images: bool = False,
+                           detections_format: Literal["objects", "columns"] = "objects"):
+    try:
+        images = await _collect_batch_images(files)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    batch_id = uuid4().hex
+    records = detection_service.detect_many(images, batch_id=batch_id, include_annotated_images=include_annotated_images,
+                                            columns=detections_format == "columns")
+    
+    if stream:
+        async def ndjson_stream():
+            results = []
+            async for record in records:
+                results.append(record)
+                yield json.dumps({"type": "image", "batch_id": batch_id, **record}) + "\n"
+            yield json.dumps({"type": "summary", "batch_id": batch_id, **detection_service.aggregate(results)}) + "\n"
+        return StreamingResponse(ndjson_stream(), media_type="application/x-ndjson")
+    
+    results = [record async for record in records]
+    return BatchDetectionResponseSchema(
+        batch_id=batch_id,
+        results=results,
+        summary=detection_service.aggregate(results)
+    )
+
+
+def _save_video_to_temp_file(file: UploadFile) -> str:
+    """OpenCV can only demux videos from a path, so the upload is spooled to a temporary file."""
+    with tempfile.NamedTemporaryFile(delete=False, suffix=Path(file.filename).suffix) as temp_file:
+        shutil.copyfileobj(file.file, temp_file, length=1024 * 1024)
+        return temp_file.name
+
+
+@detect_router.post("/detect/video",
+                    summary="Detect PPE in an uploaded video file",
+                    description="Decodes the video frame by frame, runs PPE detection on every VIDEO_FRAME_STRIDE-th frame "
+                                "(more frames are skipped adaptively when inference is slower than the video) and streams "
+                                "per-frame detections and summary deltas back as NDJSON, followed by a summary record.",
+                    response_class=StreamingResponse)
+async def detect_ppe_video(file: UploadFile = File(...)):
+    try:
+        VideoUploadSchema(
+            filename=file.filename,
+            content_type=file.content_type,
+            size=file.size
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    video_path = await asyncio.to_thread(_save_video_to_temp_file, file)
+    records = video_detection_service.frame_results(Path(video_path))
+    try:
+        # Reading the first record up front, so an unreadable video is still reported as HTTP 400
+        first_record = await anext(records)
+    except ValueError as e:
+        os.remove(video_path)
+        raise HTTPException(status_code=400, detail=str(e))
+    except ModelNotReadyError as e:
+        os.remove(video_path)
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            detail=str(e),
+                            headers={"Retry-After": str(settings.INFERENCE_RETRY_AFTER_SECONDS)})
+    
+    async def ndjson_stream():
+        try:
+            yield json.dumps(first_record) + "\n"
+            async for record in records:
+                yield json.dumps(record) + "\n"
+        finally:
+            await records.aclose()
+            os.remove(video_path)
+    
+    return StreamingResponse(ndjson_stream(), media_type="application/x-ndjson")
+
+
+@detect_router.websocket("/detect/stream")
+async def detect_ppe_stream(websocket: WebSocket):
+    """
+    Live stream detection: the client sends encoded frames (JPEG/PNG) as binary messages and gets 
+    one JSON message with detections and summary deltas back per processed frame.
+    At most VIDEO_STREAM_MAX_PENDING_FRAMES frames are buffered, a client sending faster than that
+    is slowed down (frames are no longer read from the socket) instead of growing the buffer.
+    Frames are validated like image uploads (size, format, declared dimensions) before they are decoded,
+    a bad frame gets an error message and the stream goes on.
+    """
+    await websocket.accept()
+    frames: asyncio.Queue = asyncio.Queue(maxsize=max(1, settings.VIDEO_STREAM_MAX_PENDING_FRAMES))
+    
+    async def receive_frames():
+        frame_index = 0
+        try:
+            while True:
+                await frames.put((frame_index, await websocket.receive_bytes()))
+                frame_index += 1
+        except (WebSocketDisconnect, RuntimeError, KeyError):
+            pass
+        finally:
+            await frames.put(None)
+    
+    receiver = asyncio.create_task(receive_frames())
+    try:
+        async for record in video_detection_service.live_results(frames):
+            await websocket.send_json(record)
+    except WebSocketDisconnect:
+        pass
     finally:
-        # Clean up files in case of exceptions
-        if file_path and os.path.exists(file_path):
-            os.remove(file_path)
-        if annotated_image_path and os.path.exists(annotated_image_path):
-            os.remove(annotated_image_path)
\ No newline at end of file
+        receiver.cancel()
+
+
+@detect_router.get("/detect/stats",
+                   response_model=InferenceQueueStatsSchema,
+                   summary="Inference queue statistics",
+                   description="Returns the current inference queue depth, wait times and rejection counters for monitoring.")
+async def get_inference_stats():
+    return InferenceQueueStatsSchema(**inference_scheduler.stats())
+
+
+
+@detect_router.get("/detect/cache/stats",
+                   response_model=ResultCacheStatsSchema,
+                   summary="Result cache statistics",
+                   description="Returns the result cache size and hit-rate counters for monitoring.")
+async def get_result_cache_stats():
+    return ResultCacheStatsSchema(**result_cache.stats())
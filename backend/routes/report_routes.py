@@ -1,33 +1,160 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, status
 
-from schemas.report_shcemas import DetectionRequestSchema
+import hashlib
+
+from fastapi import APIRouter, UploadFile, File, HTTPException, Request, Response, status
+
+from detection_store import detection_store
+from report_jobs import ReportJob, ReportQueueFullError, report_job_manager
+from schemas.detect_schemas import DetectionSchema, DetectionSummarySchema
+from schemas.report_shcemas import AggregatedReportRequestSchema, DetectionRequestSchema
 from pdf_report_generator import report_generator
-from schemas.report_shcemas import ReportResponseSchema
+from schemas.report_shcemas import ReportJobSchema, ReportJobStatsSchema, StorageStatsSchema
+from settings import settings
+from storage_manager import storage_manager
 
 
 report_router = APIRouter(tags=["PDF Report endpoints"])
 
 
-# TODO: Create a Service to generate PDF report using PDFReportGenerator
-# TODO: Performance can be suff. icreased using mulytiprocessing or Background Tasks
-@report_router.post("/report",
-                     summary="Generate PDF report from detections and annotated image",
-                     response_description="PDF report generation status",
-                     status_code=status.HTTP_201_CREATED,
-                     response_model=ReportResponseSchema)
-async def generate_the_report(data: DetectionRequestSchema):  
+def _report_arguments(data: DetectionRequestSchema) -> dict:
+    """Report inputs from the request payload, or from the stored detection when only an image_id is sent."""
+    if data.is_complete:
+        return dict(image_id=data.image_id,
+                    timestamp=data.timestamp,
+                    summary=data.summary,
+                    detections=data.detections,
+                    annotated_image_base64=data.annotated_image)
+
+    stored = detection_store.get(data.image_id)
+    if stored is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                            detail=f"No stored detection for image_id {data.image_id}, it may have expired. "
+                                   "Run /detect again or send the full detection payload.")
+    return dict(image_id=stored.image_id,
+                timestamp=stored.timestamp,
+                summary=DetectionSummarySchema(helmet_count=stored.compliances, no_helmet_count=stored.violations),
+                detections=[DetectionSchema(**detection) for detection in stored.detections],
+                annotated_image_base64=None,
+                annotated_image_bytes=stored.annotated_image)
+
+
+def _aggregated_frames(data: AggregatedReportRequestSchema) -> list:
+    """Stored detections of the requested batch or image_ids."""
+    if data.batch_id is not None:
+        frames = list(detection_store.batch(data.batch_id))
+        if not frames:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                                detail=f"No stored detections for batch_id {data.batch_id}, it may have expired.")
+    else:
+        frames = [detection_store.get(image_id) for image_id in data.image_ids]
+        missing = [image_id for image_id, frame in zip(data.image_ids, frames, strict=True) if frame is None]
+        if missing:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                                detail=f"No stored detections for image_ids: {', '.join(missing[:20])}")
+    if len(frames) > settings.REPORT_MAX_FRAMES:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"Too many frames for one report: max is {settings.REPORT_MAX_FRAMES}")
+    return frames
+
+
+def _submit_job(key: str, render) -> tuple[ReportJob, bool]:
     try:
-        pdf_path = report_generator.generate_report(
-            image_id=data.image_id,
-            timestamp=data.timestamp,
-            summary=data.summary,
-            detections=data.detections,
-            annotated_image_base64=data.annotated_image
-        )
-        return ReportResponseSchema(
-            status="PDF report generated successfully",
-            report_url=str(pdf_path)
-        )
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error generating PDF report: {e}")
-        
\ No newline at end of file
+        # rendering happens on the report thread pool, the request returns right away
+        return report_job_manager.submit(key=key, render=render)
+    except ReportQueueFullError as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            detail=str(e),
+                            headers={"Retry-After": str(settings.REPORT_RETRY_AFTER_SECONDS)})
+
+
+def _job_response(request: Request, job: ReportJob, coalesced: bool = False) -> ReportJobSchema:
+    report_url = job.report_url
+    if job.content is not None:
+        report_url = str(request.url_for("download_report", job_id=job.job_id))
+    return ReportJobSchema(job_id=job.job_id,
+                           status=job.status,
+                           progress=job.progress,
+                           status_url=str(request.url_for("get_report_job", job_id=job.job_id)),
+                           report_url=report_url,
+                           error=job.error,
+                           coalesced=coalesced,
+                           created_at=job.created_at,
+                           finished_at=job.finished_at)
+
+
+@report_router.post("/report",
+                     summary="Start a background PDF report job for a stored detection (image_id) or a full detection payload",
+                     response_description="The created (or coalesced) report job",
+                     status_code=status.HTTP_202_ACCEPTED,
+                     response_model=ReportJobSchema)
+async def generate_the_report(data: DetectionRequestSchema, request: Request, response: Response):  
+    report_arguments = _report_arguments(data)
+    job, coalesced = _submit_job(
+        key=data.image_id,
+        render=lambda progress: report_generator.generate_report(**report_arguments, progress=progress)
+    )
+    job_response = _job_response(request, job, coalesced=coalesced)
+    response.headers["Location"] = job_response.status_url
+    return job_response
+
+
+@report_router.post("/report/aggregate",
+                     summary="Start a background job for one report over many stored detections (image_ids or a batch)",
+                     response_description="The created (or coalesced) report job",
+                     status_code=status.HTTP_202_ACCEPTED,
+                     response_model=ReportJobSchema)
+async def generate_aggregated_report(data: AggregatedReportRequestSchema, request: Request, response: Response):
+    frames = _aggregated_frames(data)
+    if data.batch_id is not None:
+        key = f"batch:{data.batch_id}:{data.title}"
+    else:
+        key = f"images:{hashlib.sha256(chr(0).join(data.image_ids).encode()).hexdigest()}:{data.title}"
+    job, coalesced = _submit_job(
+        key=key,
+        render=lambda progress: report_generator.generate_aggregated_report(frames, title=data.title, progress=progress)
+    )
+    job_response = _job_response(request, job, coalesced=coalesced)
+    response.headers["Location"] = job_response.status_url
+    return job_response
+
+
+@report_router.get("/report/stats",
+                    summary="Report job queue statistics",
+                    response_model=ReportJobStatsSchema)
+async def get_report_job_stats():
+    return ReportJobStatsSchema(**report_job_manager.stats())
+
+
+@report_router.get("/report/storage/stats",
+                    summary="Bytes on disk and evicted files of the report / inference result storage",
+                    response_model=StorageStatsSchema)
+async def get_storage_stats():
+    return StorageStatsSchema(**storage_manager.stats())
+
+
+@report_router.get("/report/{job_id}",
+                    summary="Status, progress and (once completed) the URL of a report job",
+                    response_model=ReportJobSchema)
+async def get_report_job(job_id: str, request: Request):
+    job = report_job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Report job {job_id} not found")
+    return _job_response(request, job)
+
+
+@report_router.get("/report/{job_id}/download",
+                    summary="One-shot download of a report rendered in memory (REPORT_IN_MEMORY_DOWNLOADS)",
+                    response_class=Response,
+                    responses={200: {"content": {"application/pdf": {}}}})
+async def download_report(job_id: str):
+    content = report_job_manager.take_content(job_id)
+    if content is None:
+        job = report_job_manager.get(job_id)
+        if job is not None and job.downloaded:
+            raise HTTPException(status_code=status.HTTP_410_GONE, detail=f"Report of job {job_id} was already downloaded")
+        if job is not None and job.expired:
+            raise HTTPException(status_code=status.HTTP_410_GONE, detail=f"Report of job {job_id} expired before it was downloaded")
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"No in-memory report for job {job_id}")
+    return Response(content=content,
+                    media_type="application/pdf",
+                    headers={"Content-Disposition": f'attachment; filename="report_{job_id}.pdf"'})
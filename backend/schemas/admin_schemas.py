@@ -0,0 +1,25 @@
+from typing import Optional
+
+from pydantic import BaseModel, Field
+
+
+class ModelVersionSchema(BaseModel):
+    version: str = Field(..., description="Registry version of the model")
+    weights_file: str = Field(..., description="Weights file inside the version directory")
+    sha256: str = Field(..., description="SHA-256 of the weights")
+    created_at: str = Field(..., description="When the version was registered")
+    source: Optional[str] = Field(None, description="Path the weights were registered from")
+    classes: Optional[dict[int, str]] = Field(None, description="Class names of the model")
+    image_size: Optional[int] = Field(None, description="Image size the model was trained with")
+    metrics: dict[str, float] = Field(default_factory=dict, description="Validation metrics of the training run")
+
+
+class ModelRegistrySchema(BaseModel):
+    versions: list[ModelVersionSchema] = Field(..., description="Registered model versions")
+    active_version: Optional[str] = Field(None, description="Version the registry points at")
+    serving_signature: str = Field(..., description="Result signature of the model serving requests")
+
+
+class ModelReloadSchema(BaseModel):
+    active_version: Optional[str] = Field(None, description="Version now active in the registry")
+    serving_signature: str = Field(..., description="Result signature of the model now serving requests")
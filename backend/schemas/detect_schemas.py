@@ -4,11 +4,13 @@ from typing import Optional, List, Literal
 from pydantic import BaseModel, ConfigDict, EmailStr, PositiveInt, field_validator
 from pydantic.fields import Field
 
+from settings import settings
+
 
 class ImageUploadSchema(BaseModel):
     filename: str = Field(..., description="The name of the uploaded image file")
     content_type: str = Field(..., description="The MIME type of the uploaded image file")
-    size: PositiveInt = Field(..., gt=0, le=2*1024*1024, description="The size of the uploaded image file in bytes (max 2MB)")
+    size: PositiveInt = Field(..., gt=0, le=settings.MAX_IMAGE_UPLOAD_BYTES, description="The size of the uploaded image file in bytes (max 2MB)")
     
     @field_validator('content_type')
     @classmethod
@@ -31,12 +33,51 @@ class ImageUploadSchema(BaseModel):
     
     model_config = ConfigDict(from_attributes=True)
     
+class VideoUploadSchema(BaseModel):
+    filename: str = Field(..., description="The name of the uploaded video file")
+    content_type: str = Field(..., description="The MIME type of the uploaded video file")
+    size: PositiveInt = Field(..., description="The size of the uploaded video file in bytes")
+    
+    @field_validator('content_type')
+    @classmethod
+    def validate_content_type(cls, v) -> str:
+        """Validate that the content type is one of the allowed video types."""
+        allowed_types = ("video/mp4", "video/x-msvideo", "video/avi", "video/quicktime", "video/x-matroska", "video/webm")
+        if v not in allowed_types:
+            raise ValueError(f"Unsupported file type: {v}. Allowed types are: {', '.join(allowed_types)}")
+        return v
+    
+    @field_validator('filename')
+    @classmethod
+    def validate_filename(cls, v) -> str:
+        """Validate that the filename has a proper video extension."""
+        allowed_extensions = (".mp4", ".avi", ".mov", ".mkv", ".webm")
+        if not any(v.lower().endswith(ext) for ext in allowed_extensions):
+            raise ValueError(f"Unsupported file extension in filename: {v}. Allowed extensions are: {', '.join(allowed_extensions)}")
+        return v
+    
+    @field_validator('size')
+    @classmethod
+    def validate_size(cls, v) -> int:
+        """Validate that the video is not bigger than VIDEO_MAX_UPLOAD_MB."""
+        if v > settings.VIDEO_MAX_UPLOAD_MB * 1024 * 1024:
+            raise ValueError(f"Video file is too large: max size is {settings.VIDEO_MAX_UPLOAD_MB} MB")
+        return v
+    
+    
 class DetectionSchema(BaseModel):
     class_: str = Field(..., alias="class", description="Detected class label")
     confidence: float = Field(..., description="Confidence score of the detection")
     bbox: list[int] = Field(..., description="Bounding box coordinates [x_min, y_min, x_max, y_max]")
 
 
+class DetectionColumnsSchema(BaseModel):
+    """Compact columnar detections: the i-th entries of the arrays describe the i-th detection."""
+    classes: list[str] = Field(..., description="Detected class labels")
+    confidences: list[float] = Field(..., description="Confidence scores")
+    bboxes: list[list[int]] = Field(..., description="Bounding boxes [x_min, y_min, x_max, y_max]")
+
+
 class DetectionSummarySchema(BaseModel):
     helmet_count: int = Field(..., description="Number of helmets detected")
     no_helmet_count: int = Field(..., description="Number of persons without helmets detected")
@@ -46,7 +87,65 @@ class DetectionSummarySchema(BaseModel):
 class DetectionResponseSchema(BaseModel):
     image_id: str = Field(..., description="Unique identifier for the image")
     timestamp: datetime = Field(default_factory=datetime.now, description="Timestamp of when the detection was made")
-    detections: list[DetectionSchema] = Field(..., description="List of detections")
+    detections: Optional[list[DetectionSchema]] = Field(None, description="List of detections (omitted with detections_format=columns)")
+    detection_columns: Optional[DetectionColumnsSchema] = Field(None, description="Columnar detections (only with detections_format=columns)")
     summary: DetectionSummarySchema = Field(..., description="Summary of detections")
-    annotated_image: str 
-    
\ No newline at end of file
+    annotated_image: Optional[str] = Field(None, description="Base64 encoded annotated image (JSON responses without annotate=false)")
+    cache: Literal["hit", "miss"] = Field("miss", description="Whether the result was served from the result cache")
+    model_version: Optional[str] = Field(None, description="Version of the model that produced the detections")
+    
+    
+class BatchImageResultSchema(BaseModel):
+    filename: str = Field(..., description="Name of the image in the request or archive")
+    image_id: str = Field(..., description="Unique identifier for the image")
+    detections: Optional[list[DetectionSchema]] = Field(None, description="List of detections")
+    detection_columns: Optional[DetectionColumnsSchema] = Field(None, description="Columnar detections (only with detections_format=columns)")
+    summary: Optional[DetectionSummarySchema] = Field(None, description="Summary of detections")
+    annotated_image: Optional[str] = Field(None, description="Base64 encoded annotated image (only if requested)")
+    cache: Optional[Literal["hit", "miss"]] = Field(None, description="Whether the result was served from the result cache")
+    model_version: Optional[str] = Field(None, description="Version of the model that produced the detections")
+    error: Optional[str] = Field(None, description="Why the image could not be processed")
+    
+    
+class BatchSummarySchema(BaseModel):
+    total_images: int = Field(..., description="Number of images in the batch")
+    processed_images: int = Field(..., description="Number of successfully processed images")
+    failed_images: int = Field(..., description="Number of images that could not be processed")
+    helmet_count: int = Field(..., description="Helmets detected over the whole batch")
+    no_helmet_count: int = Field(..., description="Persons without helmets detected over the whole batch")
+    images_with_violations: int = Field(..., description="Number of images with at least one violation")
+    
+    
+class BatchDetectionResponseSchema(BaseModel):
+    batch_id: str = Field(..., description="Unique identifier for the batch")
+    timestamp: datetime = Field(default_factory=datetime.now, description="Timestamp of when the batch was processed")
+    results: list[BatchImageResultSchema] = Field(..., description="Per-image results in request order")
+    summary: BatchSummarySchema = Field(..., description="Aggregate violation/compliance summary")
+    
+
+
+class InferenceQueueStatsSchema(BaseModel):
+    queue_depth: int = Field(..., description="Number of images waiting for inference")
+    max_queue_size: int = Field(..., description="Queue capacity before requests are rejected with HTTP 503")
+    in_flight: int = Field(..., description="Number of images currently being inferred")
+    workers: int = Field(..., description="Number of inference worker threads")
+    rejected_requests: int = Field(..., description="Number of requests rejected because the queue was full")
+    processed_images: int = Field(..., description="Number of images processed so far")
+    processed_batches: int = Field(..., description="Number of batched forward passes so far")
+    avg_queue_wait_ms: float = Field(..., description="Average time an image waited in the queue (ms)")
+    max_queue_wait_ms: float = Field(..., description="Longest time an image waited in the queue (ms)")
+
+
+
+class ResultCacheStatsSchema(BaseModel):
+    enabled: bool = Field(..., description="Whether the result cache is enabled")
+    mode: str = Field(..., description="Cache lookup mode: exact or perceptual")
+    entries: int = Field(..., description="Number of cached results")
+    size_bytes: int = Field(..., description="Approximate memory used by cached results")
+    max_bytes: int = Field(..., description="Memory budget of the cache")
+    hits: int = Field(..., description="Number of cache hits")
+    perceptual_hits: int = Field(..., description="Number of hits on near-duplicate frames")
+    misses: int = Field(..., description="Number of cache misses")
+    evictions: int = Field(..., description="Number of entries evicted to stay within the memory budget")
+    expirations: int = Field(..., description="Number of entries dropped after their TTL")
+    hit_rate: float = Field(..., description="Hits divided by lookups")
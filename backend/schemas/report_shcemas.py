@@ -1,19 +1,84 @@
 from datetime import datetime
 from typing import Optional, List, Literal
 
-from pydantic import BaseModel, ConfigDict, EmailStr, PositiveInt, field_validator
+from pydantic import BaseModel, ConfigDict, EmailStr, PositiveInt, field_validator, model_validator
 from pydantic.fields import Field
 from schemas.detect_schemas import DetectionSchema, DetectionSummarySchema
 
 
 class DetectionRequestSchema(BaseModel):
+    """
+    Either just the image_id of a recent /detect result (looked up in the server-side detection store)
+    or the full detection payload including the base64 annotated image.
+    """
     image_id: str = Field(..., description="Unique identifier for the image")
-    timestamp: datetime = Field(..., description="Timestamp of the detection request")
-    summary: DetectionSummarySchema = Field(..., description="Summary of detections")   
-    detections: list[DetectionSchema] = Field(..., description="List of detections")
-    annotated_image: str = Field(..., description="Base64 encoded annotated image")
+    timestamp: Optional[datetime] = Field(None, description="Timestamp of the detection request")
+    summary: Optional[DetectionSummarySchema] = Field(None, description="Summary of detections")   
+    detections: Optional[list[DetectionSchema]] = Field(None, description="List of detections")
+    annotated_image: Optional[str] = Field(None, description="Base64 encoded annotated image")
+
+    @property
+    def is_complete(self) -> bool:
+        """Whether the payload carries everything needed for a report without the detection store."""
+        return None not in (self.timestamp, self.summary, self.detections, self.annotated_image)
     
 
 class ReportResponseSchema(BaseModel):
     status: str = Field(..., description="Status message of the PDF report generation")
-    report_url: str = Field(..., description="URL to the generated PDF report")
\ No newline at end of file
+    report_url: str = Field(..., description="URL to the generated PDF report")
+
+
+class AggregatedReportRequestSchema(BaseModel):
+    """Stored detections to aggregate into one report: an explicit list of image_ids or a whole /detect/batch."""
+    image_ids: Optional[list[str]] = Field(None, min_length=1, description="image_ids of stored detections")
+    batch_id: Optional[str] = Field(None, description="batch_id returned by /detect/batch")
+    title: str = Field("PPE Shift Report", max_length=120, description="Title printed on the report")
+
+    @model_validator(mode="after")
+    def validate_source(self):
+        """Exactly one of image_ids and batch_id has to be given."""
+        if (self.image_ids is None) == (self.batch_id is None):
+            raise ValueError("Provide either image_ids or batch_id")
+        return self
+
+
+class ReportJobSchema(BaseModel):
+    job_id: str = Field(..., description="Identifier of the background report job")
+    status: Literal["queued", "running", "completed", "failed"] = Field(..., description="Current state of the job")
+    progress: float = Field(..., ge=0, le=1, description="Rendered fraction of the report (0-1)")
+    status_url: str = Field(..., description="URL to poll for the job status")
+    report_url: Optional[str] = Field(None, description="URL to the generated PDF report once completed")
+    error: Optional[str] = Field(None, description="Error message if the job failed")
+    coalesced: bool = Field(False, description="Whether the request was merged into an existing job for the same image")
+    created_at: datetime = Field(..., description="When the job was created")
+    finished_at: Optional[datetime] = Field(None, description="When the job completed or failed")
+
+
+class ReportJobStatsSchema(BaseModel):
+    queued: int = Field(..., description="Jobs waiting for a free report worker")
+    running: int = Field(..., description="Jobs currently rendering")
+    completed: int = Field(..., description="Retained completed jobs")
+    failed: int = Field(..., description="Retained failed jobs")
+    max_concurrent: int = Field(..., description="Maximum number of reports rendered in parallel")
+    max_pending: int = Field(..., description="Maximum number of queued + running jobs")
+    submitted: int = Field(..., description="Jobs created since startup")
+    coalesced: int = Field(..., description="Requests merged into an existing job")
+    rejected: int = Field(..., description="Requests rejected because too many jobs were pending")
+    in_memory_bytes: int = Field(..., description="Bytes of in-memory reports waiting for their download")
+    expired: int = Field(..., description="In-memory reports dropped before they were downloaded")
+
+
+class StorageAreaStatsSchema(BaseModel):
+    root: str = Field(..., description="Directory of the storage area")
+    files: int = Field(..., description="Files currently stored")
+    size_bytes: int = Field(..., description="Bytes currently on disk")
+    max_bytes: int = Field(..., description="Size budget of the area")
+    max_age_seconds: float = Field(..., description="Retention age of the files")
+    evicted_files: int = Field(..., description="Files deleted by the sweeper since startup")
+    evicted_bytes: int = Field(..., description="Bytes deleted by the sweeper since startup")
+
+
+class StorageStatsSchema(BaseModel):
+    areas: dict[str, StorageAreaStatsSchema] = Field(..., description="Per storage area statistics")
+    last_sweep_at: Optional[float] = Field(None, description="Unix time of the last sweep")
+    last_sweep_seconds: Optional[float] = Field(None, description="Duration of the last sweep")
@@ -1,5 +1,6 @@
 from pathlib import Path
 from functools import lru_cache
+from typing import Literal, Optional
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -30,10 +31,40 @@ class Settings(BaseSettings):
     CORS_ALLOWED_METHODS: list[str] = ["POST", "GET", "OPTIONS"]
     CORS_ALLOWED_HEADERS: list[str] = ["*"]
     
+    # Upload limits
+    MAX_IMAGE_UPLOAD_BYTES: int = 2 * 1024 * 1024  # max size of a single uploaded image (2 MB)
+    MAX_IMAGE_PIXELS: int = 40_000_000  # images whose header declares more pixels are rejected before decoding
+    UPLOAD_MULTIPART_OVERHEAD_BYTES: int = 64 * 1024  # allowance for multipart headers/fields on top of the file size limits
+    REDUCED_JPEG_DECODE: bool = False  # decode large JPEGs at 1/2, 1/4 or 1/8 scale when that still covers MODEL_IMG_SIZE (not with TILE_INFERENCE), opt-in: the annotated image is then returned at that reduced size
+    BATCH_DETECT_MAX_IMAGES: int = 500  # max number of images in one /detect/batch request
+    BATCH_DETECT_MAX_ARCHIVE_MB: int = 200  # max size of a zip archive uploaded to /detect/batch
+    BATCH_DETECT_MAX_EXTRACTED_MB: int = 1000  # max total declared size of the images in the zip archives of one request
+    
     # Directories for storing uploads and results
     IMAGE_UPLOAD_DIR: str = "uploads"
     INFERENCE_RESULTS_DIR: str = "inference_results"
     PDF_REPORTS_DIR: str = "pdf_reports"
+    PERSIST_UPLOADS: bool = False  # keep the original uploads on disk (images are processed in memory anyway)
+    PERSIST_ANNOTATED_IMAGES: bool = False  # keep the annotated images on disk
+    
+    # Annotated images and /detect responses
+    ANNOTATED_IMAGE_FORMAT: Literal["jpeg", "webp"] = "jpeg"  # encoding of the annotated images returned by /detect
+    ANNOTATED_IMAGE_QUALITY: int = 95  # JPEG/WebP quality of the annotated images (1-100, 95 is the OpenCV default)
+    ANNOTATED_IMAGE_MAX_SIDE: int = 0  # annotated images are downscaled to this longer side (boxes drawn on the preview), 0 keeps the full size
+    ANNOTATION_LABELS: bool = True  # draw the class name and confidence above the head/helmet boxes
+    RESPONSE_COMPRESSION: bool = False  # gzip responses for clients sending Accept-Encoding: gzip (images are never recompressed)
+    RESPONSE_COMPRESSION_MIN_BYTES: int = 1024  # smaller responses are sent uncompressed
+    RESPONSE_COMPRESSION_LEVEL: int = 5  # gzip level, higher levels cost much more CPU for a few % smaller JSON
+    
+    # Retention of generated files (swept in the background, oldest files are evicted first)
+    STORAGE_SWEEP_INTERVAL_SECONDS: float = 300  # 0 disables the background sweeper
+    PDF_REPORTS_RETENTION_HOURS: float = 72
+    PDF_REPORTS_MAX_MB: int = 1024
+    INFERENCE_RESULTS_RETENTION_HOURS: float = 24
+    INFERENCE_RESULTS_MAX_MB: int = 1024
+    REPORT_IN_MEMORY_DOWNLOADS: bool = False  # keep reports in memory for a one-shot download instead of writing pdf_reports/
+    REPORT_IN_MEMORY_RETENTION_SECONDS: float = 900  # in-memory reports not downloaded within this age are dropped by the sweeper
+    REPORT_IN_MEMORY_MAX_MB: int = 256  # in-memory reports held at once, the oldest are dropped above it
     
     #YOLO Model settings
     MODEL_NAME_AND_SIZE: str = "yolo11n.pt"  # setting the minimum default model
@@ -43,12 +74,86 @@ class Settings(BaseSettings):
     NUMBER_OF_EPOCHS: int = 10  # let it be only 10 for testing purpose and saving the users GPU/CPU
     CONFIDENCE_THRESHOLD: float = 0.25  # default confidence threshold for inference
     IOU_THRESHOLD: float = 0.45  # default IoU threshold for NMS during inference
+    TRAINED_MODEL_PATH: str = "trained_models/best_ppe_model.pt"  # fine-tuned weights used for inference
+    INFERENCE_BACKEND: Literal["torch", "onnx", "openvino"] = "torch"  # onnx/openvino are much faster on CPU-only nodes
+    MODEL_AUTO_EXPORT: bool = True  # export the .pt weights to the selected backend on first load if the artifact is missing
+    MODEL_PRECISION: Literal["fp32", "int8"] = "fp32"  # int8 serves the quantized model (onnx/openvino backends only)
+    QUANTIZATION_CALIBRATION_IMAGES: int = 100  # number of valid/images used to calibrate the INT8 model
+    MODEL_PRELOAD: bool = True  # load the model in the background at startup, otherwise on the first detection request
+    MODEL_WARMUP: bool = True  # run one inference on a dummy image before the model is reported ready
+    MODEL_REGISTRY_DIR: str = "trained_models/registry"  # versioned models, ACTIVE names the served version
+    MODEL_REGISTRY_AUTO_ACTIVATE: bool = True  # activate a freshly trained model right after registering it
+    MODEL_WATCH_INTERVAL_SECONDS: float = 10  # poll the registry and hot-reload on changes (0 disables the watcher)
+    ADMIN_API_TOKEN: Optional[str] = None  # X-Admin-Token for the /admin endpoints, the admin API is disabled without it
+    
+    # Sliced inference for high-resolution cameras (small, distant heads/helmets)
+    TILE_INFERENCE: bool = False  # run large frames as overlapping tiles at the model size instead of one downscaled pass
+    TILE_SIZE: int = 640  # tile side in pixels (best matched to MODEL_IMG_SIZE)
+    TILE_OVERLAP: float = 0.2  # fraction of a tile shared with its neighbours, objects on a border appear whole in one tile
+    TILE_MIN_IMAGE_SIDE: int = 1280  # only frames with a longer side above this are sliced
+    TILE_BATCH_SIZE: int = 16  # tiles run through the model in one forward pass
+    TILE_INCLUDE_FULL_FRAME: bool = True  # also run the whole (downscaled) frame to catch large close-up objects
+    TILE_MERGE_METHOD: Literal["nms", "wbf"] = "nms"  # cross-tile merging: keep the best box or fuse overlapping boxes
+    TILE_MERGE_THRESHOLD: float = 0.6  # intersection over the smaller box above which boxes of a class are merged
+    TILE_MIN_EDGE_ENERGY: float = 2.0  # tiles with less mean edge energy (no foreground) are skipped, 0 runs every tile
+    
+    # Micro-batching of concurrent /detect requests
+    MAX_BATCH_SIZE: int = 8  # max number of images run through the model in one forward pass
+    MAX_BATCH_WAIT_MS: float = 5.0  # how long the first image of a batch waits for others to join
+    INFERENCE_WORKERS: int = 1  # threads running batches off the event loop (the forward pass itself is serialized)
+    INFERENCE_QUEUE_MAX_SIZE: int = 64  # images allowed to wait for inference before new requests get HTTP 503
+    INFERENCE_RETRY_AFTER_SECONDS: int = 1  # Retry-After header value sent with HTTP 503 when the queue is full
+    INFERENCE_WORKER_PROCESSES: int = 0  # >0 enables the multi-process worker pool (one model replica per process)
+    INFERENCE_THREADS_PER_WORKER: int = 1  # torch.set_num_threads budget of every worker process
+    
+    # Server-side store of detection results (reports can be generated from an image_id alone)
+    DETECTION_STORE_MAX_ENTRIES: int = 1000
+    DETECTION_STORE_MAX_BYTES: int = 256 * 1024 * 1024
+    DETECTION_STORE_TTL_SECONDS: float = 24 * 60 * 60
+    
+    # Background PDF report jobs
+    REPORT_MAX_CONCURRENT_JOBS: int = 2  # reports rendered in parallel on the report thread pool
+    REPORT_JOB_MAX_PENDING: int = 64  # queued + running jobs before POST /report answers 503
+    REPORT_JOB_MAX_RETAINED: int = 1000  # finished jobs kept for status polling
+    REPORT_RETRY_AFTER_SECONDS: int = 2  # Retry-After header sent with 503 when the report queue is full
+    REPORT_IMAGE_DPI: int = 100  # resolution images embedded in aggregated reports are downscaled to
+    REPORT_IMAGE_JPEG_QUALITY: int = 70  # JPEG quality of the recompressed embedded images
+    REPORT_MAX_FRAMES: int = 5000  # max number of frames in one aggregated report
+    
+    # Video / live stream detection
+    VIDEO_FRAME_STRIDE: int = 5  # run inference on every N-th frame
+    VIDEO_ADAPTIVE_SKIP: bool = True  # skip more frames when inference is slower than the source frame rate
+    VIDEO_MAX_UPLOAD_MB: int = 200  # max size of an uploaded video file
+    VIDEO_STREAM_MAX_PENDING_FRAMES: int = 8  # frames buffered per websocket stream before the client is slowed down
+    
+    # Result cache for repeated / near-duplicate frames
+    RESULT_CACHE_ENABLED: bool = True
+    RESULT_CACHE_MAX_BYTES: int = 64 * 1024 * 1024  # memory budget of cached results (LRU eviction above it)
+    RESULT_CACHE_TTL_SECONDS: float = 300.0  # cached results expire after this time
+    RESULT_CACHE_MODE: Literal["exact", "perceptual"] = "exact"  # perceptual also matches near-duplicate frames
+    RESULT_CACHE_PHASH_MAX_DISTANCE: int = 4  # max hamming distance of 64-bit dHashes treated as the same frame
+    
+    # Instrumentation
+    LOG_LEVEL: str = "INFO"  # per-inference hot path lines are DEBUG, so INFO keeps them out under load
+    LOG_FORMAT: Literal["text", "json"] = "text"  # json writes one structured record per line (request id, stage timings)
+    LOG_QUEUE: bool = True  # log through a QueueHandler, file/console I/O happens on a background listener thread
+    LOG_MAX_BYTES: int = 10 * 1024 * 1024  # the log file is rotated at this size, 0 lets it grow unbounded
+    LOG_BACKUP_COUNT: int = 5  # rotated log files kept
+    LOG_REQUEST_SAMPLE_RATE: float = 1.0  # fraction of successful requests that get an access record (0-1)
+    LOG_SLOW_REQUEST_MS: float = 1000.0  # slower requests (and 5xx) are always logged regardless of sampling
+    METRICS_ENABLED: bool = True  # per-stage latency histograms and request/pipeline counters served at /metrics
+    METRICS_LATENCY_BUCKETS: list[float] = [0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]  # histogram bucket bounds in seconds
     
     @property
     def BASE_DIR(self) -> Path:
         """Get the backend base directory."""
         return _BACKEND_DIR
     
+    @property
+    def MODEL_WEIGHTS_PATH(self) -> Path:
+        """Get the trained model weights path."""
+        return _BACKEND_DIR / self.TRAINED_MODEL_PATH
+    
     @property
     def DATASET_PATH(self) -> Path:
         """Get the dataset path."""
@@ -0,0 +1,181 @@
+import asyncio
+import hashlib
+import os
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Optional
+
+from logger import logger, Logger
+from settings import Settings, settings
+
+
+@dataclass
+class StorageArea:
+    """One managed output directory with its retention limits and counters."""
+    name: str
+    root: Path
+    max_age_seconds: float
+    max_bytes: int
+    files: int = 0
+    size_bytes: int = 0
+    evicted_files: int = 0
+    evicted_bytes: int = 0
+
+
+class StorageManager:
+    """
+    Owns the generated files on disk (PDF reports, persisted annotated images).
+    Files are spread over 256 shard directories (`<root>/<2 hex chars>/<filename>`) so no directory
+    grows huge, and a background sweeper deletes files older than the retention age and then the
+    oldest files until every area fits its size budget. Retention of data kept elsewhere (in-memory reports)
+    runs on the same sweeps through `add_sweep_hook`.
+    """
+    SHARD_CHARS = 2
+
+    def __init__(self, settings: Settings, logger: Logger):
+        self.settings = settings
+        self.logger = logger
+        self.sweep_interval = self.settings.STORAGE_SWEEP_INTERVAL_SECONDS
+        self.areas = {
+            "pdf_reports": StorageArea(name="pdf_reports",
+                                       root=Path(self.settings.PDF_REPORTS_DIR),
+                                       max_age_seconds=self.settings.PDF_REPORTS_RETENTION_HOURS * 3600,
+                                       max_bytes=self.settings.PDF_REPORTS_MAX_MB * 1024 * 1024),
+            "inference_results": StorageArea(name="inference_results",
+                                             root=self.settings.BASE_DIR / self.settings.INFERENCE_RESULTS_DIR,
+                                             max_age_seconds=self.settings.INFERENCE_RESULTS_RETENTION_HOURS * 3600,
+                                             max_bytes=self.settings.INFERENCE_RESULTS_MAX_MB * 1024 * 1024),
+        }
+        self.last_sweep_at: Optional[float] = None
+        self.last_sweep_seconds: Optional[float] = None
+        self._lock = threading.Lock()
+        self._sweeper: Optional[asyncio.Task] = None
+        self._sweep_hooks: list[Callable[[], None]] = []
+
+    def path_for(self, area: str, filename: str) -> Path:
+        """Sharded path of a new file (the shard directory is created)."""
+        shard = hashlib.md5(filename.encode()).hexdigest()[:self.SHARD_CHARS]
+        directory = self.areas[area].root / shard
+        directory.mkdir(parents=True, exist_ok=True)
+        return directory / filename
+
+    def relative_path(self, area: str, path: Path) -> str:
+        """Path of a managed file relative to its area root (used to build static URLs)."""
+        return path.relative_to(self.areas[area].root).as_posix()
+
+    def track(self, area: str, path: Path) -> None:
+        """Account a freshly written file until the next sweep recounts the area."""
+        try:
+            size = path.stat().st_size
+        except FileNotFoundError:
+            return
+        with self._lock:
+            self.areas[area].files += 1
+            self.areas[area].size_bytes += size
+
+    @staticmethod
+    def _scan(root: Path) -> list[tuple[float, int, str]]:
+        """(mtime, size, path) of every file below root."""
+        files = []
+        for directory, _, filenames in os.walk(root):
+            for filename in filenames:
+                path = os.path.join(directory, filename)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+        return files
+
+    def _evict(self, area: StorageArea, size: int, path: str) -> bool:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            return False
+        area.evicted_files += 1
+        area.evicted_bytes += size
+        return True
+
+    def sweep_area(self, area: StorageArea) -> None:
+        now = time.time()
+        files = sorted(self._scan(area.root))
+        kept = []
+        for mtime, size, path in files:
+            if now - mtime > area.max_age_seconds:
+                self._evict(area, size, path)
+            else:
+                kept.append((size, path))
+
+        # size budget: oldest files go first
+        total = sum(size for size, _ in kept)
+        evicted = 0
+        while total > area.max_bytes and evicted < len(kept):
+            size, path = kept[evicted]
+            self._evict(area, size, path)
+            total -= size
+            evicted += 1
+        with self._lock:
+            area.files = len(kept) - evicted
+            area.size_bytes = total
+
+    def add_sweep_hook(self, hook: Callable[[], None]) -> None:
+        """Run `hook` (blocking) after the areas on every sweep."""
+        self._sweep_hooks.append(hook)
+
+    def sweep(self) -> None:
+        """Apply the age and size retention to every area (blocking, run it off the event loop)."""
+        started_at = time.perf_counter()
+        for area in self.areas.values():
+            evicted_before = area.evicted_files
+            self.sweep_area(area)
+            if area.evicted_files > evicted_before:
+                self.logger.info(f"Storage sweep evicted {area.evicted_files - evicted_before} files from {area.root}")
+        for hook in self._sweep_hooks:
+            hook()
+        self.last_sweep_at = time.time()
+        self.last_sweep_seconds = time.perf_counter() - started_at
+
+    async def _sweep_forever(self) -> None:
+        while True:
+            try:
+                await asyncio.to_thread(self.sweep)
+            except Exception as e:
+                self.logger.error(f"Storage sweep failed: {e}")
+            await asyncio.sleep(self.sweep_interval)
+
+    def start(self) -> None:
+        """Start the background sweeper on the running event loop."""
+        if self._sweeper is None and self.sweep_interval > 0:
+            self._sweeper = asyncio.create_task(self._sweep_forever())
+
+    async def stop(self) -> None:
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            try:
+                await self._sweeper
+            except asyncio.CancelledError:
+                pass
+            self._sweeper = None
+
+    def stats(self) -> dict:
+        return {
+            "areas": {
+                name: {
+                    "root": str(area.root),
+                    "files": area.files,
+                    "size_bytes": area.size_bytes,
+                    "max_bytes": area.max_bytes,
+                    "max_age_seconds": area.max_age_seconds,
+                    "evicted_files": area.evicted_files,
+                    "evicted_bytes": area.evicted_bytes,
+                }
+                for name, area in self.areas.items()
+            },
+            "last_sweep_at": self.last_sweep_at,
+            "last_sweep_seconds": self.last_sweep_seconds,
+        }
+
+
+storage_manager = StorageManager(settings=settings, logger=logger)
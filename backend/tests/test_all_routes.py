@@ -1,37 +1,55 @@
 import io
 import base64
+import json
 import sys
 import os
+import zipfile
 from unittest.mock import AsyncMock, patch, MagicMock
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
+import numpy as np
 import pytest
 from fastapi import status
 from httpx import AsyncClient, ASGITransport
 import asyncio
+import time
 
 from main import app
+from pdf_report_generator import report_generator
+import inference
 import routes.detect_routes as detect_routes
+from result_cache import result_cache
+from inference import InferenceManager, InferenceResult
+from inference_scheduler import InferenceQueueFullError
 from schemas.detect_schemas import DetectionSchema
+from settings import settings
 
 # marking with package to use same event_loop() for all tests in package
 pytestmark = pytest.mark.asyncio(loop_scope="package")
 
 
+@pytest.fixture(autouse=True)
+def clear_result_cache():
+    result_cache.clear()
+    yield
+    result_cache.clear()
+
+
 @pytest.fixture(autouse=True)
 def mock_inference_manager(monkeypatch):
     # Mock inference_manager methods if used in routes
     try:
         mock = MagicMock()
-        mock.annotate_image_and_save.return_value = "/tmp/fake_annotated.png"
-        mock.get_detections.return_value = (
-            [
+        mock.detect_batch.side_effect = lambda images, annotate=None: [InferenceResult(
+            detections=[
                 {"class": "helmet", "confidence": 0.99, "bbox": [1, 2, 3, 4]},
                 {"class": "helmet", "confidence": 0.98, "bbox": [5, 6, 7, 8]},
             ],
-            1, 2
-        )
-        monkeypatch.setattr(detect_routes, "inference_manager", mock)
+            violations=1,
+            compliances=2,
+            annotated_image=np.zeros((4, 4, 3), dtype=np.uint8) if annotate is None or annotate[index] else None
+        ) for index in range(len(images))]
+        monkeypatch.setattr(detect_routes.inference_scheduler, "inference_manager", mock)
     except ImportError:
         pass
     # Patch aiofiles and os if neededs
@@ -53,6 +71,7 @@ def mock_inference_manager(monkeypatch):
         def setFont(self, *a, **kw): pass
         def drawString(self, *a, **kw): pass
         def save(self): pass
+        def __getattr__(self, name): return lambda *a, **kw: None
     monkeypatch.setattr("reportlab.pdfgen.canvas.Canvas", FakeCanvas)
 
     # Patch ImageReader to avoid processing the fake image
@@ -65,7 +84,7 @@ async def test_all_routes():
     async with AsyncClient(transport=ASGITransport(app), base_url="http://127.0.0.1") as client:
         # Prepare a fake image file
         file_content = base64.b64decode(
-            "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAQAAAC1HAwCAAAAC0lEQVR42mP8/x8AAwMCAO+X2ZkAAAAASUVORK5CYII="
+            "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAAAAAA6fptVAAAACklEQVQIHWNgAAAAAgABz8g15QAAAABJRU5ErkJggg=="
         )
         files = {"file": ("test.png", io.BytesIO(file_content), "image/png")}
         
@@ -107,6 +126,302 @@ async def test_all_routes():
         response_4 = await client.post('/api/v1/report', json={})
 
         assert response_1.status_code == status.HTTP_201_CREATED
-        assert response_2.status_code == status.HTTP_201_CREATED
+        assert response_2.status_code == status.HTTP_202_ACCEPTED
         assert response_3.status_code == status.HTTP_400_BAD_REQUEST
-        assert response_4.status_code == status.HTTP_422_UNPROCESSABLE_CONTENT
\ No newline at end of file
+        assert response_4.status_code == status.HTTP_422_UNPROCESSABLE_CONTENT
+
+
+async def test_detect_runs_model_once(monkeypatch, tmp_path):
+    import torch
+    from ultralytics.engine.results import Results
+
+    names = {0: "head", 1: "helmet"}
+    fake_model = MagicMock()
+    fake_model.names = names
+    fake_model.predict.return_value = [
+        Results(orig_img=np.zeros((32, 32, 3), dtype=np.uint8),
+                path="test.png",
+                names=names,
+                boxes=torch.tensor([[1.0, 2.0, 10.0, 12.0, 0.91, 1.0],
+                                    [3.0, 4.0, 8.0, 9.0, 0.82, 0.0]]))
+    ]
+    monkeypatch.setattr("ultralytics.YOLO", lambda *a, **kw: fake_model)
+
+    model_path = tmp_path / "model.pt"
+    model_path.touch()
+    manager = InferenceManager(model_path=str(model_path), settings=settings, logger=inference.logger)
+    monkeypatch.setattr(detect_routes.inference_scheduler, "inference_manager", manager)
+
+    async with AsyncClient(transport=ASGITransport(app), base_url="http://127.0.0.1") as client:
+        file_content = base64.b64decode(
+            "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAAAAAA6fptVAAAACklEQVQIHWNgAAAAAgABz8g15QAAAABJRU5ErkJggg=="
+        )
+        response = await client.post('/api/v1/detect', files={"file": ("test.png", io.BytesIO(file_content), "image/png")})
+
+    assert response.status_code == status.HTTP_201_CREATED
+    assert fake_model.predict.call_count == 1
+    body = response.json()
+    assert body["summary"] == {"helmet_count": 1, "no_helmet_count": 1}
+    assert [d["class"] for d in body["detections"]] == ["helmet", "head"]
+    assert body["cache"] == "miss"
+
+
+async def test_repeated_upload_is_served_from_cache():
+    async with AsyncClient(transport=ASGITransport(app), base_url="http://127.0.0.1") as client:
+        file_content = base64.b64decode(
+            "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAAAAAA6fptVAAAACklEQVQIHWNgAAAAAgABz8g15QAAAABJRU5ErkJggg=="
+        )
+        first = await client.post('/api/v1/detect', files={"file": ("test.png", io.BytesIO(file_content), "image/png")})
+        second = await client.post('/api/v1/detect', files={"file": ("retry.png", io.BytesIO(file_content), "image/png")})
+        stats_response = await client.get('/api/v1/detect/cache/stats')
+
+    assert first.json()["cache"] == "miss"
+    assert second.json()["cache"] == "hit"
+    assert second.json()["detections"] == first.json()["detections"]
+    assert second.json()["image_id"] != first.json()["image_id"]
+    assert detect_routes.inference_scheduler.inference_manager.detect_batch.call_count == 1
+    assert stats_response.json()["hits"] == 1
+
+
+async def test_detections_only_cache_entry_counts_as_miss_for_annotated_requests():
+    file_content = base64.b64decode(
+        "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAAAAAA6fptVAAAACklEQVQIHWNgAAAAAgABz8g15QAAAABJRU5ErkJggg=="
+    )
+    async with AsyncClient(transport=ASGITransport(app), base_url="http://127.0.0.1") as client:
+        before = (await client.get('/api/v1/detect/cache/stats')).json()
+        detections_only = await client.post('/api/v1/detect', params={"annotate": False},
+                                            files={"file": ("test.png", io.BytesIO(file_content), "image/png")})
+        annotated = await client.post('/api/v1/detect', files={"file": ("test.png", io.BytesIO(file_content), "image/png")})
+        after = (await client.get('/api/v1/detect/cache/stats')).json()
+
+    assert detections_only.json()["cache"] == "miss" and annotated.json()["cache"] == "miss"
+    # the detections-only entry could not serve the annotated request, it must not count as a hit
+    assert after["hits"] - before["hits"] == 0
+    assert after["misses"] - before["misses"] == 2
+
+
+async def test_detect_returns_columnar_detections_on_request():
+    async with AsyncClient(transport=ASGITransport(app), base_url="http://127.0.0.1") as client:
+        file_content = base64.b64decode(
+            "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAAAAAA6fptVAAAACklEQVQIHWNgAAAAAgABz8g15QAAAABJRU5ErkJggg=="
+        )
+        response = await client.post('/api/v1/detect', params={"detections_format": "columns"},
+                                     files={"file": ("test.png", io.BytesIO(file_content), "image/png")})
+
+    body = response.json()
+    assert response.status_code == status.HTTP_201_CREATED
+    assert body["detections"] is None
+    assert body["detection_columns"] == {"classes": ["helmet", "helmet"],
+                                         "confidences": [0.99, 0.98],
+                                         "bboxes": [[1, 2, 3, 4], [5, 6, 7, 8]]}
+
+
+
+async def test_detect_negotiates_binary_and_detections_only_responses():
+    file_content = base64.b64decode(
+        "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAAAAAA6fptVAAAACklEQVQIHWNgAAAAAgABz8g15QAAAABJRU5ErkJggg=="
+    )
+    manager = detect_routes.inference_scheduler.inference_manager
+    async with AsyncClient(transport=ASGITransport(app), base_url="http://127.0.0.1") as client:
+        detections_only = await client.post('/api/v1/detect', params={"annotate": False},
+                                            files={"file": ("test.png", io.BytesIO(file_content), "image/png")})
+        multipart = await client.post('/api/v1/detect', headers={"Accept": "multipart/form-data"},
+                                      files={"file": ("test.png", io.BytesIO(file_content), "image/png")})
+        image = await client.post('/api/v1/detect', headers={"Accept": "image/jpeg"},
+                                  files={"file": ("test.png", io.BytesIO(file_content), "image/png")})
+        not_acceptable = await client.post('/api/v1/detect', params={"annotate": False}, headers={"Accept": "image/jpeg"},
+                                           files={"file": ("test.png", io.BytesIO(file_content), "image/png")})
+
+    assert detections_only.json()["annotated_image"] is None
+    assert detections_only.json()["summary"] == {"helmet_count": 2, "no_helmet_count": 1}
+    assert manager.detect_batch.call_args_list[0].args[1] == [False]
+    # the detections-only cache entry cannot serve the annotated requests, the next one is a cache hit
+    assert manager.detect_batch.call_count == 2
+    assert multipart.headers["content-type"].startswith("multipart/form-data; boundary=")
+    boundary = multipart.headers["content-type"].split("boundary=")[1].encode()
+    parts = [part for part in multipart.content.split(b"--" + boundary) if part.strip(b"-\r\n")]
+    detections_headers, detections_body = parts[0].split(b"\r\n\r\n", 1)
+    image_headers, image_body = parts[1].split(b"\r\n\r\n", 1)
+    assert b'name="detections"' in detections_headers
+    assert json.loads(detections_body)["annotated_image"] is None
+    assert b"image/jpeg" in image_headers and image_body.startswith(b"\xff\xd8")
+    assert image.headers["content-type"] == "image/jpeg" and image.content.startswith(b"\xff\xd8")
+    assert image.headers["X-Helmet-Count"] == "2"
+    assert not_acceptable.status_code == status.HTTP_406_NOT_ACCEPTABLE
+
+
+async def test_detect_negotiation_honours_accept_quality_values():
+    browser = "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8"
+    assert detect_routes._negotiate(browser) == "json"
+    assert detect_routes._negotiate("*/*") == "json"
+    assert detect_routes._negotiate(None) == "json"
+    assert detect_routes._negotiate("application/json;q=0.5, image/jpeg") == "image"
+    assert detect_routes._negotiate("image/jpeg;q=0.4, multipart/mixed;q=0.9") == "multipart/mixed"
+    assert detect_routes._negotiate("image/jpeg, application/json") == "json"
+    assert detect_routes._negotiate("image/jpeg;q=0, */*") == "json"
+
+
+async def test_detect_returns_503_when_inference_queue_is_full(monkeypatch):
+    async def reject(image, annotate=True):
+        raise InferenceQueueFullError("Inference queue is full, please retry later.")
+    monkeypatch.setattr(detect_routes.inference_scheduler, "submit", reject)
+
+    async with AsyncClient(transport=ASGITransport(app), base_url="http://127.0.0.1") as client:
+        file_content = base64.b64decode(
+            "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAAAAAA6fptVAAAACklEQVQIHWNgAAAAAgABz8g15QAAAABJRU5ErkJggg=="
+        )
+        response = await client.post('/api/v1/detect', files={"file": ("test.png", io.BytesIO(file_content), "image/png")})
+        stats_response = await client.get('/api/v1/detect/stats')
+
+    assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert response.headers["Retry-After"] == str(settings.INFERENCE_RETRY_AFTER_SECONDS)
+    assert stats_response.status_code == status.HTTP_200_OK
+    assert "queue_depth" in stats_response.json()
+
+
+
+async def test_batch_detection_accepts_files_and_zip_archives():
+    png = base64.b64decode(
+        "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAAAAAA6fptVAAAACklEQVQIHWNgAAAAAgABz8g15QAAAABJRU5ErkJggg=="
+    )
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zip_file:
+        zip_file.writestr("frames/frame_1.png", png)
+        zip_file.writestr("frames/notes.txt", b"not an image")
+    files = [
+        ("files", ("a.png", io.BytesIO(png), "image/png")),
+        ("files", ("b.png", io.BytesIO(png), "image/png")),
+        ("files", ("frames.zip", io.BytesIO(archive.getvalue()), "application/zip")),
+    ]
+
+    async with AsyncClient(transport=ASGITransport(app), base_url="http://127.0.0.1") as client:
+        response = await client.post('/api/v1/detect/batch', files=files)
+
+    assert response.status_code == status.HTTP_201_CREATED
+    body = response.json()
+    assert [result["filename"] for result in body["results"]] == ["a.png", "b.png", "frame_1.png", "notes.txt"]
+    assert body["results"][3]["error"]
+    assert body["results"][0]["annotated_image"] is None
+    assert body["summary"] == {"total_images": 4, "processed_images": 3, "failed_images": 1,
+                               "helmet_count": 6, "no_helmet_count": 3, "images_with_violations": 3}
+
+
+async def test_batch_detection_checks_archive_entries_before_extracting():
+    too_many = io.BytesIO()
+    with zipfile.ZipFile(too_many, "w", compression=zipfile.ZIP_DEFLATED) as zip_file:
+        for index in range(settings.BATCH_DETECT_MAX_IMAGES + 1):
+            zip_file.writestr(f"{index}.png", b"")
+    bomb = io.BytesIO()
+    with zipfile.ZipFile(bomb, "w", compression=zipfile.ZIP_DEFLATED) as zip_file:
+        zip_file.writestr("zeros.png", bytes(settings.MAX_IMAGE_UPLOAD_BYTES + 1))
+
+    async with AsyncClient(transport=ASGITransport(app), base_url="http://127.0.0.1") as client:
+        response = await client.post('/api/v1/detect/batch', files=[("files", ("many.zip", too_many.getvalue(), "application/zip"))])
+    images = detect_routes.detection_service.extract_archive(bomb.getvalue())
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert "Too many images" in response.json()["detail"]
+    # the oversized entry is reported by its declared size without being decompressed
+    assert images[0].content == b"" and images[0].size == settings.MAX_IMAGE_UPLOAD_BYTES + 1
+
+
+async def test_batch_detection_streams_ndjson():
+    png = base64.b64decode(
+        "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAAAAAA6fptVAAAACklEQVQIHWNgAAAAAgABz8g15QAAAABJRU5ErkJggg=="
+    )
+    files = [("files", (f"{i}.png", io.BytesIO(png), "image/png")) for i in range(3)]
+
+    async with AsyncClient(transport=ASGITransport(app), base_url="http://127.0.0.1") as client:
+        response = await client.post('/api/v1/detect/batch', params={"stream": True, "include_annotated_images": True}, files=files)
+
+    records = [json.loads(line) for line in response.text.splitlines()]
+    assert [record["type"] for record in records] == ["image", "image", "image", "summary"]
+    assert records[0]["annotated_image"]
+    assert records[-1]["processed_images"] == 3
+
+
+async def test_report_from_stored_detection_by_image_id():
+    png = base64.b64decode(
+        "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAAAAAA6fptVAAAACklEQVQIHWNgAAAAAgABz8g15QAAAABJRU5ErkJggg=="
+    )
+    generate_report = report_generator.generate_report
+
+    def slow_generate_report(**kwargs):
+        # keeps the job running while the duplicate request comes in
+        time.sleep(0.2)
+        return generate_report(**kwargs)
+
+    async with AsyncClient(transport=ASGITransport(app), base_url="http://127.0.0.1") as client:
+        detect_response = await client.post('/api/v1/detect', files={"file": ("test.png", io.BytesIO(png), "image/png")})
+        image_id = detect_response.json()["image_id"]
+        with patch.object(report_generator, "generate_report", side_effect=slow_generate_report):
+            report_response = await client.post('/api/v1/report', json={"image_id": image_id})
+            duplicate_response = await client.post('/api/v1/report', json={"image_id": image_id})
+        missing_response = await client.post('/api/v1/report', json={"image_id": "unknown.png"})
+
+        assert report_response.status_code == status.HTTP_202_ACCEPTED
+        job = report_response.json()
+        assert duplicate_response.json()["job_id"] == job["job_id"]
+        assert duplicate_response.json()["coalesced"] is True
+        for _ in range(100):
+            job = (await client.get(job["status_url"])).json()
+            if job["status"] in ("completed", "failed"):
+                break
+            await asyncio.sleep(0.02)
+        unknown_job_response = await client.get('/api/v1/report/unknown')
+
+    assert job["status"] == "completed"
+    assert job["progress"] == 1.0
+    assert job["report_url"].endswith(".pdf")
+    assert missing_response.status_code == status.HTTP_404_NOT_FOUND
+    assert unknown_job_response.status_code == status.HTTP_404_NOT_FOUND
+
+
+async def test_aggregated_report_for_a_batch():
+    png = base64.b64decode(
+        "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAAAAAA6fptVAAAACklEQVQIHWNgAAAAAgABz8g15QAAAABJRU5ErkJggg=="
+    )
+    files = [("files", (f"{i}.png", io.BytesIO(png), "image/png")) for i in range(3)]
+
+    async with AsyncClient(transport=ASGITransport(app), base_url="http://127.0.0.1") as client:
+        batch_id = (await client.post('/api/v1/detect/batch', files=files)).json()["batch_id"]
+        report_response = await client.post('/api/v1/report/aggregate', json={"batch_id": batch_id})
+        invalid_response = await client.post('/api/v1/report/aggregate', json={"batch_id": batch_id, "image_ids": ["a"]})
+        missing_response = await client.post('/api/v1/report/aggregate', json={"batch_id": "unknown"})
+
+        assert report_response.status_code == status.HTTP_202_ACCEPTED
+        job = report_response.json()
+        for _ in range(100):
+            job = (await client.get(job["status_url"])).json()
+            if job["status"] in ("completed", "failed"):
+                break
+            await asyncio.sleep(0.02)
+
+    assert job["status"] == "completed", job["error"]
+    assert invalid_response.status_code == status.HTTP_422_UNPROCESSABLE_CONTENT
+    assert missing_response.status_code == status.HTTP_404_NOT_FOUND
+
+
+async def test_in_memory_report_one_shot_download(monkeypatch):
+    from pdf_report_generator import report_generator
+    monkeypatch.setattr(report_generator, "in_memory", True)
+    png = base64.b64decode(
+        "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAAAAAA6fptVAAAACklEQVQIHWNgAAAAAgABz8g15QAAAABJRU5ErkJggg=="
+    )
+    async with AsyncClient(transport=ASGITransport(app), base_url="http://127.0.0.1") as client:
+        image_id = (await client.post('/api/v1/detect', files={"file": ("test.png", io.BytesIO(png), "image/png")})).json()["image_id"]
+        job = (await client.post('/api/v1/report', json={"image_id": image_id})).json()
+        for _ in range(100):
+            job = (await client.get(job["status_url"])).json()
+            if job["status"] in ("completed", "failed"):
+                break
+            await asyncio.sleep(0.02)
+        first = await client.get(job["report_url"])
+        second = await client.get(job["report_url"])
+        storage_response = await client.get('/api/v1/report/storage/stats')
+
+    assert job["report_url"].endswith("/download")
+    assert first.status_code == status.HTTP_200_OK
+    assert first.headers["content-type"] == "application/pdf"
+    assert second.status_code == status.HTTP_410_GONE
+    assert "pdf_reports" in storage_response.json()["areas"]
@@ -0,0 +1,41 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+import pytest
+
+from annotation import AnnotationRenderer
+from logger import logger
+from settings import settings
+
+pytestmark = pytest.mark.asyncio(loop_scope="package")
+
+CLASS_NAMES = {0: "head", 1: "helmet", 2: "person"}
+# x1, y1, x2, y2, conf, cls
+BOXES = np.array([[100, 100, 200, 200, 0.9, 0], [300, 100, 400, 200, 0.8, 1], [500, 100, 600, 300, 0.7, 2]], dtype=np.float32)
+
+
+def make_renderer(**overrides) -> AnnotationRenderer:
+    return AnnotationRenderer(settings=settings.model_copy(update={"ANNOTATED_IMAGE_MAX_SIDE": 0, **overrides}),
+                              logger=logger, class_names=CLASS_NAMES)
+
+
+async def test_heads_and_helmets_are_drawn_in_place():
+    image = np.zeros((480, 800, 3), dtype=np.uint8)
+    annotated = make_renderer(ANNOTATION_LABELS=False).render(image, BOXES)
+
+    assert annotated is image
+    assert tuple(image[150, 100]) == AnnotationRenderer.VIOLATION_COLOR  # left border of the head box
+    assert tuple(image[150, 300]) == AnnotationRenderer.COMPLIANCE_COLOR
+    assert not image[:, 450:].any()  # persons are not drawn
+    assert not image[120:180, 120:180].any()  # boxes are outlines
+
+
+async def test_preview_mode_draws_on_a_downscaled_copy():
+    image = np.zeros((480, 800, 3), dtype=np.uint8)
+    annotated = make_renderer(ANNOTATED_IMAGE_MAX_SIDE=400).render(image, BOXES)
+
+    assert annotated.shape == (240, 400, 3)
+    assert tuple(annotated[75, 50]) == AnnotationRenderer.VIOLATION_COLOR
+    assert not image.any()
@@ -0,0 +1,48 @@
+import sys
+import os
+from datetime import datetime
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from detection_store import DetectionStore, StoredDetection
+from logger import logger
+from settings import settings
+
+
+def make_entry(image_id: str, batch_id=None, size: int = 1000) -> StoredDetection:
+    return StoredDetection(image_id=image_id, timestamp=datetime.now(), detections=[], violations=0,
+                           compliances=1, annotated_image=b"x" * size, batch_id=batch_id)
+
+
+def make_store(**overrides) -> DetectionStore:
+    return DetectionStore(settings=settings.model_copy(update=overrides), logger=logger)
+
+
+def test_store_evicts_oldest_entries_over_the_entry_limit():
+    store = make_store(DETECTION_STORE_MAX_ENTRIES=2)
+    for image_id in ("a", "b", "c"):
+        store.put(make_entry(image_id))
+
+    assert store.get("a") is None
+    assert store.get("c").image_id == "c"
+    assert store.stats()["evictions"] == 1
+
+
+def test_store_respects_byte_budget_and_ttl():
+    store = make_store(DETECTION_STORE_MAX_BYTES=2000)
+    store.put(make_entry("a"))
+    store.put(make_entry("b"))
+    assert store.get("a") is None
+    assert store.stats()["size_bytes"] <= 2000
+
+    expired = make_store(DETECTION_STORE_TTL_SECONDS=0)
+    expired.put(make_entry("a"))
+    assert expired.get("a") is None
+
+
+def test_store_lists_batch_entries_in_order():
+    store = make_store()
+    store.put(make_entry("a", batch_id="batch"))
+    store.put(make_entry("other"))
+    store.put(make_entry("b", batch_id="batch"))
+
+    assert [entry.image_id for entry in store.batch("batch")] == ["a", "b"]
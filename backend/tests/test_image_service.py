@@ -0,0 +1,39 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import cv2
+import numpy as np
+import pytest
+
+from image_service import ImageService
+from logger import logger
+from settings import settings
+from storage_manager import storage_manager
+
+pytestmark = pytest.mark.asyncio(loop_scope="package")
+
+
+def make_service(**overrides) -> ImageService:
+    return ImageService(settings=settings.model_copy(update={"MODEL_IMG_SIZE": 640, **overrides}), logger=logger,
+                        storage=storage_manager)
+
+
+async def test_large_jpegs_decode_at_reduced_scale_and_boxes_map_back():
+    service = make_service(REDUCED_JPEG_DECODE=True)
+    jpeg = cv2.imencode(".jpg", np.full((2000, 3000, 3), 128, dtype=np.uint8))[1].tobytes()
+    png = cv2.imencode(".png", np.zeros((2000, 3000, 3), dtype=np.uint8))[1].tobytes()
+
+    image, scale = service.decode_for_inference(jpeg)
+    assert image.shape == (500, 750, 3)  # 1/4: the longer side stays above 640, 1/8 would not
+    assert scale == (4.0, 4.0)
+    assert service.rescale_detections([{"class": "head", "confidence": 0.9, "bbox": [10, 20, 30, 40]}], scale) == \
+        [{"class": "head", "confidence": 0.9, "bbox": [40, 80, 120, 160]}]
+
+    # PNGs, small JPEGs and tiled inference keep the full resolution
+    assert service.decode_for_inference(png)[0].shape == (2000, 3000, 3)
+    small = cv2.imencode(".jpg", np.zeros((600, 800, 3), dtype=np.uint8))[1].tobytes()
+    assert service.decode_for_inference(small)[1] == (1.0, 1.0)
+    assert make_service(REDUCED_JPEG_DECODE=True, TILE_INFERENCE=True).decode_for_inference(jpeg)[0].shape == (2000, 3000, 3)
+    # opt-in: by default the annotated image keeps the resolution of the upload
+    assert make_service().decode_for_inference(jpeg)[1] == (1.0, 1.0)
@@ -0,0 +1,83 @@
+import sys
+import os
+import threading
+from unittest.mock import MagicMock
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+import pytest
+import asyncio
+
+from inference import InferenceResult
+from inference_scheduler import BatchInferenceScheduler, InferenceQueueFullError
+from logger import logger
+from settings import settings
+
+pytestmark = pytest.mark.asyncio(loop_scope="package")
+
+
+def make_scheduler(max_batch_size: int, max_batch_wait_ms: float, queue_size: int = 64,
+                   release: threading.Event = None) -> tuple[BatchInferenceScheduler, list[int]]:
+    batch_sizes = []
+
+    def detect_batch(images, annotate=None):
+        if release is not None:
+            release.wait(timeout=5)
+        batch_sizes.append(len(images))
+        return [InferenceResult(detections=[], violations=int(image[0, 0, 0]), compliances=0, 
+                                annotated_image=image) for image in images]
+
+    manager = MagicMock()
+    manager.detect_batch.side_effect = detect_batch
+    test_settings = settings.model_copy(update={"MAX_BATCH_SIZE": max_batch_size, 
+                                                "MAX_BATCH_WAIT_MS": max_batch_wait_ms,
+                                                "INFERENCE_QUEUE_MAX_SIZE": queue_size,
+                                                "INFERENCE_WORKERS": 1})
+    return BatchInferenceScheduler(inference_manager=manager, settings=test_settings, logger=logger), batch_sizes
+
+
+async def test_concurrent_images_share_one_forward_pass():
+    scheduler, batch_sizes = make_scheduler(max_batch_size=4, max_batch_wait_ms=200)
+    images = [np.full((2, 2, 3), i, dtype=np.uint8) for i in range(4)]
+
+    results = await asyncio.gather(*(scheduler.submit(image) for image in images))
+    await scheduler.stop()
+
+    assert batch_sizes == [4]
+    # every coroutine gets the result of its own image back
+    assert [result.violations for result in results] == [0, 1, 2, 3]
+
+
+async def test_batches_are_capped_at_max_batch_size():
+    scheduler, batch_sizes = make_scheduler(max_batch_size=2, max_batch_wait_ms=50)
+    images = [np.zeros((2, 2, 3), dtype=np.uint8) for _ in range(5)]
+
+    await asyncio.gather(*(scheduler.submit(image) for image in images))
+    await scheduler.stop()
+
+    assert batch_sizes == [2, 2, 1]
+
+
+async def test_full_queue_rejects_new_images():
+    release = threading.Event()
+    scheduler, batch_sizes = make_scheduler(max_batch_size=1, max_batch_wait_ms=0, queue_size=1, release=release)
+    image = np.zeros((2, 2, 3), dtype=np.uint8)
+
+    running = asyncio.create_task(scheduler.submit(image))
+    await asyncio.sleep(0.05)  # first image is now blocked inside the worker
+    queued = asyncio.create_task(scheduler.submit(image))
+    await asyncio.sleep(0)
+
+    with pytest.raises(InferenceQueueFullError):
+        await scheduler.submit(image)
+    assert scheduler.stats()["queue_depth"] == 1
+    assert scheduler.stats()["in_flight"] == 1
+
+    release.set()
+    await asyncio.gather(running, queued)
+    await scheduler.stop()
+
+    stats = scheduler.stats()
+    assert batch_sizes == [1, 1]
+    assert stats["rejected_requests"] == 1
+    assert stats["processed_images"] == 2
@@ -0,0 +1,90 @@
+import json
+import logging
+import sys
+import os
+from unittest.mock import MagicMock
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import cv2
+import numpy as np
+import pytest
+from fastapi import FastAPI
+from httpx import AsyncClient, ASGITransport
+
+from inference import InferenceResult
+from inference_scheduler import inference_scheduler
+from logger import Logger, RequestLoggingMiddleware, add_request_timing, logger
+from main import app
+from result_cache import result_cache
+
+pytestmark = pytest.mark.asyncio(loop_scope="package")
+
+
+def read_records(log_dir, name: str) -> list[dict]:
+    return [json.loads(line) for line in (log_dir / f"{name}.log").read_text().splitlines()]
+
+
+async def test_queue_logger_writes_json_records_and_rotates(tmp_path):
+    log = Logger(name="test_queue_json", log_dir=str(tmp_path), log_to_console=False,
+                 structured=True, use_queue=True, max_bytes=2048, backup_count=2)
+    log.debug("hidden at INFO")
+    for index in range(40):
+        log.info("image processed", index=index, timings_ms={"decode": 1.5})
+    log.stop()
+
+    records = read_records(tmp_path, "test_queue_json")
+    assert records and all(record["message"] == "image processed" for record in records)
+    assert records[-1]["index"] == 39 and records[-1]["timings_ms"] == {"decode": 1.5}
+    assert (tmp_path / "test_queue_json.log.1").exists() and not (tmp_path / "test_queue_json.log.3").exists()
+
+
+async def test_request_records_carry_the_request_id_and_stage_timings(tmp_path):
+    log = Logger(name="test_request_json", log_dir=str(tmp_path), log_to_console=False, structured=True)
+    inner = FastAPI()
+
+    @inner.get("/work")
+    async def work():
+        add_request_timing("decode", 0.002)
+        log.info("working")
+        return {}
+
+    sampled_out = RequestLoggingMiddleware(inner, logger=log, sample_rate=0.0, slow_ms=1e9)
+    async with AsyncClient(transport=ASGITransport(RequestLoggingMiddleware(inner, logger=log)), base_url="http://test") as client:
+        response = await client.get("/work", headers={"X-Request-ID": "abc123"})
+    async with AsyncClient(transport=ASGITransport(sampled_out), base_url="http://test") as client:
+        generated = await client.get("/work")
+
+    records = read_records(tmp_path, "test_request_json")
+    assert response.headers["x-request-id"] == "abc123"
+    assert len(generated.headers["x-request-id"]) == 32
+    assert records[0] == {**records[0], "message": "working", "request_id": "abc123"}
+    assert records[1]["message"] == "request completed" and records[1]["request_id"] == "abc123"
+    assert records[1]["status"] == 200 and records[1]["timings_ms"] == {"decode": 2.0}
+    # the sampled-out request only left its own "working" record
+    assert [record["message"] for record in records[2:]] == ["working"]
+
+
+async def test_detect_access_record_includes_pipeline_stages(monkeypatch):
+    records = []
+    capture = logging.Handler()
+    capture.emit = records.append
+    manager = MagicMock()
+    manager.detect_batch.side_effect = lambda images, annotate=None: [InferenceResult(
+        detections=[], violations=0, compliances=0, annotated_image=image, timings={"forward": 0.02}
+    ) for image in images]
+    monkeypatch.setattr(inference_scheduler, "inference_manager", manager)
+    monkeypatch.setattr(result_cache, "enabled", False)
+    upload = cv2.imencode(".jpg", np.zeros((32, 32, 3), dtype=np.uint8))[1].tobytes()
+
+    logger.logger.addHandler(capture)
+    try:
+        async with AsyncClient(transport=ASGITransport(app), base_url="http://test") as client:
+            response = await client.post("/api/v1/detect", files={"file": ("site.jpg", upload, "image/jpeg")})
+    finally:
+        logger.logger.removeHandler(capture)
+
+    access = next(record for record in records if record.getMessage() == "request completed")
+    assert access.request_id == response.headers["x-request-id"]
+    assert access.fields["path"] == "/api/v1/detect" and access.fields["status"] == 201
+    assert {"upload_read", "validation", "decode", "forward", "encode", "base64"} <= set(access.fields["timings_ms"])
+    assert access.fields["timings_ms"]["forward"] == 20.0
@@ -0,0 +1,74 @@
+import sys
+import os
+from unittest.mock import MagicMock
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import cv2
+import numpy as np
+import pytest
+from fastapi import status
+from httpx import AsyncClient, ASGITransport
+
+from inference import InferenceResult
+from inference_scheduler import inference_scheduler
+from logger import logger
+from main import app
+from metrics import MetricsRegistry, metrics
+from result_cache import result_cache
+from settings import settings
+
+pytestmark = pytest.mark.asyncio(loop_scope="package")
+
+
+def sample_value(text: str, line_prefix: str) -> float:
+    return float(next(line for line in text.splitlines() if line.startswith(line_prefix)).rsplit(" ", 1)[1])
+
+
+async def test_histograms_are_cumulative_and_collectors_are_read_on_render():
+    registry = MetricsRegistry(settings=settings.model_copy(update={"METRICS_LATENCY_BUCKETS": [0.01, 0.1, 1.0]}),
+                               logger=logger)
+    for seconds in (0.005, 0.05, 0.05, 5.0):
+        registry.observe("decode", seconds)
+    registry.inc("images", cache="miss")
+    registry.inc("violations", 3)
+    registry.register_collector("queue", lambda: {"queue_depth": 2, "mode": "exact"})
+
+    text = registry.render()
+
+    assert sample_value(text, 'ppe_stage_duration_seconds_bucket{stage="decode",le="0.01"}') == 1
+    assert sample_value(text, 'ppe_stage_duration_seconds_bucket{stage="decode",le="0.1"}') == 3
+    assert sample_value(text, 'ppe_stage_duration_seconds_bucket{stage="decode",le="+Inf"}') == 4
+    assert sample_value(text, 'ppe_stage_duration_seconds_count{stage="decode"}') == 4
+    assert sample_value(text, 'ppe_images_total{cache="miss"}') == 1
+    assert sample_value(text, "ppe_violations_total") == 3
+    assert sample_value(text, "ppe_queue_queue_depth") == 2
+    assert "ppe_queue_mode" not in text
+
+
+async def test_metrics_endpoint_exposes_detect_stage_timings(monkeypatch):
+    manager = MagicMock()
+    manager.detect_batch.side_effect = lambda images, annotate=None: [InferenceResult(
+        detections=[{"class": "head", "confidence": 0.9, "bbox": [1, 2, 3, 4]}], violations=1, compliances=0,
+        annotated_image=image, timings={"preprocess": 0.001, "forward": 0.02, "nms": 0.001, "plot": 0.002}
+    ) for image in images]
+    monkeypatch.setattr(inference_scheduler, "inference_manager", manager)
+    monkeypatch.setattr(result_cache, "enabled", False)
+    metrics.reset()
+    upload = cv2.imencode(".jpg", np.zeros((32, 32, 3), dtype=np.uint8))[1].tobytes()
+
+    async with AsyncClient(transport=ASGITransport(app), base_url="http://127.0.0.1") as client:
+        detected = await client.post("/api/v1/detect", files={"file": ("site.jpg", upload, "image/jpeg")})
+        scraped = await client.get("/metrics")
+
+    assert detected.status_code == status.HTTP_201_CREATED
+    assert scraped.status_code == status.HTTP_200_OK
+    assert scraped.headers["content-type"].startswith("text/plain; version=0.0.4")
+    text = scraped.text
+    for stage in ("upload_read", "validation", "decode", "queue_wait", "preprocess", "forward", "nms",
+                  "plot", "encode", "base64"):
+        assert sample_value(text, f'ppe_stage_duration_seconds_count{{stage="{stage}"}}') == 1, stage
+    assert sample_value(text, 'ppe_stage_duration_seconds_sum{stage="forward"}') == pytest.approx(0.02)
+    assert sample_value(text, 'ppe_http_requests_total{method="POST",route="/api/v1/detect",status="201"}') == 1
+    assert sample_value(text, 'ppe_images_total{cache="miss"}') == 1
+    assert sample_value(text, "ppe_violations_total") == 1
+    assert "ppe_inference_queue_queue_depth" in text and "ppe_report_jobs_queued" in text
@@ -0,0 +1,62 @@
+import sys
+import os
+from unittest.mock import patch
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+
+from logger import logger
+from model_export import ModelExporter
+from model_quantizer import build_serving_artifact
+from settings import settings
+
+pytestmark = pytest.mark.asyncio(loop_scope="package")
+
+
+def fake_export(weights_path):
+    """Stands in for YOLO(...).export: writes an artifact named after the weights it was built from."""
+    def export(**kwargs):
+        exported = weights_path.with_name("exported.onnx")
+        exported.write_bytes(weights_path.read_bytes())
+        return str(exported)
+    return export
+
+
+async def test_artifacts_of_other_weights_are_exported_again(tmp_path):
+    weights_path = tmp_path / "model.pt"
+    weights_path.write_bytes(b"first weights")
+    exporter = ModelExporter(model_path=str(weights_path), settings=settings, logger=logger)
+
+    with patch("model_export.YOLO") as yolo:
+        yolo.return_value.export.side_effect = fake_export(weights_path)
+        onnx_path = exporter.export("onnx")
+        assert exporter.export("onnx") == onnx_path and yolo.return_value.export.call_count == 1
+
+        # retraining overwrites the weights, the ONNX file of the old weights must not be served
+        weights_path.write_bytes(b"retrained weights")
+        exporter = ModelExporter(model_path=str(weights_path), settings=settings, logger=logger)
+        assert not exporter.is_current(onnx_path)
+        with pytest.raises(FileNotFoundError, match="outdated"):
+            ModelExporter(model_path=str(weights_path), settings=settings.model_copy(update={"MODEL_AUTO_EXPORT": False}),
+                          logger=logger).load("onnx")
+        exporter.load("onnx")
+
+    assert yolo.return_value.export.call_count == 2
+    assert onnx_path.read_bytes() == b"retrained weights"
+    assert exporter.is_current(onnx_path)
+
+
+async def test_registered_versions_get_the_artifact_of_the_configured_backend(tmp_path):
+    weights_path = tmp_path / "v0001.pt"
+    weights_path.write_bytes(b"weights")
+    int8_settings = settings.model_copy(update={"INFERENCE_BACKEND": "onnx", "MODEL_PRECISION": "int8"})
+
+    with patch("model_quantizer.ModelQuantizer.quantize", return_value=tmp_path / "v0001_int8.onnx") as quantize, \
+            patch("model_export.YOLO") as yolo:
+        yolo.return_value.export.side_effect = fake_export(weights_path)
+        assert build_serving_artifact(weights_path, settings=int8_settings, logger=logger) == tmp_path / "v0001_int8.onnx"
+        onnx_path = build_serving_artifact(weights_path, settings=int8_settings.model_copy(update={"MODEL_PRECISION": "fp32"}),
+                                           logger=logger)
+
+    quantize.assert_called_once_with(backend="onnx")
+    assert onnx_path == tmp_path / "v0001.onnx" and onnx_path.exists()
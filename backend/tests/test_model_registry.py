@@ -0,0 +1,176 @@
+import asyncio
+import time
+import sys
+import os
+from unittest.mock import MagicMock
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+import pytest
+from fastapi import status
+from httpx import AsyncClient, ASGITransport
+
+import inference
+from inference import InferenceResult
+from inference_scheduler import BatchInferenceScheduler, inference_scheduler
+from logger import logger
+from main import app
+from model_loader import ModelLoader
+from model_registry import ModelRegistry, model_registry
+from settings import settings
+from tiling import TileSlicer
+
+pytestmark = pytest.mark.asyncio(loop_scope="package")
+
+
+class FakeInferenceManager:
+    """Reports the registry version it was built from, the first batch is slow to keep it in flight."""
+
+    def __init__(self, model_path, settings, logger):
+        self.model_version = os.path.basename(model_path).split(".")[0]
+        self.result_signature = f"{self.model_version}:0.25:0.45"
+        self.delay = 0.3 if self.model_version == "v0001" else 0.0
+
+    def warmup(self):
+        pass
+
+    def detect_batch(self, images, annotate=None):
+        time.sleep(self.delay)
+        return [InferenceResult(detections=[], violations=0, compliances=0, annotated_image=image,
+                                model_version=self.model_version) for image in images]
+
+
+@pytest.fixture
+def registry(tmp_path):
+    registry_settings = settings.model_copy(update={"MODEL_REGISTRY_DIR": str(tmp_path / "registry")})
+    registry = ModelRegistry(settings=registry_settings, logger=logger)
+    for content in (b"first weights", b"second weights"):
+        weights = tmp_path / "best.pt"
+        weights.write_bytes(content)
+        registry.register(weights, metrics={"metrics/mAP50(B)": 0.5}, classes={0: "head", 1: "helmet"}, image_size=640)
+    return registry
+
+
+async def test_registry_versions_and_atomic_activation(registry):
+    assert registry.versions() == ["v0001", "v0002"]
+    assert registry.active_version() is None
+    assert registry.active_weights_path() == settings.MODEL_WEIGHTS_PATH
+
+    registry.activate("v0002")
+    metadata = registry.get("v0002")
+
+    assert registry.active_version() == "v0002"
+    assert registry.active_weights_path().read_bytes() == b"second weights"
+    assert metadata.classes == {0: "head", 1: "helmet"} and metadata.metrics == {"metrics/mAP50(B)": 0.5}
+    with pytest.raises(KeyError):
+        registry.activate("v0003")
+    assert registry.active_version() == "v0002"
+
+
+async def test_hot_swap_lets_in_flight_requests_finish_on_the_old_model(monkeypatch, registry):
+    monkeypatch.setattr(inference, "InferenceManager", FakeInferenceManager)
+    registry.activate("v0001")
+    loader = ModelLoader(settings=settings, logger=logger, registry=registry)
+    scheduler = BatchInferenceScheduler(inference_manager=None, settings=settings, logger=logger, model_loader=loader)
+    image = np.zeros((4, 4, 3), dtype=np.uint8)
+
+    in_flight = asyncio.create_task(scheduler.submit(image))
+    await asyncio.sleep(0.1)
+    signature = await scheduler.reload_model("v0002")
+    after_swap = await scheduler.submit(image)
+
+    assert (await in_flight).model_version == "v0001"
+    assert after_swap.model_version == "v0002"
+    assert signature == scheduler.model_signature == "v0002:0.25:0.45"
+    assert registry.active_version() == "v0002"
+
+    # an unknown version leaves the serving model and the registry untouched
+    with pytest.raises(KeyError):
+        await scheduler.reload_model("v0003")
+    assert (await scheduler.submit(image)).model_version == "v0002"
+    assert registry.active_version() == "v0002"
+    await scheduler.stop()
+
+
+async def test_watcher_does_not_reload_a_version_activated_through_the_scheduler(monkeypatch, registry):
+    builds = []
+
+    class CountingInferenceManager(FakeInferenceManager):
+        def __init__(self, model_path, settings, logger):
+            super().__init__(model_path, settings, logger)
+            builds.append(self.model_version)
+
+    monkeypatch.setattr(inference, "InferenceManager", CountingInferenceManager)
+    registry.activate("v0001")
+    loader = ModelLoader(settings=settings, logger=logger, registry=registry)
+    scheduler = BatchInferenceScheduler(inference_manager=None, settings=settings, logger=logger, model_loader=loader)
+    scheduler.start_watching(0.01)
+    await asyncio.sleep(0.05)
+
+    await scheduler.reload_model("v0002")
+    await asyncio.sleep(0.1)
+
+    assert builds == ["v0002"]
+    assert scheduler.model_signature == "v0002:0.25:0.45"
+    await scheduler.stop()
+
+
+async def test_watcher_ignores_the_legacy_weights_until_a_version_is_activated(monkeypatch, registry, tmp_path):
+    builds = []
+
+    class CountingInferenceManager(FakeInferenceManager):
+        def __init__(self, model_path, settings, logger):
+            super().__init__(model_path, settings, logger)
+            builds.append(self.model_version)
+
+    monkeypatch.setattr(inference, "InferenceManager", CountingInferenceManager)
+    legacy_weights = tmp_path / "best_ppe_model.pt"
+    legacy_weights.write_bytes(b"legacy weights")
+    monkeypatch.setattr(registry, "settings", registry.settings.model_copy(update={"TRAINED_MODEL_PATH": str(legacy_weights)}))
+    loader = ModelLoader(settings=settings, logger=logger, registry=registry)
+    scheduler = BatchInferenceScheduler(inference_manager=None, settings=settings, logger=logger, model_loader=loader)
+    scheduler.start_watching(0.01)
+    await asyncio.sleep(0.05)
+
+    # every training run rewrites the legacy copy, without an active version it is not hot-swapped in
+    legacy_weights.write_bytes(b"retrained weights")
+    os.utime(legacy_weights, ns=(time.time_ns() + 10**9, time.time_ns() + 10**9))
+    await asyncio.sleep(0.1)
+    assert builds == []
+
+    registry.activate("v0002")
+    await asyncio.sleep(0.1)
+    assert builds == ["v0002"]
+    await scheduler.stop()
+
+
+async def test_admin_endpoints_require_the_token(monkeypatch, registry):
+    monkeypatch.setattr(model_registry, "root", registry.root)
+    monkeypatch.setattr(inference_scheduler, "inference_manager", MagicMock(result_signature="serving:0.25:0.45"))
+    async with AsyncClient(transport=ASGITransport(app), base_url="http://127.0.0.1") as client:
+        disabled = await client.get("/api/v1/admin/models")
+        monkeypatch.setattr(settings, "ADMIN_API_TOKEN", "secret")
+        unauthorized = await client.get("/api/v1/admin/models", headers={"X-Admin-Token": "wrong"})
+        listed = await client.get("/api/v1/admin/models", headers={"X-Admin-Token": "secret"})
+        unknown = await client.post("/api/v1/admin/models/v0009/activate", headers={"X-Admin-Token": "secret"})
+
+    assert disabled.status_code == status.HTTP_404_NOT_FOUND
+    assert unauthorized.status_code == status.HTTP_401_UNAUTHORIZED
+    assert listed.status_code == status.HTTP_200_OK
+    assert [model["version"] for model in listed.json()["versions"]] == ["v0001", "v0002"]
+    assert listed.json()["serving_signature"] == "serving:0.25:0.45"
+    assert unknown.status_code == status.HTTP_404_NOT_FOUND
+
+
+async def test_signature_before_loading_matches_the_loaded_model(monkeypatch, registry):
+    registry.activate("v0001")
+    tiled_settings = settings.model_copy(update={"TILE_INFERENCE": True})
+    loader = ModelLoader(settings=tiled_settings, logger=logger, registry=registry)
+    model_version = inference.compute_model_version(registry.weights_path("v0001"), tiled_settings.INFERENCE_BACKEND,
+                                                    tiled_settings.MODEL_PRECISION)
+    slicer = TileSlicer(settings=tiled_settings, logger=logger)
+
+    # the same image must get the same cache key before and after the model is loaded
+    assert loader.result_signature == inference.result_signature(model_version, tiled_settings.CONFIDENCE_THRESHOLD,
+                                                                 tiled_settings.IOU_THRESHOLD, slicer)
+    assert loader.result_signature.endswith(slicer.signature)
@@ -0,0 +1,58 @@
+import sys
+import os
+from datetime import datetime, timedelta
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+import cv2
+from reportlab import rl_config
+
+from detection_store import StoredDetection
+from logger import logger
+from pdf_report_generator import PDFReportGenerator
+from settings import settings
+from storage_manager import StorageManager
+
+
+def make_frames(count: int, size=(1080, 1920)) -> list[StoredDetection]:
+    rng = np.random.default_rng(0)
+    image = rng.integers(0, 255, (*size, 3), dtype=np.uint8)
+    content = cv2.imencode(".jpg", image)[1].tobytes()
+    started_at = datetime(2025, 12, 14, 8, 0, 0)
+    return [StoredDetection(image_id=f"{i}.jpg", timestamp=started_at + timedelta(seconds=i), detections=[],
+                            violations=i % 3, compliances=1, annotated_image=content, batch_id="batch")
+            for i in range(count)]
+
+
+def make_generator(tmp_path, **overrides) -> PDFReportGenerator:
+    generator_settings = settings.model_copy(update={"PDF_REPORTS_DIR": str(tmp_path), **overrides})
+    storage = StorageManager(settings=generator_settings, logger=logger)
+    return PDFReportGenerator(settings=generator_settings, logger=logger, storage=storage)
+
+
+def test_aggregated_report_renders_all_frames(tmp_path):
+    progress = []
+    url = make_generator(tmp_path).generate_aggregated_report(make_frames(20), progress=progress.append)
+
+    report = tmp_path / url.split("/pdf_reports/", 1)[-1]
+    assert report.read_bytes().startswith(b"%PDF")
+    assert progress[-1] > 0.9 and progress == sorted(progress)
+
+
+def test_aggregated_report_images_are_downscaled_to_dpi(tmp_path):
+    frames = make_frames(6)
+    low = make_generator(tmp_path / "low", REPORT_IMAGE_DPI=50).generate_aggregated_report(frames)
+    high = make_generator(tmp_path / "high", REPORT_IMAGE_DPI=300).generate_aggregated_report(frames)
+
+    low_size = (tmp_path / "low" / low.split("/pdf_reports/", 1)[-1]).stat().st_size
+    high_size = (tmp_path / "high" / high.split("/pdf_reports/", 1)[-1]).stat().st_size
+    assert low_size < high_size / 4
+
+
+def test_reports_embed_binary_streams_without_changing_the_reportlab_default(tmp_path):
+    default = rl_config.useA85
+    url = make_generator(tmp_path).generate_aggregated_report(make_frames(2))
+
+    report = tmp_path / url.split("/pdf_reports/", 1)[-1]
+    assert b"ASCII85Decode" not in report.read_bytes()
+    assert rl_config.useA85 == default
@@ -0,0 +1,112 @@
+import sys
+import os
+import threading
+import time
+from datetime import timedelta
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+
+from logger import logger
+from report_jobs import ReportJobManager, ReportQueueFullError
+from settings import settings
+
+
+def make_manager(**overrides) -> ReportJobManager:
+    return ReportJobManager(generator=None, settings=settings.model_copy(update=overrides), logger=logger)
+
+
+def wait_until_finished(job, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not job.is_finished and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return job
+
+
+def test_duplicate_jobs_are_coalesced_and_progress_is_reported():
+    manager = make_manager(REPORT_MAX_CONCURRENT_JOBS=1)
+    release = threading.Event()
+    calls = []
+
+    def render(progress):
+        calls.append(1)
+        progress(0.5)
+        release.wait(5)
+        return "http://localhost:8000/pdf_reports/report.pdf"
+
+    job, coalesced = manager.submit("image.png", render)
+    duplicate, duplicate_coalesced = manager.submit("image.png", render)
+    assert duplicate is job and duplicate_coalesced and not coalesced
+
+    release.set()
+    wait_until_finished(job)
+    assert job.status == "completed"
+    assert job.progress == 1.0
+    assert len(calls) == 1
+    assert manager.stats()["coalesced"] == 1
+
+    # the PDF of a completed job may have been swept from disk, a later request renders it again
+    again, again_coalesced = manager.submit("image.png", render)
+    assert not again_coalesced and again.job_id != job.job_id
+    manager.shutdown()
+
+
+def test_failed_job_is_reported_and_can_be_retried():
+    manager = make_manager()
+
+    def failing(progress):
+        raise RuntimeError("broken image")
+
+    job, _ = manager.submit("image.png", failing)
+    wait_until_finished(job)
+    assert job.status == "failed" and "broken image" in job.error
+
+    retry, coalesced = manager.submit("image.png", lambda progress: "url")
+    assert not coalesced and retry.job_id != job.job_id
+    manager.shutdown()
+
+
+def test_pending_limit_rejects_new_jobs():
+    manager = make_manager(REPORT_MAX_CONCURRENT_JOBS=1, REPORT_JOB_MAX_PENDING=1)
+    release = threading.Event()
+    manager.submit("a.png", lambda progress: release.wait(5) and "url")
+
+    with pytest.raises(ReportQueueFullError):
+        manager.submit("b.png", lambda progress: "url")
+    release.set()
+    manager.shutdown()
+
+
+def test_in_memory_report_is_downloaded_once():
+    manager = make_manager()
+    job, _ = manager.submit("image.png", lambda progress: b"%PDF-1.4")
+    wait_until_finished(job)
+
+    assert manager.take_content(job.job_id) == b"%PDF-1.4"
+    assert manager.take_content(job.job_id) is None
+    retry, coalesced = manager.submit("image.png", lambda progress: b"%PDF-1.4")
+    assert not coalesced
+    manager.shutdown()
+
+
+def test_undownloaded_in_memory_reports_expire_and_are_capped():
+    manager = make_manager(REPORT_IN_MEMORY_RETENTION_SECONDS=60, REPORT_IN_MEMORY_MAX_MB=1)
+    jobs = []
+    for key in ("first.png", "second.png"):
+        job, _ = manager.submit(key, lambda progress: b"x" * 600 * 1024)
+        jobs.append(wait_until_finished(job))
+
+    # the second PDF does not fit the budget next to the first, the oldest one is dropped
+    assert jobs[0].content is None and jobs[0].expired
+    assert jobs[1].content is not None
+    assert manager.stats()["in_memory_bytes"] == 600 * 1024
+
+    # an old PDF is dropped by the sweep, a duplicate request renders it again
+    jobs[1].finished_at -= timedelta(seconds=120)
+    manager.release_expired_content()
+    assert jobs[1].content is None and jobs[1].expired and not jobs[1].downloaded
+    assert manager.stats()["in_memory_bytes"] == 0 and manager.stats()["expired"] == 2
+    assert manager.take_content(jobs[1].job_id) is None
+    retry, coalesced = manager.submit("second.png", lambda progress: b"%PDF-1.4")
+    assert not coalesced
+    manager.shutdown()
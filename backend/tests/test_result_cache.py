@@ -0,0 +1,91 @@
+import sys
+import os
+import time
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+import cv2
+
+from logger import logger
+from result_cache import ResultCache, CachedDetection
+from settings import settings
+
+
+def make_cache(**overrides) -> ResultCache:
+    return ResultCache(settings=settings.model_copy(update={"RESULT_CACHE_ENABLED": True, **overrides}), logger=logger)
+
+
+def make_entry(image_bytes: int = 100) -> CachedDetection:
+    return CachedDetection(detections=[], violations=0, compliances=0, annotated_image=b"x" * image_bytes)
+
+
+def test_key_includes_model_signature():
+    cache = make_cache()
+    cache.put(b"image", "model-a:0.25:0.45", make_entry())
+
+    assert cache.get(b"image", "model-a:0.25:0.45") is not None
+    assert cache.get(b"image", "model-a:0.5:0.45") is None
+    assert cache.get(b"other image", "model-a:0.25:0.45") is None
+
+
+def test_lru_eviction_by_memory_footprint():
+    entry_size = make_entry().size_bytes
+    cache = make_cache(RESULT_CACHE_MAX_BYTES=entry_size * 2)
+    cache.put(b"first", "m", make_entry())
+    cache.put(b"second", "m", make_entry())
+    cache.get(b"first", "m")  # first becomes the most recently used
+    cache.put(b"third", "m", make_entry())
+
+    assert cache.get(b"second", "m") is None
+    assert cache.get(b"first", "m") is not None
+    assert cache.get(b"third", "m") is not None
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["size_bytes"] <= entry_size * 2
+
+
+def test_entries_expire_after_ttl():
+    cache = make_cache(RESULT_CACHE_TTL_SECONDS=0.01)
+    cache.put(b"image", "m", make_entry())
+    time.sleep(0.02)
+
+    assert cache.get(b"image", "m") is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_perceptual_mode_matches_near_duplicate_frames():
+    cache = make_cache(RESULT_CACHE_MODE="perceptual")
+    rng = np.random.default_rng(0)
+    frame = np.repeat(np.linspace(0, 255, 64, dtype=np.uint8)[None, :, None], 48, axis=0).repeat(3, axis=2)
+    noisy_frame = np.clip(frame.astype(int) + rng.integers(-2, 3, frame.shape), 0, 255).astype(np.uint8)
+    other_frame = frame[:, ::-1].copy()
+
+    cache.put(b"frame bytes", "m", make_entry(), image=frame)
+
+    assert cache.get(b"noisy frame bytes", "m") is None
+    assert cache.get_similar(noisy_frame, "m") is not None
+    assert cache.get_similar(other_frame, "m") is None
+    assert cache.stats()["perceptual_hits"] == 1
+
+
+def test_perceptual_matches_need_the_same_image_size():
+    cache = make_cache(RESULT_CACHE_MODE="perceptual")
+    frame = np.repeat(np.linspace(0, 255, 64, dtype=np.uint8)[None, :, None], 48, axis=0).repeat(3, axis=2)
+    rescaled_frame = cv2.resize(frame, (128, 96))
+
+    cache.put(b"frame bytes", "m", make_entry(), image=frame)
+
+    # same dHash, but the cached bboxes are in the coordinates of the 64x48 frame
+    assert cache.perceptual_hash(rescaled_frame) == cache.perceptual_hash(frame)
+    assert cache.get_similar(rescaled_frame, "m") is None
+    assert cache.get_similar(rescaled_frame, "m", image_size=(64, 48)) is not None
+
+
+def test_annotated_lookups_skip_detections_only_entries():
+    cache = make_cache(RESULT_CACHE_MODE="perceptual")
+    frame = np.repeat(np.linspace(0, 255, 64, dtype=np.uint8)[None, :, None], 48, axis=0).repeat(3, axis=2)
+    cache.put(b"frame bytes", "m", CachedDetection(detections=[], violations=0, compliances=0, annotated_image=None), image=frame)
+
+    assert cache.get(b"frame bytes", "m", annotated=True) is None
+    assert cache.get_similar(frame, "m", annotated=True) is None
+    assert cache.stats()["hits"] == 0 and cache.stats()["misses"] == 1
+    assert cache.get(b"frame bytes", "m") is not None
@@ -0,0 +1,88 @@
+import subprocess
+import sys
+import os
+from unittest.mock import MagicMock
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+import pytest
+from fastapi import status
+from httpx import AsyncClient, ASGITransport
+
+import inference
+from inference import InferenceResult
+from inference_scheduler import BatchInferenceScheduler, inference_scheduler
+from logger import logger
+from main import app
+from model_loader import ModelLoader, ModelNotReadyError, model_loader
+from model_registry import ModelRegistry
+from settings import settings
+
+pytestmark = pytest.mark.asyncio(loop_scope="package")
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+class FakeInferenceManager:
+    loads = 0
+
+    def __init__(self, model_path, settings, logger):
+        FakeInferenceManager.loads += 1
+        self.model_version = "fake"
+        self.result_signature = "fake:0.25:0.45"
+        self.warmed_up = False
+
+    def warmup(self):
+        self.warmed_up = True
+
+    def detect_batch(self, images, annotate=None):
+        return [InferenceResult(detections=[], violations=0, compliances=0, annotated_image=image) for image in images]
+
+
+async def test_importing_the_app_does_not_load_torch():
+    code = "import sys; import main; print('torch' in sys.modules, 'ultralytics' in sys.modules)"
+    output = subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, capture_output=True, text=True, check=True)
+    torch_loaded, ultralytics_loaded = output.stdout.split()[-2:]
+
+    # the heavy imports are deferred to the model load, which is what keeps the startup fast
+    assert torch_loaded == "False" and ultralytics_loaded == "False"
+
+
+async def test_model_is_loaded_and_warmed_up_on_first_submit(monkeypatch):
+    monkeypatch.setattr(inference, "InferenceManager", FakeInferenceManager)
+    FakeInferenceManager.loads = 0
+    loader = ModelLoader(settings=settings, logger=logger, registry=ModelRegistry(settings=settings, logger=logger))
+    scheduler = BatchInferenceScheduler(inference_manager=None, settings=settings, logger=logger, model_loader=loader)
+    assert not scheduler.is_ready
+
+    await scheduler.submit(np.zeros((4, 4, 3), dtype=np.uint8))
+    await scheduler.submit(np.zeros((4, 4, 3), dtype=np.uint8))
+
+    assert FakeInferenceManager.loads == 1
+    assert loader.manager.warmed_up
+    assert scheduler.is_ready and loader.status()["state"] == "ready"
+    await scheduler.stop()
+
+
+async def test_failed_model_load_is_reported():
+    missing_model_settings = settings.model_copy(update={"TRAINED_MODEL_PATH": "trained_models/missing.pt"})
+    loader = ModelLoader(settings=missing_model_settings, logger=logger,
+                         registry=ModelRegistry(settings=missing_model_settings, logger=logger))
+    with pytest.raises(ModelNotReadyError):
+        await loader.get()
+    assert loader.status()["state"] == "failed"
+
+
+async def test_ready_endpoint_follows_the_model_state(monkeypatch):
+    monkeypatch.setattr(inference_scheduler, "inference_manager", None)
+    monkeypatch.setattr(model_loader, "state", "loading")
+    async with AsyncClient(transport=ASGITransport(app), base_url="http://127.0.0.1") as client:
+        loading = await client.get("/ready")
+        monkeypatch.setattr(inference_scheduler, "inference_manager", MagicMock())
+        ready = await client.get("/ready")
+        health = await client.get("/health")
+
+    assert loading.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert loading.json()["model"]["state"] == "loading"
+    assert ready.status_code == status.HTTP_200_OK
+    assert health.status_code == status.HTTP_200_OK
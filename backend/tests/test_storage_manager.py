@@ -0,0 +1,58 @@
+import sys
+import os
+import time
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from logger import logger
+from settings import settings
+from storage_manager import StorageManager
+
+
+def make_storage(tmp_path, **overrides) -> StorageManager:
+    overrides = {"PDF_REPORTS_DIR": str(tmp_path / "pdf_reports"), **overrides}
+    return StorageManager(settings=settings.model_copy(update=overrides), logger=logger)
+
+
+def write(storage: StorageManager, filename: str, size: int, age_seconds: float = 0):
+    path = storage.path_for("pdf_reports", filename)
+    path.write_bytes(b"x" * size)
+    storage.track("pdf_reports", path)
+    mtime = time.time() - age_seconds
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def test_files_are_sharded_below_the_area_root(tmp_path):
+    storage = make_storage(tmp_path)
+    path = write(storage, "report_1.pdf", 10)
+
+    relative = storage.relative_path("pdf_reports", path)
+    assert len(relative.split("/")) == 2 and len(relative.split("/")[0]) == StorageManager.SHARD_CHARS
+    assert storage.stats()["areas"]["pdf_reports"]["size_bytes"] == 10
+
+
+def test_sweep_evicts_expired_files_then_oldest_over_budget(tmp_path):
+    storage = make_storage(tmp_path, PDF_REPORTS_RETENTION_HOURS=1, PDF_REPORTS_MAX_MB=1)
+    expired = write(storage, "expired.pdf", 10, age_seconds=7200)
+    oldest = write(storage, "oldest.pdf", 600 * 1024, age_seconds=60)
+    newest = write(storage, "newest.pdf", 600 * 1024)
+
+    storage.sweep()
+
+    assert not expired.exists() and not oldest.exists() and newest.exists()
+    area = storage.stats()["areas"]["pdf_reports"]
+    assert area["files"] == 1
+    assert area["size_bytes"] == 600 * 1024
+    assert area["evicted_files"] == 2
+    assert area["evicted_bytes"] == 10 + 600 * 1024
+
+
+def test_sweep_runs_the_registered_hooks(tmp_path):
+    storage = make_storage(tmp_path)
+    calls = []
+    storage.add_sweep_hook(lambda: calls.append("in-memory reports"))
+
+    storage.sweep()
+    storage.sweep()
+
+    assert calls == ["in-memory reports"] * 2
@@ -0,0 +1,59 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+import pytest
+
+from logger import logger
+from settings import settings
+from tiling import TileSlicer, merge_nms, merge_wbf, tile_grid
+
+
+def make_slicer(**overrides) -> TileSlicer:
+    tile_settings = settings.model_copy(update={"TILE_INFERENCE": True, "TILE_SIZE": 640, "TILE_OVERLAP": 0.2,
+                                                "TILE_MIN_IMAGE_SIDE": 1280, **overrides})
+    return TileSlicer(settings=tile_settings, logger=logger)
+
+
+def test_tile_grid_covers_the_frame_with_overlap():
+    tiles = tile_grid(3840, 2160, tile_size=640, overlap=0.2)
+    covered = np.zeros((2160, 3840), dtype=bool)
+    for x1, y1, x2, y2 in tiles:
+        assert x2 - x1 == 640 and y2 - y1 == 640
+        covered[y1:y2, x1:x2] = True
+
+    assert covered.all()
+    assert tiles[1][0] - tiles[0][0] == 512
+    assert tile_grid(600, 400, tile_size=640, overlap=0.2) == [(0, 0, 600, 400)]
+
+
+def test_boxes_cut_at_a_tile_border_are_merged():
+    # the same head seen whole in one tile and cut in half by the border of the next, plus a helmet on top
+    data = np.array([[100, 100, 140, 150, 0.9, 0],
+                     [120, 100, 140, 150, 0.6, 0],
+                     [100, 80, 140, 110, 0.8, 1],
+                     [400, 400, 440, 450, 0.7, 0]], dtype=np.float32)
+
+    nms = merge_nms(data, threshold=0.6)
+    wbf = merge_wbf(data, threshold=0.6)
+
+    assert sorted(nms[:, 4].tolist()) == pytest.approx([0.7, 0.8, 0.9])
+    assert len(wbf) == 3
+    fused_head = wbf[(wbf[:, 5] == 0) & (wbf[:, 4] > 0.85)][0]
+    assert fused_head[0] > 100 and fused_head[2] == 140
+
+
+def test_flat_tiles_are_skipped_and_small_frames_are_not_sliced():
+    slicer = make_slicer(TILE_INCLUDE_FULL_FRAME=False, TILE_MIN_EDGE_ENERGY=2.0)
+    frame = np.zeros((2160, 3840, 3), dtype=np.uint8)
+    frame[:, :1000] = np.random.default_rng(0).integers(0, 255, (2160, 1000, 3), dtype=np.uint8)
+
+    sources = slicer.slice(frame)
+
+    assert 0 < len(sources) < slicer.tiles_total
+    assert all(x_offset < 1000 for _, (x_offset, _) in sources)
+    assert all(crop.shape[:2] == (640, 640) for crop, _ in sources)
+    small = np.zeros((720, 1280, 3), dtype=np.uint8)
+    [(source, offset)] = slicer.slice(small)
+    assert source is small and offset == (0, 0)
@@ -0,0 +1,73 @@
+import io
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import cv2
+import numpy as np
+import pytest
+from fastapi import status
+from httpx import AsyncClient, ASGITransport
+
+import detection_service as detection_service_module
+from image_service import ImageService
+from main import app
+from settings import settings
+
+pytestmark = pytest.mark.asyncio(loop_scope="package")
+
+
+def jpeg_with_large_exif(width: int, height: int, exif_bytes: int) -> bytes:
+    """A JPEG whose frame header sits behind an APP1 segment bigger than one upload chunk."""
+    encoded = cv2.imencode(".jpg", np.zeros((height, width, 3), dtype=np.uint8))[1].tobytes()
+    segments = b"".join(b"\xff\xe1" + (60000 + 2).to_bytes(2, "big") + b"\x00" * 60000 for _ in range(exif_bytes // 60000))
+    return encoded[:2] + segments + encoded[2:]
+
+
+async def test_probe_reads_dimensions_without_decoding():
+    png = cv2.imencode(".png", np.zeros((37, 53, 3), dtype=np.uint8))[1].tobytes()
+    jpeg = jpeg_with_large_exif(53, 37, 120000)
+
+    assert ImageService.probe(png).width == 53 and ImageService.probe(png).height == 37
+    assert ImageService.probe(jpeg[:64 * 1024]) is None  # the frame header is not in the first 64 KB
+    assert (ImageService.probe(jpeg).format, ImageService.probe(jpeg).width, ImageService.probe(jpeg).height) == ("jpeg", 53, 37)
+    with pytest.raises(ValueError):
+        ImageService.probe(b"GIF89a" + b"\x00" * 32)
+
+
+async def test_bad_uploads_are_rejected_before_detection(monkeypatch):
+    async def no_detection(*args, **kwargs):
+        raise AssertionError("rejected uploads must not reach the detection pipeline")
+    monkeypatch.setattr(detection_service_module.detection_service, "detect", no_detection)
+    png = cv2.imencode(".png", np.zeros((8, 8, 3), dtype=np.uint8))[1].tobytes()
+    # a PNG header declaring 10000x10000 pixels, the pixel data is never looked at
+    huge_png = png[:16] + (10000).to_bytes(4, "big") + (10000).to_bytes(4, "big") + png[24:]
+
+    async def chunked_body():
+        yield b"--boundary\r\nContent-Disposition: form-data; name=\"file\"; filename=\"big.jpg\"\r\n"
+        yield b"Content-Type: image/jpeg\r\n\r\n"
+        for _ in range(40):
+            yield b"\x00" * 64 * 1024
+
+    async with AsyncClient(transport=ASGITransport(app), base_url="http://127.0.0.1") as client:
+        declared_too_large = await client.post("/api/v1/detect", headers={"Content-Type": "multipart/form-data; boundary=boundary",
+                                                                          "Content-Length": str(50 * 1024 * 1024),
+                                                                          "Origin": settings.CORS_ALLOWED_ORIGINS[0]},
+                                               content=b"")
+        streamed_too_large = await client.post("/api/v1/detect", content=chunked_body(),
+                                               headers={"Content-Type": "multipart/form-data; boundary=boundary"})
+        mislabeled = await client.post("/api/v1/detect", files={"file": ("site.jpg", io.BytesIO(png), "image/jpeg")})
+        not_an_image = await client.post("/api/v1/detect", files={"file": ("site.png", io.BytesIO(b"<html>" * 10), "image/png")})
+        too_many_pixels = await client.post("/api/v1/detect", files={"file": ("site.png", io.BytesIO(huge_png), "image/png")})
+        empty = await client.post("/api/v1/detect", files={"file": ("site.png", io.BytesIO(b""), "image/png")})
+
+    assert declared_too_large.status_code == status.HTTP_413_CONTENT_TOO_LARGE
+    # the browser can only read the 413 when it carries the CORS headers
+    assert declared_too_large.headers["access-control-allow-origin"] == settings.CORS_ALLOWED_ORIGINS[0]
+    assert streamed_too_large.status_code == status.HTTP_413_CONTENT_TOO_LARGE
+    assert streamed_too_large.json()["detail"].startswith("Request body is too large")
+    assert mislabeled.status_code == status.HTTP_400_BAD_REQUEST and "image/png" in mislabeled.json()["detail"]
+    assert not_an_image.status_code == status.HTTP_400_BAD_REQUEST
+    assert too_many_pixels.status_code == status.HTTP_400_BAD_REQUEST and "pixels" in too_many_pixels.json()["detail"]
+    # the size is taken from the bytes read, an empty file is not passed off as a 1 byte upload
+    assert empty.status_code == status.HTTP_400_BAD_REQUEST and "empty" in empty.json()["detail"]
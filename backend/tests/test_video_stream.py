@@ -0,0 +1,125 @@
+import json
+import sys
+import os
+from unittest.mock import MagicMock
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import cv2
+import numpy as np
+import pytest
+from fastapi import status
+from fastapi.testclient import TestClient
+
+from main import app
+from inference import InferenceResult
+from inference_scheduler import BatchInferenceScheduler
+from logger import logger
+from settings import settings
+from image_service import image_service
+from video_stream import video_detection_service
+
+
+@pytest.fixture
+def fake_scheduler(monkeypatch):
+    # violations follow the frame brightness, so summary deltas change from frame to frame
+    manager = MagicMock()
+    manager.detect_batch.side_effect = lambda images, annotate=None: [
+        InferenceResult(detections=[{"class": "head", "confidence": 0.9, "bbox": [1, 2, 3, 4]}] * int(image.mean() // 40),
+                        violations=int(image.mean() // 40), compliances=1, annotated_image=image)
+        for image in images
+    ]
+    scheduler = BatchInferenceScheduler(inference_manager=manager, settings=settings, logger=logger)
+    monkeypatch.setattr(video_detection_service, "scheduler", scheduler)
+    monkeypatch.setattr(video_detection_service, "stride", 2)
+    monkeypatch.setattr(video_detection_service, "adaptive", False)
+    # the app lifespan runs with TestClient, the real model is not needed here
+    monkeypatch.setattr(settings, "MODEL_PRELOAD", False)
+    return manager
+
+
+def make_video(path, frames: int = 10) -> bytes:
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"MJPG"), 10, (64, 48))
+    for i in range(frames):
+        writer.write(np.full((48, 64, 3), i * 20, dtype=np.uint8))
+    writer.release()
+    return path.read_bytes()
+
+
+def test_video_upload_streams_ndjson_frame_results(fake_scheduler, tmp_path):
+    video = make_video(tmp_path / "site.avi")
+
+    with TestClient(app) as client:
+        response = client.post("/api/v1/detect/video", files={"file": ("site.avi", video, "video/x-msvideo")})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    records = [json.loads(line) for line in response.text.splitlines()]
+    frames, summary = records[:-1], records[-1]
+
+    assert [frame["frame_index"] for frame in frames] == [0, 2, 4, 6, 8]
+    assert frames[0]["summary_delta"] == frames[0]["summary"]
+    assert frames[1]["summary_delta"]["no_helmet_count"] == frames[1]["summary"]["no_helmet_count"] - frames[0]["summary"]["no_helmet_count"]
+    assert summary["type"] == "summary"
+    assert summary["frames_processed"] == 5
+    assert summary["frames_skipped"] == 5
+    # frame results carry no image, so nothing is drawn
+    assert all(not flag for call in fake_scheduler.detect_batch.call_args_list for flag in call.args[1])
+
+
+def test_video_upload_rejects_unreadable_video(fake_scheduler):
+    with TestClient(app) as client:
+        response = client.post("/api/v1/detect/video", files={"file": ("site.mp4", b"not a video", "video/mp4")})
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+def test_websocket_stream_returns_results_per_processed_frame(fake_scheduler):
+    frames = [cv2.imencode(".jpg", np.full((48, 64, 3), i * 40, dtype=np.uint8))[1].tobytes() for i in range(4)]
+
+    with TestClient(app) as client:
+        with client.websocket_connect("/api/v1/detect/stream") as websocket:
+            for frame in frames:
+                websocket.send_bytes(frame)
+            records = [websocket.receive_json() for _ in range(2)]
+
+    assert [record["frame_index"] for record in records] == [0, 2]
+    assert all(record["type"] == "frame" for record in records)
+
+
+def test_websocket_stream_rejects_frames_declaring_too_many_pixels(fake_scheduler, monkeypatch):
+    decodes = []
+    monkeypatch.setattr(image_service, "decode", lambda content: decodes.append(content) or cv2.imdecode(
+        np.frombuffer(content, dtype=np.uint8), cv2.IMREAD_COLOR))
+    png = cv2.imencode(".png", np.zeros((8, 8, 3), dtype=np.uint8))[1].tobytes()
+    # a tiny PNG whose header declares 20000x20000 pixels
+    huge_png = png[:16] + (20000).to_bytes(4, "big") + (20000).to_bytes(4, "big") + png[24:]
+    frame = cv2.imencode(".jpg", np.full((48, 64, 3), 120, dtype=np.uint8))[1].tobytes()
+
+    with TestClient(app) as client:
+        with client.websocket_connect("/api/v1/detect/stream") as websocket:
+            for content in (huge_png, frame, b"<html>", frame, frame):  # stride 2: frames 0, 2 and 4 are processed
+                websocket.send_bytes(content)
+            records = [websocket.receive_json() for _ in range(3)]
+
+    assert records[0]["type"] == "error" and "pixels" in records[0]["detail"]
+    assert records[1]["type"] == "error" and records[1]["frame_index"] == 2
+    assert records[2]["type"] == "frame" and records[2]["frame_index"] == 4
+    assert decodes == [frame]
+
+
+def test_websocket_stream_rejects_oversized_frames(fake_scheduler, monkeypatch):
+    monkeypatch.setattr(settings, "MAX_IMAGE_UPLOAD_BYTES", 4096)
+    noise = np.random.default_rng(0).integers(0, 255, (256, 256, 3), dtype=np.uint8)
+    oversized = cv2.imencode(".png", noise)[1].tobytes()
+    frame = cv2.imencode(".jpg", np.full((48, 64, 3), 120, dtype=np.uint8))[1].tobytes()
+    assert len(oversized) > 4096 > len(frame)
+
+    with TestClient(app) as client:
+        with client.websocket_connect("/api/v1/detect/stream") as websocket:
+            for content in (oversized, frame, frame):
+                websocket.send_bytes(content)
+            records = [websocket.receive_json() for _ in range(2)]
+
+    assert records[0] == {"type": "error", "frame_index": 0, "detail": "Image file is too large: max size is 4096 bytes"}
+    assert records[1]["type"] == "frame" and records[1]["frame_index"] == 2
+    assert fake_scheduler.detect_batch.call_count == 1
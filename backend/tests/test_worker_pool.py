@@ -0,0 +1,117 @@
+import sys
+import os
+from multiprocessing.shared_memory import SharedMemory
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+import pytest
+import asyncio
+
+import worker_pool
+from inference import InferenceResult
+from inference_scheduler import BatchInferenceScheduler
+from logger import logger
+from settings import settings
+from worker_pool import InferenceWorkerPool
+
+pytestmark = pytest.mark.asyncio(loop_scope="package")
+
+# images whose first pixel has this value make the stub model fail
+FAIL_PIXEL = 13
+
+
+class StubManager:
+    """Stands in for the YOLO InferenceManager in the worker process: counts bright pixels, draws in place."""
+    def __init__(self, model_path):
+        self.model_path = model_path
+        self.logger = logger
+
+    def detect_batch(self, images, annotate=None):
+        if any(image[0, 0, 0] == FAIL_PIXEL for image in images):
+            raise ValueError("stub model failure")
+        results = []
+        for image, draw in zip(images, annotate, strict=True):
+            annotated_image = None
+            if draw:
+                image[0, :] = 255  # drawn in place, the frame stays in its shared memory slot
+                annotated_image = image
+            results.append(InferenceResult(detections=[{"class": "head", "confidence": 0.9, "bbox": [0, 0, 1, 1]}],
+                                           violations=int(image[-1, -1, 0]), compliances=image.shape[1],
+                                           annotated_image=annotated_image, model_version=os.path.basename(self.model_path)))
+        return results
+
+
+@pytest.fixture
+def shared_memory_blocks(monkeypatch):
+    """Names of the shared memory blocks the pool creates in this process."""
+    names = []
+
+    class RecordingSharedMemory(SharedMemory):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            names.append(self.name)
+    monkeypatch.setattr(worker_pool, "SharedMemory", RecordingSharedMemory)
+    return names
+
+
+@pytest.fixture
+def pool(shared_memory_blocks):
+    pool = InferenceWorkerPool(settings=settings.model_copy(update={"INFERENCE_WORKER_PROCESSES": 1,
+                                                                    "INFERENCE_THREADS_PER_WORKER": 1}),
+                               logger=logger, model_path="v0007.pt", manager_factory=StubManager)
+    pool.warmup()
+    yield pool
+    pool.shutdown()
+
+
+def assert_released(names: list[str]) -> None:
+    for name in names:
+        with pytest.raises(FileNotFoundError):
+            SharedMemory(name=name)
+
+
+async def test_batches_round_trip_through_shared_memory(pool, shared_memory_blocks):
+    images = [np.full((4, 6, 3), 7, dtype=np.uint8), np.full((3, 5, 3), 9, dtype=np.uint8)]
+    results = pool.detect_batch(images, annotate=[True, False])
+
+    assert pool.ready and pool.processes == 1
+    assert [result.violations for result in results] == [7, 9]
+    assert [result.compliances for result in results] == [6, 5]
+    assert all(result.model_version == "v0007.pt" for result in results)
+    # the annotated frame is read back from its slot, the detections-only image has none
+    assert results[0].annotated_image.shape == (4, 6, 3)
+    assert (results[0].annotated_image[0] == 255).all() and (results[0].annotated_image[1:] == 7).all()
+    assert results[1].annotated_image is None
+    # the input images are untouched, only their copies in shared memory are drawn on
+    assert (images[0] == 7).all()
+    assert len(shared_memory_blocks) == 1
+    assert_released(shared_memory_blocks)
+
+
+async def test_shared_memory_is_released_when_the_batch_fails(pool, shared_memory_blocks):
+    with pytest.raises(ValueError, match="stub model failure"):
+        pool.detect_batch([np.full((4, 4, 3), FAIL_PIXEL, dtype=np.uint8)], annotate=[True])
+    assert_released(shared_memory_blocks)
+
+    # the worker survives the failed batch
+    assert pool.detect_batch([np.full((4, 4, 3), 3, dtype=np.uint8)], annotate=[False])[0].violations == 3
+    assert len(shared_memory_blocks) == 2
+    assert_released(shared_memory_blocks)
+
+    pool.shutdown()
+    assert not pool.ready and pool._executor is None and pool._log_listener is None
+
+
+async def test_scheduler_dispatches_batches_to_the_worker_pool(pool):
+    scheduler = BatchInferenceScheduler(inference_manager=None,
+                                        settings=pool.settings.model_copy(update={"MAX_BATCH_SIZE": 4, "MAX_BATCH_WAIT_MS": 200}),
+                                        logger=logger, worker_pool=pool)
+    images = [np.full((2, 2, 3), value, dtype=np.uint8) for value in (1, 2, 3)]
+
+    results = await asyncio.gather(*(scheduler.submit(image, annotate=value != 2) for image, value in zip(images, (1, 2, 3), strict=True)))
+    await scheduler.stop()
+
+    assert scheduler.workers == 1
+    assert [result.violations for result in results] == [1, 2, 3]
+    assert [result.annotated_image is not None for result in results] == [True, False, True]
+    assert not pool.ready
@@ -0,0 +1,152 @@
+import cv2
+import numpy as np
+
+from logger import Logger
+from settings import Settings
+
+
+def tile_grid(width: int, height: int, tile_size: int, overlap: float) -> list[tuple[int, int, int, int]]:
+    """(x1, y1, x2, y2) windows of `tile_size` covering the image, neighbours overlapping by `overlap`."""
+    def starts(length: int) -> list[int]:
+        if length <= tile_size:
+            return [0]
+        stride = max(1, int(tile_size * (1 - overlap)))
+        positions = list(range(0, length - tile_size, stride))
+        # the last tile is aligned with the border instead of running off the image
+        return positions + [length - tile_size]
+
+    return [(x, y, min(x + tile_size, width), min(y + tile_size, height))
+            for y in starts(height) for x in starts(width)]
+
+
+def overlap_matrix(boxes: np.ndarray, others: np.ndarray) -> np.ndarray:
+    """
+    Intersection over the smaller box for every pair of (x1, y1, x2, y2) boxes. A box cut at a tile
+    border is almost contained in the complete box of the neighbouring tile, so it scores ~1 here
+    while its IoU can be well below the usual thresholds.
+    """
+    top_left = np.maximum(boxes[:, None, :2], others[None, :, :2])
+    bottom_right = np.minimum(boxes[:, None, 2:4], others[None, :, 2:4])
+    intersection = np.prod(np.clip(bottom_right - top_left, 0, None), axis=2)
+    areas = np.prod(boxes[:, 2:4] - boxes[:, :2], axis=1)
+    other_areas = np.prod(others[:, 2:4] - others[:, :2], axis=1)
+    smaller = np.minimum(areas[:, None], other_areas[None, :])
+    return intersection / np.maximum(smaller, 1e-9)
+
+
+def merge_nms(data: np.ndarray, threshold: float) -> np.ndarray:
+    """Class-wise greedy NMS over (x1, y1, x2, y2, conf, cls) rows, the most confident box of a group survives."""
+    data = data[np.argsort(-data[:, 4], kind="stable")]
+    keep = np.ones(len(data), dtype=bool)
+    overlaps = overlap_matrix(data, data)
+    same_class = data[:, 5][:, None] == data[:, 5][None, :]
+    for index in range(len(data)):
+        if keep[index]:
+            suppressed = (overlaps[index] > threshold) & same_class[index]
+            suppressed[:index + 1] = False
+            keep &= ~suppressed
+    return data[keep]
+
+
+def merge_wbf(data: np.ndarray, threshold: float) -> np.ndarray:
+    """
+    Weighted box fusion over (x1, y1, x2, y2, conf, cls) rows: overlapping boxes of a class are fused into
+    their confidence-weighted average box, scored with the best confidence of the group.
+    """
+    data = data[np.argsort(-data[:, 4], kind="stable")]
+    overlaps = overlap_matrix(data, data)
+    same_class = data[:, 5][:, None] == data[:, 5][None, :]
+    assigned = np.zeros(len(data), dtype=bool)
+    fused = []
+    for index in range(len(data)):
+        if assigned[index]:
+            continue
+        group = (overlaps[index] > threshold) & same_class[index] & ~assigned
+        group[index] = True
+        assigned |= group
+        weights = data[group, 4]
+        box = (data[group, :4] * weights[:, None]).sum(axis=0) / weights.sum()
+        fused.append(np.concatenate([box, [weights.max(), data[index, 5]]]))
+    return np.array(fused, dtype=data.dtype).reshape(-1, 6)
+
+
+class TileSlicer:
+    """
+    Sliced inference for high-resolution frames: images whose longer side exceeds TILE_MIN_IMAGE_SIDE are
+    cut into TILE_SIZE tiles overlapping by TILE_OVERLAP, so small distant heads/helmets keep enough pixels
+    at the model input size. Tiles without foreground (edge energy below TILE_MIN_EDGE_ENERGY, e.g. sky,
+    empty tarmac or walls) are not sent to the model, and the downscaled full frame can be added to catch
+    large close-up objects. Boxes of all sources are merged across tiles with NMS or WBF.
+    """
+    ANALYSIS_SCALE = 4  # foreground is estimated on a 4x downscaled grayscale frame
+
+    def __init__(self, settings: Settings, logger: Logger):
+        self.settings = settings
+        self.logger = logger
+        self.enabled = self.settings.TILE_INFERENCE
+        self.tile_size = self.settings.TILE_SIZE
+        self.overlap = min(max(self.settings.TILE_OVERLAP, 0.0), 0.9)
+        self.min_image_side = self.settings.TILE_MIN_IMAGE_SIDE
+        self.batch_size = max(1, self.settings.TILE_BATCH_SIZE)
+        self.include_full_frame = self.settings.TILE_INCLUDE_FULL_FRAME
+        self.merge_method = self.settings.TILE_MERGE_METHOD
+        self.merge_threshold = self.settings.TILE_MERGE_THRESHOLD
+        self.min_edge_energy = self.settings.TILE_MIN_EDGE_ENERGY
+
+        # Monitoring counters
+        self.tiles_total = 0
+        self.tiles_skipped = 0
+
+    @property
+    def signature(self) -> str:
+        """Everything about the slicing that changes the detections (part of the result cache key)."""
+        if not self.enabled:
+            return "full"
+        return (f"tiled{self.tile_size}x{self.overlap}-{self.min_image_side}-{int(self.include_full_frame)}-"
+                f"{self.merge_method}{self.merge_threshold}-{self.min_edge_energy}")
+
+    def should_slice(self, image: np.ndarray) -> bool:
+        return self.enabled and max(image.shape[:2]) > max(self.min_image_side, self.tile_size)
+
+    def _foreground(self, image: np.ndarray, tiles: list[tuple[int, int, int, int]]) -> list[bool]:
+        if self.min_edge_energy <= 0:
+            return [True] * len(tiles)
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+        small = cv2.resize(gray, None, fx=1 / self.ANALYSIS_SCALE, fy=1 / self.ANALYSIS_SCALE,
+                           interpolation=cv2.INTER_AREA)
+        edges = np.abs(cv2.Laplacian(small, cv2.CV_16S))
+        scale = self.ANALYSIS_SCALE
+        return [bool(edges[y1 // scale:max(y2 // scale, y1 // scale + 1),
+                           x1 // scale:max(x2 // scale, x1 // scale + 1)].mean() >= self.min_edge_energy)
+                for x1, y1, x2, y2 in tiles]
+
+    def slice(self, image: np.ndarray) -> list[tuple[np.ndarray, tuple[int, int]]]:
+        """Model inputs for one image as (crop, (x offset, y offset)) pairs. Crops are views, nothing is copied."""
+        if not self.should_slice(image):
+            return [(image, (0, 0))]
+        height, width = image.shape[:2]
+        tiles = tile_grid(width, height, self.tile_size, self.overlap)
+        active = self._foreground(image, tiles)
+        self.tiles_total += len(tiles)
+        self.tiles_skipped += active.count(False)
+
+        sources = [(image, (0, 0))] if self.include_full_frame else []
+        sources += [(image[y1:y2, x1:x2], (x1, y1)) for (x1, y1, x2, y2), keep in zip(tiles, active, strict=True) if keep]
+        return sources
+
+    def merge(self, parts: list[np.ndarray]) -> np.ndarray:
+        """Merge (x1, y1, x2, y2, conf, cls) rows predicted on the sources of one image (already offset)."""
+        data = np.concatenate(parts) if parts else np.zeros((0, 6), dtype=np.float32)
+        if len(data) < 2:
+            return data
+        if self.merge_method == "wbf":
+            return merge_wbf(data, self.merge_threshold)
+        return merge_nms(data, self.merge_threshold)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "tiles_total": self.tiles_total,
+            "tiles_skipped": self.tiles_skipped,
+        }
+
@@ -0,0 +1,45 @@
+from starlette.exceptions import HTTPException
+from starlette.responses import JSONResponse
+
+
+class RequestBodyLimitMiddleware:
+    """
+    Plain ASGI middleware capping the request body size of the upload endpoints before anything is parsed.
+    A declared Content-Length above the limit is answered with 413 right away (the body is never read),
+    chunked uploads without a length are counted while they stream in and cut off at the limit.
+    `limits` maps exact request paths to their max body size in bytes.
+    """
+
+    def __init__(self, app, limits: dict[str, int]):
+        self.app = app
+        self.limits = limits
+
+    @staticmethod
+    def _too_large(limit: int) -> str:
+        return f"Request body is too large: max size is {limit} bytes"
+
+    async def __call__(self, scope, receive, send):
+        limit = self.limits.get(scope["path"]) if scope["type"] == "http" else None
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        content_length = next((value for key, value in scope["headers"] if key == b"content-length"), None)
+        if content_length is not None and content_length.isdigit() and int(content_length) > limit:
+            response = JSONResponse({"detail": self._too_large(limit)}, status_code=413, headers={"Connection": "close"})
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def counting_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # raised inside the multipart parsing, FastAPI passes HTTPExceptions through as the response
+                    raise HTTPException(status_code=413, detail=self._too_large(limit))
+            return message
+
+        await self.app(scope, counting_receive, send)
@@ -0,0 +1,170 @@
+import asyncio
+import math
+import time
+from pathlib import Path
+from typing import AsyncIterator, Optional
+
+import numpy as np
+import cv2
+
+from image_service import image_service
+from inference_scheduler import BatchInferenceScheduler, InferenceQueueFullError, inference_scheduler
+from logger import logger, Logger
+from model_loader import ModelNotReadyError
+from settings import Settings, settings
+
+
+class FrameSkipper:
+    """
+    Decides how many frames to skip after each processed frame: the configured stride, or more when
+    adaptive skipping is on and inference is slower than the source frame rate.
+    """
+    def __init__(self, stride: int, adaptive: bool, fps: Optional[float]):
+        self.stride = max(1, stride)
+        self.adaptive = adaptive and bool(fps)
+        self.fps = fps or 0.0
+        self.current_step = self.stride
+
+    def update(self, inference_seconds: float) -> int:
+        """Record the latency of the last processed frame and return the step to the next frame."""
+        if self.adaptive:
+            # frames the source produced while we were busy with the last one
+            self.current_step = max(self.stride, math.ceil(inference_seconds * self.fps))
+        return self.current_step
+
+
+class VideoDetectionService:
+    """
+    PPE detection over videos: frames are decoded incrementally with OpenCV, skipped frames are only
+    grabbed (not decoded) and every processed frame goes through the shared batching scheduler.
+    """
+    def __init__(self, scheduler: BatchInferenceScheduler, settings: Settings, logger: Logger):
+        self.scheduler = scheduler
+        self.settings = settings
+        self.logger = logger
+        self.stride = max(1, self.settings.VIDEO_FRAME_STRIDE)
+        self.adaptive = self.settings.VIDEO_ADAPTIVE_SKIP
+
+    @staticmethod
+    def _summary(violations: int, compliances: int) -> dict:
+        return {"helmet_count": compliances, "no_helmet_count": violations}
+
+    @staticmethod
+    def _delta(summary: dict, previous: Optional[dict]) -> dict:
+        previous = previous or {"helmet_count": 0, "no_helmet_count": 0}
+        return {key: summary[key] - previous[key] for key in summary}
+
+    @staticmethod
+    def _read_frame(capture: cv2.VideoCapture, skip: int) -> tuple[int, Optional[np.ndarray]]:
+        """Grab (without decoding) `skip` frames, then decode the next one. Returns the number of frames consumed."""
+        for grabbed in range(skip):
+            if not capture.grab():
+                return grabbed, None
+        success, frame = capture.read()
+        return (skip + 1, frame) if success else (skip, None)
+
+    async def frame_results(self, video_path: Path) -> AsyncIterator[dict]:
+        """Yield one record per processed frame followed by a final summary record."""
+        capture = cv2.VideoCapture(str(video_path))
+        if not capture.isOpened():
+            raise ValueError("Uploaded file could not be opened as a video.")
+        try:
+            fps = capture.get(cv2.CAP_PROP_FPS) or None
+            skipper = FrameSkipper(stride=self.stride, adaptive=self.adaptive, fps=fps)
+
+            frame_index = -1
+            skip = 0
+            processed = skipped = total_violations = max_violations = 0
+            previous_summary = None
+            while True:
+                consumed, frame = await asyncio.to_thread(self._read_frame, capture, skip)
+                if frame is None:
+                    skipped += max(0, consumed)
+                    break
+                frame_index += consumed
+                skipped += consumed - 1
+
+                started_at = time.perf_counter()
+                try:
+                    # only detections are streamed, so no annotated frame is drawn
+                    result = await self.scheduler.submit(frame, annotate=False)
+                except InferenceQueueFullError:
+                    # under load a video frame is simply dropped instead of failing the whole stream
+                    skipped += 1
+                    skip = skipper.update(time.perf_counter() - started_at) - 1
+                    continue
+                skip = skipper.update(time.perf_counter() - started_at) - 1
+
+                summary = self._summary(result.violations, result.compliances)
+                processed += 1
+                total_violations += result.violations
+                max_violations = max(max_violations, result.violations)
+                yield {
+                    "type": "frame",
+                    "frame_index": frame_index,
+                    "timestamp_ms": round(frame_index / fps * 1000, 1) if fps else None,
+                    "detections": result.detections,
+                    "summary": summary,
+                    "summary_delta": self._delta(summary, previous_summary),
+                    "model_version": result.model_version,
+                }
+                previous_summary = summary
+
+            yield {
+                "type": "summary",
+                "frames_processed": processed,
+                "frames_skipped": skipped,
+                "total_violations": total_violations,
+                "max_violations_per_frame": max_violations,
+                "fps": fps,
+            }
+        finally:
+            capture.release()
+
+    async def live_results(self, frames: asyncio.Queue) -> AsyncIterator[dict]:
+        """
+        Run detection over a live stream of encoded frames pushed into `frames` as (frame_index, bytes)
+        pairs (None ends the stream). Frames closer than `stride` to the last processed one are skipped and,
+        with adaptive skipping, frames that piled up during inference are dropped in favour of the most recent one.
+        """
+        previous_summary = None
+        last_processed_index = None
+        while True:
+            item = await frames.get()
+            if item is None:
+                return
+            dropped = 0
+            if self.adaptive:
+                while not frames.empty():
+                    newer = frames.get_nowait()
+                    if newer is None:
+                        return
+                    item = newer
+                    dropped += 1
+            frame_index, content = item
+            if last_processed_index is not None and frame_index - last_processed_index < self.stride:
+                continue
+            last_processed_index = frame_index
+
+            try:
+                # frames come straight from the socket: size, format and declared dimensions before decoding
+                image_service.check_content(content)
+                frame = await asyncio.to_thread(image_service.decode, content)
+                result = await self.scheduler.submit(frame, annotate=False)
+            except (ValueError, InferenceQueueFullError, ModelNotReadyError) as e:
+                yield {"type": "error", "frame_index": frame_index, "detail": str(e)}
+                continue
+
+            summary = self._summary(result.violations, result.compliances)
+            yield {
+                "type": "frame",
+                "frame_index": frame_index,
+                "dropped_frames": dropped,
+                "detections": result.detections,
+                "summary": summary,
+                "summary_delta": self._delta(summary, previous_summary),
+                "model_version": result.model_version,
+            }
+            previous_summary = summary
+
+video_detection_service = VideoDetectionService(scheduler=inference_scheduler, settings=settings, logger=logger)
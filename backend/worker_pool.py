@@ -0,0 +1,168 @@
+from concurrent.futures import ProcessPoolExecutor
+from logging.handlers import QueueListener
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+from pathlib import Path
+from typing import Callable, Optional
+
+import numpy as np
+
+from inference import InferenceResult
+from logger import Logger
+from settings import Settings
+
+
+# The model replica owned by the current worker process
+_worker_manager = None
+
+# Marks an annotated frame that was written back into the image slot of the shared memory block
+_IN_SHARED_MEMORY = "shm"
+
+
+def _init_worker(num_threads: int, model_path: Optional[str], log_queue,
+                 manager_factory: Optional[Callable] = None) -> None:
+    """
+    Runs once in every worker process: sends the log records to the parent, pins the torch thread budget
+    and loads the model replica (with `manager_factory(model_path)` when it is given).
+    """
+    global _worker_manager
+    from logger import logger
+    logger.forward_to(log_queue)
+    import torch
+    torch.set_num_threads(num_threads)
+
+    # Every process loads and warms up its own InferenceManager (and YOLO replica)
+    if manager_factory is not None:
+        _worker_manager = manager_factory(model_path)
+    else:
+        from model_loader import model_loader
+        _worker_manager = model_loader.build(Path(model_path)) if model_path else model_loader.load()
+    _worker_manager.logger.info(f"Inference worker ready with {num_threads} torch threads")
+
+
+def _ping() -> bool:
+    return _worker_manager is not None
+
+
+def _detect_shared_images(shm: SharedMemory, layout: list[tuple[int, tuple]], annotate: list[bool]) -> list[tuple]:
+    images = [np.ndarray(shape, dtype=np.uint8, buffer=shm.buf, offset=offset) for offset, shape in layout]
+    results = _worker_manager.detect_batch(images, annotate)
+
+    outputs = []
+    for image, result in zip(images, results, strict=True):
+        annotated_image = None
+        if result.annotated_image is not None and result.annotated_image.shape == image.shape:
+            # the renderer draws in place, so normally the frame is already in its slot
+            if result.annotated_image is not image:
+                image[...] = result.annotated_image
+            annotated_image = _IN_SHARED_MEMORY
+        elif result.annotated_image is not None:
+            annotated_image = result.annotated_image
+        outputs.append((result.detections, result.violations, result.compliances, annotated_image, result.model_version,
+                        result.timings))
+    return outputs
+
+
+def _detect_batch_in_worker(shm_name: str, layout: list[tuple[int, tuple]], annotate: list[bool]) -> list[tuple]:
+    """
+    Runs inside a worker process. Images are read from the shared memory block and the annotated
+    frames are written back into the same slots, so only the small detection lists cross the process boundary.
+    """
+    # Spawned workers share the parent's resource tracker, the parent owns and unlinks the block
+    shm = SharedMemory(name=shm_name)
+    try:
+        return _detect_shared_images(shm, layout, annotate)
+    finally:
+        try:
+            shm.close()
+        except BufferError:
+            # an exception traceback can still reference the array views, the parent unlinks the block anyway
+            pass
+
+
+class InferenceWorkerPool:
+    """
+    Pool of inference worker processes, each holding its own model replica with a pinned
+    torch thread budget. Images are handed to the workers through shared memory instead of pickling them.
+    The replicas load `model_path`, or the active model registry version when it is not given.
+    `manager_factory` replaces the model loader in the workers, it has to be a picklable module level callable.
+    """
+    def __init__(self, settings: Settings, logger: Logger, model_path: Optional[Path] = None,
+                 manager_factory: Optional[Callable] = None):
+        self.settings = settings
+        self.logger = logger
+        self.model_path = model_path
+        self.manager_factory = manager_factory
+        self.processes = max(1, self.settings.INFERENCE_WORKER_PROCESSES)
+        self.threads_per_worker = max(1, self.settings.INFERENCE_THREADS_PER_WORKER)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._log_listener: Optional[QueueListener] = None
+        self.ready = False
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self.logger.info(f"Starting {self.processes} inference worker processes "
+                             f"with {self.threads_per_worker} torch threads each")
+            context = get_context("spawn")
+            # the workers log through this process instead of racing on the rotation of the same file
+            log_queue = context.Queue()
+            self._log_listener = self.logger.listen(log_queue)
+            self._executor = ProcessPoolExecutor(max_workers=self.processes,
+                                                 mp_context=context,
+                                                 initializer=_init_worker,
+                                                 initargs=(self.threads_per_worker,
+                                                           str(self.model_path) if self.model_path else None,
+                                                           log_queue,
+                                                           self.manager_factory))
+        return self._executor
+
+    def warmup(self) -> None:
+        """Start every worker process (each loads and warms up its model replica) before serving traffic."""
+        executor = self._get_executor()
+        try:
+            if all(future.result() for future in [executor.submit(_ping) for _ in range(self.processes)]):
+                self.ready = True
+        except Exception as e:
+            self.logger.error(f"Inference worker pool failed to start: {e}")
+
+    def detect_batch(self, images: list[np.ndarray], annotate: Optional[list[bool]] = None) -> list[InferenceResult]:
+        """Run one batch on a free worker process (blocking, meant to be called from a thread)."""
+        images = [np.ascontiguousarray(image, dtype=np.uint8) for image in images]
+        layout = []
+        offset = 0
+        for image in images:
+            layout.append((offset, image.shape))
+            offset += image.nbytes
+
+        shm = SharedMemory(create=True, size=max(offset, 1))
+        try:
+            for image, (slot_offset, shape) in zip(images, layout, strict=True):
+                np.ndarray(shape, dtype=np.uint8, buffer=shm.buf, offset=slot_offset)[...] = image
+
+            outputs = self._get_executor().submit(_detect_batch_in_worker, shm.name, layout,
+                                                  annotate or [True] * len(images)).result()
+
+            results = []
+            for (slot_offset, shape), (detections, violations, compliances, annotated_image, model_version, timings) in zip(layout, outputs, strict=True):
+                if isinstance(annotated_image, str) and annotated_image == _IN_SHARED_MEMORY:
+                    annotated_image = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf, offset=slot_offset).copy()
+                results.append(InferenceResult(detections=detections,
+                                               violations=violations,
+                                               compliances=compliances,
+                                               annotated_image=annotated_image,
+                                               model_version=model_version,
+                                               timings=timings))
+            return results
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def shutdown(self, cancel_pending: bool = True) -> None:
+        """Stop all worker processes (batches already handed to the pool finish unless they are cancelled)."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=cancel_pending)
+            self._executor = None
+            self.ready = False
+        if self._log_listener is not None:
+            self._log_listener.stop()
+            self._log_listener = None
@@ -10,7 +10,8 @@ interface DetectionResponse {
   timestamp: string
   detections: Detection[]
   summary: Summary
-  annotated_image: string
+  // object URL of the raw annotated image part of the multipart response
+  annotated_image_url: string
 }
 
 interface Detection {
@@ -33,8 +34,14 @@ export default function Home() {
     const [pdfReports, setPdfReports] = useState<{ url: string; name: string }[]>([]);
     const [reportLoading, setReportLoading] = useState<boolean>(false);
 
-    // for now getting only the .jpeg base64 annotated image
-    const imageUrl = responseData ? `data:image/jpeg;base64,${responseData.annotated_image}` : null;
+    const imageUrl = responseData ? responseData.annotated_image_url : null;
+
+    // the previous annotated image is released once it is replaced
+    useEffect(() => {
+        return () => {
+            if (imageUrl) URL.revokeObjectURL(imageUrl);
+        };
+    }, [imageUrl]);
 
     const handleFileChange = (e: React.ChangeEvent<HTMLInputElement>) => {
         if (e.target.files && e.target.files[0]) {
@@ -49,8 +56,10 @@ export default function Home() {
         formData.append("file", selectedFile);
 
         try {
+            // multipart response: JSON detections plus the raw annotated image, no base64 round trip
             const response = await fetch("http://localhost:8000/api/v1/detect", {
                 method: "POST",
+                headers: { Accept: "multipart/form-data" },
                 body: formData,
             });
 
@@ -63,8 +72,11 @@ export default function Home() {
                 return;
             }
 
-            const data = await response.json();
-            if (!data.annotated_image || !data.detections || !data.summary) {
+            const parts = await response.formData();
+            const detectionsPart = parts.get("detections");
+            const annotatedImage = parts.get("annotated_image");
+            const data = detectionsPart instanceof Blob ? JSON.parse(await detectionsPart.text()) : null;
+            if (!data || !(annotatedImage instanceof Blob) || !data.detections || !data.summary) {
                 toast.error("Invalid image or server error. Please upload a valid image.");
                 setResponseData(null);
                 setLoading(false);
@@ -72,8 +84,7 @@ export default function Home() {
             }
 
             console.log("Response data:", data);
-            // for now gettting only the .jpeg base64 annotated image
-            setResponseData(data);
+            setResponseData({ ...data, annotated_image_url: URL.createObjectURL(annotatedImage) });
             toast.success("File uploaded and processed successfully!");
         } catch (error) {
             toast.error("An error occurred while uploading the file.");
@@ -94,7 +105,8 @@ export default function Home() {
                     headers: {
                         "Content-Type": "application/json",
                     },
-                    body: JSON.stringify(responseData),
+                    // the detection is stored server side, the image_id is enough to render the report
+                    body: JSON.stringify({ image_id: responseData.image_id }),
                 })
 
                 if (!response.ok) {
@@ -105,7 +117,19 @@ export default function Home() {
                     return;
                 }
 
-                const data = await response.json();
+                // reports render in a background job, poll its status until it is finished
+                let data = await response.json();
+                while (data.status === "queued" || data.status === "running") {
+                    await new Promise((resolve) => setTimeout(resolve, 500));
+                    const statusResponse = await fetch(data.status_url);
+                    if (!statusResponse.ok) break;
+                    data = await statusResponse.json();
+                }
+                if (data.status === "failed") {
+                    toast.error(`Report generation failed: ${data.error}`);
+                    setReportLoading(false);
+                    return;
+                }
                 if (!data.report_url) {
                     toast.error("Report generation failed. No report URL returned.");
                     setReportLoading(false);